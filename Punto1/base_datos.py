@@ -1,41 +1,598 @@
+import collections
+import itertools
+import threading
+import weakref
+
+from indices import Indice
+from columnar import RegistrosColumnares
+from tuplas import RegistrosTuplas
+from tramos import Tramos
+from vectorizado import escribir_posiciones
+from carga import TAMANO_LOTE
+from wal import Wal
+from snapshot import guardar_snapshot, abrir_snapshot
+from borrados import Borrados, UMBRAL_COMPACTACION
+from estadisticas import Estadisticas, analizar
+from cache_resultados import CacheResultados
+
+ALMACENAMIENTOS = ('filas', 'columnar', 'tuplas')
+
+def _leer(registros, col, pos):
+    if isinstance(registros, (RegistrosColumnares, RegistrosTuplas)):
+        return registros.leer(col, pos)
+    return registros[pos].get(col)
+
+def _copiar_tabla(tabla):
+    # las copias comparten lo que no se modifica (tramos de filas, páginas de los índices,
+    # columnas, bitmap, estadísticas de cada columna) y lo duplican recién al escribirlo
+    indices = {col: indice.copia() for col, indice in tabla['indices'].items()}
+    return {'columnas': tabla['columnas'], 'registros': tabla['registros'].copia(), 'indices': indices,
+            'borrados': tabla['borrados'].copia(), 'estadisticas': tabla['estadisticas'].copia(), 'version': tabla['version']}
+
 class BaseDatosMemoria:
-    def __init__(self):
+    def __init__(self, almacenamiento='filas', ruta_wal=None, umbral_compactacion=UMBRAL_COMPACTACION, cache_resultados=0,
+                 diccionario_cadenas=False):
+        if almacenamiento not in ALMACENAMIENTOS:
+            raise RuntimeError(f"Almacenamiento desconocido {almacenamiento}")
+        self.almacenamiento = almacenamiento
+        # con diccionario_cadenas las tablas por columnas guardan cada columna cadena como
+        # códigos enteros más un diccionario con los textos distintos (columnar.py)
+        self.diccionario_cadenas = diccionario_cadenas
+        self.umbral_compactacion = umbral_compactacion
         self.tablas = {}
+        self.indices = {}
+        # cada tabla lleva en 'version' un número que cambia con cada escritura; salen de un
+        # mismo contador para todas las sesiones, así dos contenidos nunca comparten versión
+        self.versiones = itertools.count(1)
+        # con cache_resultados > 0 los SELECT guardan sus filas (hasta esa cantidad en total)
+        # para las próximas ejecuciones mientras no cambie ninguna tabla que leen
+        self.cache_resultados = CacheResultados(cache_resultados) if cache_resultados else None
+        # las sesiones (Sesion) leen la última versión confirmada de tablas/indices sin
+        # esperar a nadie; los escritores se turnan con cerrojo_escritura y publican
+        # diccionarios nuevos al confirmar, nunca modifican los ya publicados
+        self.cerrojo_version = threading.Lock()
+        self.cerrojo_escritura = threading.Lock()
+        # con una sola sesión viva nadie más puede leer y las sentencias sueltas escriben
+        # sin copiar; cerrojo_solo impide que aparezca otra sesión mientras tanto
+        self.sesiones = weakref.WeakSet()
+        self.cerrojo_solo = threading.Lock()
+        # modo durable: con ruta_wal cada cambio se anota en la bitácora (wal.py) y al
+        # abrir se reaplica lo que haya en el checkpoint y en el log
+        self.wal = None
+        # al reaplicar la bitácora solo se compacta donde lo dice un registro 'C', para que
+        # las posiciones coincidan con las que se anotaron aunque cambie el umbral
+        self.reaplicando = False
+        if ruta_wal is not None:
+            wal = Wal(ruta_wal)
+            self.reaplicando = True
+            for registro in wal.recuperar():
+                self.aplicar(registro)
+            self.reaplicando = False
+            self.wal = wal
+
+    def sesion(self):
+        return Sesion(self)
+
+    def version(self):
+        with self.cerrojo_version:
+            return self.tablas, self.indices
+
+    def registrar_sesion(self, sesion):
+        with self.cerrojo_solo:
+            self.sesiones.add(sesion)
+            return self.version()
+
+    def publicar(self, tablas, indices):
+        with self.cerrojo_version:
+            self.tablas = tablas
+            self.indices = indices
+
+    def con_bitacora(self):
+        return self.wal is not None
+
+    def _preparar_escritura(self):
+        pass
+
+    def _en_sitio(self):
+        # si los dicts de las filas se pueden modificar en lugar de reemplazarlos
+        return True
+
+    def _escribible(self, nombre):
+        # la tabla que va a modificar una operación; sobre la base compartida es la misma
+        self._preparar_escritura()
+        if nombre not in self.tablas:
+            raise RuntimeError(f"Tabla {nombre} no existe")
+        tabla = self.tablas[nombre]
+        tabla['version'] = next(self.versiones)
+        return tabla
+
+    def _registrar(self, *registro):
+        if self.wal is not None:
+            self.wal.escribir(registro)
+            if self.wal.requiere_checkpoint():
+                self.checkpoint()
+
+    def aplicar(self, registro):
+        # reaplica un registro de la bitácora; los registros son los que arma _registrar
+        operacion = registro[0]
+        if operacion == 'T':
+            self.crear_tabla(registro[1], registro[2])
+        elif operacion == 'X':
+            self.crear_indice(registro[1], registro[2], registro[3])
+        elif operacion == 'I':
+            _, nombre, columnas, n, valores = registro
+            self.insertar_lote(nombre, dict(zip(columnas, valores)), n)
+        elif operacion == 'U':
+            self.escribir_valores(*registro[1:])
+        elif operacion == 'D':
+            self.borrar(registro[1], lambda registro: True, registro[2])
+        elif operacion == 'C':
+            self.compactar(registro[1])
+        elif operacion == 'TX':
+            for subregistro in registro[1]:
+                self.aplicar(subregistro)
+        else:
+            raise RuntimeError(f"Registro de bitácora desconocido {operacion}")
+
+    def volcado(self):
+        # el estado completo como registros de bitácora: es lo que se guarda en el checkpoint
+        for nombre, tabla in self.tablas.items():
+            yield ['T', nombre, list(tabla['columnas'].items())]
+            registros = tabla['registros']
+            nombres = list(tabla['columnas'])
+            if isinstance(registros, (RegistrosColumnares, RegistrosTuplas)):
+                columnas = [registros.columna(col) for col in nombres]
+            else:
+                columnas = [[registro.get(col) for registro in registros] for col in nombres]
+            for inicio in range(0, len(registros), TAMANO_LOTE):
+                fin = min(inicio + TAMANO_LOTE, len(registros))
+                yield ['I', nombre, nombres, fin - inicio, [valores[inicio:fin] for valores in columnas]]
+            # las filas borradas sin compactar también van, para no mover las posiciones
+            if tabla['borrados'].cantidad:
+                yield ['D', nombre, tabla['borrados'].posiciones_borradas(len(registros))]
+        for nombre_indice, indice in self.indices.items():
+            yield ['X', nombre_indice, indice.tabla, indice.columna]
+
+    def checkpoint(self):
+        if self.wal is not None:
+            self.wal.checkpoint(self.volcado())
+
+    def sincronizar(self):
+        if self.wal is not None:
+            self.wal.sincronizar()
+
+    def guardar_snapshot(self, ruta):
+        return guardar_snapshot(self, ruta)
+
+    def abrir_snapshot(self, ruta):
+        # reemplaza todo el contenido por el del snapshot; las tablas quedan por columnas
+        # sobre el mmap sea cual sea el almacenamiento, y los índices se reconstruyen
+        tablas, indices = abrir_snapshot(ruta)
+        self._preparar_escritura()
+        self.tablas = tablas
+        self.indices = {}
+        for tabla in tablas.values():
+            tabla['borrados'] = Borrados()
+            tabla['version'] = next(self.versiones)
+            if 'estadisticas' not in tabla:
+                tabla['estadisticas'] = analizar(tabla)
+        for nombre_indice, nombre, columna in indices:
+            indice = Indice(nombre_indice, nombre, columna)
+            indice.reconstruir(tablas[nombre]['registros'])
+            tablas[nombre]['indices'][columna] = indice
+            self.indices[nombre_indice] = indice
+        # la bitácora no tiene cómo reproducir el cambio: se compacta con el estado nuevo
+        self.checkpoint()
+        return len(tablas)
+
+    def cerrar(self):
+        if self.wal is not None:
+            self.wal.cerrar()
+            self.wal = None
 
     def crear_tabla(self, nombre, columnas):
+        self._preparar_escritura()
         if nombre in self.tablas:
             raise RuntimeError(f"Ya existe la tabla {nombre}")
-        self.tablas[nombre] = {'columnas': dict(columnas), 'registros': []}
+        columnas = dict(columnas)
+        if self.almacenamiento == 'columnar':
+            registros = RegistrosColumnares(columnas, self.diccionario_cadenas)
+        elif self.almacenamiento == 'tuplas':
+            registros = RegistrosTuplas(columnas)
+        else:
+            registros = Tramos()
+        self.tablas[nombre] = {'columnas': columnas, 'registros': registros, 'indices': {}, 'borrados': Borrados(),
+                               'estadisticas': Estadisticas(columnas), 'version': next(self.versiones)}
+        self._registrar('T', nombre, list(columnas.items()))
+
+    def crear_indice(self, nombre_indice, nombre, columna):
+        self._preparar_escritura()
+        if nombre_indice in self.indices:
+            raise RuntimeError(f"Ya existe el índice {nombre_indice}")
+        tabla = self._escribible(nombre)
+        if columna not in tabla['columnas']:
+            raise RuntimeError(f"Columna {columna} no existe en tabla {nombre}")
+        if columna in tabla['indices']:
+            raise RuntimeError(f"La columna {columna} de {nombre} ya tiene el índice {tabla['indices'][columna].nombre}")
+        indice = Indice(nombre_indice, nombre, columna)
+        indice.reconstruir(tabla['registros'], tabla['borrados'])
+        tabla['indices'][columna] = indice
+        self.indices[nombre_indice] = indice
+        self._registrar('X', nombre_indice, nombre, columna)
 
     def insertar(self, nombre, fila):
-        if nombre not in self.tablas:
-            raise RuntimeError(f"Tabla {nombre} no existe")
-        esquema = self.tablas[nombre]['columnas']
+        tabla = self._escribible(nombre)
+        esquema = tabla['columnas']
         for col in fila.keys():
             if col not in esquema:
                 raise RuntimeError(f"Columna {col} no existe en tabla {nombre}")
-        self.tablas[nombre]['registros'].append(dict(fila))
+        registros = tabla['registros']
+        registros.append(registros.fila(fila) if isinstance(registros, RegistrosTuplas) else dict(fila))
+        for col, indice in tabla['indices'].items():
+            indice.agregar(fila.get(col), len(registros) - 1)
+        tabla['estadisticas'].agregar_fila(fila)
+        self._registrar('I', nombre, list(fila), 1, [[valor] for valor in fila.values()])
 
-    def actualizar(self, nombre, condicion_fn, asignaciones):
-        if nombre not in self.tablas:
-            raise RuntimeError(f"Tabla {nombre} no existe")
-        conteo = 0
-        for registro in self.tablas[nombre]['registros']:
+    def insertar_lote(self, nombre, columnas, n):
+        # columnas: columna -> lista con los n valores ya convertidos; el esquema se
+        # revisa una sola vez para todo el lote
+        tabla = self._escribible(nombre)
+        esquema = tabla['columnas']
+        for col in columnas.keys():
+            if col not in esquema:
+                raise RuntimeError(f"Columna {col} no existe en tabla {nombre}")
+        registros = tabla['registros']
+        inicio = len(registros)
+        if isinstance(registros, (RegistrosColumnares, RegistrosTuplas)):
+            registros.extender(columnas, n)
+        elif columnas:
+            nombres = list(columnas)
+            registros.extend(dict(zip(nombres, fila)) for fila in zip(*columnas.values()))
+        else:
+            registros.extend({} for _ in range(n))
+        for col, indice in tabla['indices'].items():
+            indice.agregar_lote(columnas.get(col, [None] * n), inicio)
+        tabla['estadisticas'].agregar_columnas(columnas)
+        self._registrar('I', nombre, list(columnas), n, [list(valores) for valores in columnas.values()])
+        return n
+
+    def actualizar(self, nombre, condicion_fn, asignaciones, posiciones=None):
+        # posiciones: candidatas obtenidas de un índice; None recorre toda la tabla
+        tabla = self._escribible(nombre)
+        registros = tabla['registros']
+        indices = tabla['indices']
+        if posiciones is None:
+            candidatos = tabla['borrados'].enumerar(registros)
+        else:
+            candidatos = ((pos, registros[pos]) for pos in posiciones)
+        cambiadas = [] if self.con_bitacora() else None
+        if isinstance(registros, RegistrosTuplas):
+            # una fila tupla solo tiene lugar para las columnas del esquema
+            asignaciones = {col: valor_fn for col, valor_fn in asignaciones.items() if col in registros.slots}
+            actualizar = self._actualizar_tuplas
+        else:
+            actualizar = self._actualizar_dicts
+        nuevos = {col: [] for col in asignaciones}
+        conteo = actualizar(registros, indices, candidatos, condicion_fn, asignaciones, nuevos, cambiadas)
+        if conteo:
+            tabla['estadisticas'].agregar_columnas(nuevos)
+            self._modificadas(tabla, conteo)
+        if cambiadas:
+            self._registrar_valores(nombre, list(asignaciones), cambiadas)
+        return conteo
+
+    def _actualizar_dicts(self, registros, indices, candidatos, condicion_fn, asignaciones, nuevos, cambiadas):
+        # primero se calculan los valores nuevos de todas las filas y recién después se
+        # escriben: si una expresión o la conversión al tipo de una columna falla, la tabla
+        # queda sin tocar
+        cambios = []
+        for pos, registro in candidatos:
             if condicion_fn(registro):
+                valores = {}
+                # las asignaciones siguientes ya ven los valores nuevos
+                fila = registro if len(asignaciones) == 1 else collections.ChainMap(valores, registro)
                 for col, valor_fn in asignaciones.items():
-                    registro[col] = valor_fn(registro)
+                    valores[col] = valor_fn(fila)
+                cambios.append((pos, registro, valores))
+        columnar = isinstance(registros, RegistrosColumnares)
+        if columnar:
+            # los índices y las estadísticas ven el valor ya convertido al tipo de la columna
+            cambios = [(pos, registro, registros.convertir_valores(valores)) for pos, registro, valores in cambios]
+        # el dict de una fila puede ser también el de una versión publicada: salvo escribiendo
+        # en el lugar se reemplaza por otro
+        en_sitio = self._en_sitio()
+        indexadas = [col for col in asignaciones if col in indices]
+        for pos, registro, valores in cambios:
+            for col in indexadas:
+                indices[col].quitar(registro.get(col), pos)
+                indices[col].agregar(valores.get(col), pos)
+            if columnar:
+                registros.escribir(pos, valores)
+            elif en_sitio:
+                registro.update(valores)
+            else:
+                registros[pos] = {**registro, **valores}
+            for col in asignaciones:
+                nuevos[col].append(valores[col])
+            if cambiadas is not None:
+                cambiadas.append(pos)
+        return len(cambios)
+
+    def _actualizar_tuplas(self, registros, indices, candidatos, condicion_fn, asignaciones, nuevos, cambiadas):
+        # como actualizar, sobre filas guardadas como tuplas: cada asignación lee y escribe
+        # por posición en una lista con los valores de la fila, que al final reemplaza a la
+        # tupla (las asignaciones siguientes ya ven los valores nuevos, igual que con dicts)
+        slots = registros.slots
+        pasos = [(col, slots[col], valor_fn) for col, valor_fn in asignaciones.items()]
+        indexadas = [(indices[col], slots[col]) for col in asignaciones if col in indices]
+        conteo = 0
+        for pos, registro in candidatos:
+            if condicion_fn(registro):
+                valores = list(registro)
+                for col, k, valor_fn in pasos:
+                    valores[k] = valor = valor_fn(valores)
+                    nuevos[col].append(valor)
+                registros[pos] = tuple(valores)
+                for indice, k in indexadas:
+                    indice.quitar(registro[k], pos)
+                    indice.agregar(valores[k], pos)
+                if cambiadas is not None:
+                    cambiadas.append(pos)
                 conteo += 1
         return conteo
 
-    def borrar(self, nombre, condicion_fn):
+    def _registrar_valores(self, nombre, columnas, posiciones):
+        # se anotan los valores tal como quedaron guardados, así reaplicar no depende de
+        # volver a evaluar expresiones
+        registros = self.tablas[nombre]['registros']
+        valores = [[_leer(registros, col, pos) for pos in posiciones] for col in columnas]
+        self._registrar('U', nombre, columnas, posiciones, valores)
+
+    def escribir_valores(self, nombre, columnas, posiciones, valores):
+        # escribe valores ya calculados en las posiciones dadas (reaplicación de un UPDATE)
+        tabla = self._escribible(nombre)
+        registros = tabla['registros']
+        indices = tabla['indices']
+        for k, pos in enumerate(posiciones):
+            anteriores = {col: _leer(registros, col, pos) for col in columnas if col in indices}
+            if isinstance(registros, RegistrosTuplas):
+                registros.escribir(pos, {col: nuevos[k] for col, nuevos in zip(columnas, valores)})
+            else:
+                registro = dict(registros[pos])
+                for col, nuevos in zip(columnas, valores):
+                    registro[col] = nuevos[k]
+                registros[pos] = registro
+            for col, anterior in anteriores.items():
+                indices[col].quitar(anterior, pos)
+                indices[col].agregar(_leer(registros, col, pos), pos)
+        tabla['estadisticas'].agregar_columnas(dict(zip(columnas, valores)))
+        self._modificadas(tabla, len(posiciones))
+        self._registrar('U', nombre, columnas, posiciones, valores)
+
+    def escribir_columnas(self, nombre, posiciones, nuevos):
+        # UPDATE vectorizado sobre una tabla por columnas: nuevos es columna -> arreglo
+        # con los valores ya convertidos para cada posición
+        tabla = self._escribible(nombre)
+        registros = tabla['registros']
+        lista_posiciones = posiciones.tolist()
+        for col, valores in nuevos.items():
+            indice = tabla['indices'].get(col)
+            anteriores = [registros.leer(col, pos) for pos in lista_posiciones] if indice else None
+            escribir_posiciones(registros, col, posiciones, valores)
+            if indice:
+                for pos, anterior in zip(lista_posiciones, anteriores):
+                    indice.quitar(anterior, pos)
+                    indice.agregar(registros.leer(col, pos), pos)
+        tabla['estadisticas'].agregar_columnas({col: valores.tolist() for col, valores in nuevos.items()})
+        self._modificadas(tabla, len(lista_posiciones))
+        if self.con_bitacora() and lista_posiciones:
+            self._registrar_valores(nombre, list(nuevos), lista_posiciones)
+        return len(lista_posiciones)
+
+    def borrar(self, nombre, condicion_fn, posiciones=None):
+        # solo marca las filas en el bitmap de borrados; la tabla se compacta cuando la
+        # fracción de filas borradas pasa de umbral_compactacion
+        tabla = self._escribible(nombre)
+        registros = tabla['registros']
+        borrados = tabla['borrados']
+        if posiciones is None:
+            candidatos = borrados.enumerar(registros)
+        else:
+            candidatos = ((pos, registros[pos]) for pos in posiciones if not borrados.borrada(pos))
+        eliminadas = [pos for pos, registro in candidatos if condicion_fn(registro)]
+        if not eliminadas:
+            return 0
+        for pos in eliminadas:
+            borrados.marcar(pos)
+        self._registrar('D', nombre, eliminadas)
+        if not self.reaplicando and borrados.supera(len(registros), self.umbral_compactacion):
+            # la compactación renumera los índices y descarta ahí mismo las filas borradas
+            self.compactar(nombre)
+        else:
+            for col, indice in tabla['indices'].items():
+                indice.quitar_lote([(_leer(registros, col, pos), pos) for pos in eliminadas])
+        self._modificadas(tabla, len(eliminadas))
+        return len(eliminadas)
+
+    def _modificadas(self, tabla, filas):
+        # las estadísticas que se mantienen al escribir no descuentan lo borrado ni los
+        # valores que una actualización reemplazó; pasado el umbral se rehacen solas
+        if filas and tabla['estadisticas'].modificar(filas, len(tabla['registros']) - tabla['borrados'].cantidad):
+            tabla['estadisticas'] = analizar(tabla)
+
+    def analizar(self, nombre):
+        # ANALYZE: rehace las estadísticas de la tabla con sus filas vivas (las que se
+        # mantienen al escribir no se descuentan al borrar ni al actualizar hasta que
+        # las filas modificadas pasan el umbral de estadisticas.py)
+        tabla = self._escribible(nombre)
+        tabla['estadisticas'] = analizar(tabla)
+
+    def compactar(self, nombre):
+        # quita de verdad las filas borradas; las posiciones de los índices se traducen a
+        # las nuevas en lugar de reconstruirlos
+        tabla = self._escribible(nombre)
+        registros = tabla['registros']
+        borrados = tabla['borrados']
+        if not borrados.cantidad:
+            return 0
+        vivas = borrados.posiciones_vivas(len(registros))
+        nuevas = [-1] * len(registros)
+        for nueva, pos in enumerate(vivas):
+            nuevas[pos] = nueva
+        tabla['registros'] = registros.con_posiciones(vivas)
+        for indice in tabla['indices'].values():
+            indice.renumerar(nuevas)
+        eliminadas = borrados.cantidad
+        tabla['borrados'] = Borrados()
+        self._registrar('C', nombre)
+        return eliminadas
+
+class Vista:
+    # foto de solo lectura de las tablas para planear y recorrer un SELECT
+    def __init__(self, tablas, indices):
+        self.tablas = tablas
+        self.indices = indices
+
+class Sesion(BaseDatosMemoria):
+    # vista de una conexión sobre una BaseDatosMemoria compartida entre hilos. Lee la
+    # versión confirmada que había al empezar la sentencia (o la transacción) y escribe
+    # sobre copias de las tablas que toca; confirmar() las publica de una vez, así que
+    # las lecturas de otros hilos nunca ven una escritura a medias ni esperan por ella
+    def __init__(self, compartida):
+        self.compartida = compartida
+        self.almacenamiento = compartida.almacenamiento
+        self.diccionario_cadenas = compartida.diccionario_cadenas
+        self.umbral_compactacion = compartida.umbral_compactacion
+        self.versiones = compartida.versiones
+        self.cache_resultados = compartida.cache_resultados
+        self.reaplicando = False
+        self.wal = None
+        self.en_transaccion = False
+        self.escribiendo = False
+        self.en_sitio = False
+        self.propias = set()
+        self.pendientes = []
+        self.checkpoint_pendiente = False
+        self.tablas, self.indices = compartida.registrar_sesion(self)
+
+    def sesion(self):
+        return self
+
+    def _en_sitio(self):
+        return self.en_sitio
+
+    def con_bitacora(self):
+        return self.compartida.wal is not None
+
+    def vista(self):
+        # lo que ve un SELECT: no cambia aunque la sesión siga escribiendo o se refresque
+        return Vista(self.tablas, self.indices)
+
+    def refrescar(self):
+        if not self.escribiendo:
+            self.tablas, self.indices = self.compartida.version()
+
+    def _preparar_escritura(self):
+        if self.escribiendo:
+            return
+        compartida = self.compartida
+        compartida.cerrojo_escritura.acquire()
+        self.escribiendo = True
+        # con el cerrojo tomado se parte de lo último confirmado por otros escritores
+        tablas, indices = compartida.version()
+        compartida.cerrojo_solo.acquire()
+        if not self.en_transaccion and len(compartida.sesiones) == 1:
+            # sentencia suelta y nadie más mirando: se escribe sobre la versión publicada,
+            # sin copias y sin poder deshacer, como sin sesiones
+            self.en_sitio = True
+            self.tablas = tablas
+            self.indices = indices
+            self.propias = set(tablas)
+            return
+        compartida.cerrojo_solo.release()
+        self.tablas = dict(tablas)
+        self.indices = dict(indices)
+
+    def _escribible(self, nombre):
+        self._preparar_escritura()
         if nombre not in self.tablas:
             raise RuntimeError(f"Tabla {nombre} no existe")
-        nuevos = []
-        borrados = 0
-        for registro in self.tablas[nombre]['registros']:
-            if condicion_fn(registro):
-                borrados += 1
-            else:
-                nuevos.append(registro)
-        self.tablas[nombre]['registros'] = nuevos
-        return borrados
\ No newline at end of file
+        if nombre not in self.propias:
+            tabla = _copiar_tabla(self.tablas[nombre])
+            self.tablas[nombre] = tabla
+            for indice in tabla['indices'].values():
+                self.indices[indice.nombre] = indice
+            self.propias.add(nombre)
+        tabla = self.tablas[nombre]
+        tabla['version'] = next(self.versiones)
+        return tabla
+
+    def crear_tabla(self, nombre, columnas):
+        BaseDatosMemoria.crear_tabla(self, nombre, columnas)
+        self.propias.add(nombre)
+
+    def abrir_snapshot(self, ruta):
+        tablas = BaseDatosMemoria.abrir_snapshot(self, ruta)
+        self.propias.update(self.tablas)
+        return tablas
+
+    def _registrar(self, *registro):
+        # los registros de la bitácora se escriben recién al confirmar
+        if self.con_bitacora():
+            self.pendientes.append(list(registro))
+
+    def checkpoint(self):
+        self.checkpoint_pendiente = True
+
+    def iniciar_transaccion(self):
+        self.refrescar()
+        self.en_transaccion = True
+
+    def terminar_transaccion(self, confirmar, sincronizar=False):
+        self.en_transaccion = False
+        if confirmar:
+            self.confirmar(sincronizar)
+        else:
+            self.deshacer()
+
+    def confirmar(self, sincronizar=False):
+        if not self.escribiendo:
+            return
+        compartida = self.compartida
+        try:
+            if compartida.wal is not None and self.pendientes and not self.checkpoint_pendiente:
+                # un solo registro por transacción: al recuperar se aplica completa o nada
+                if len(self.pendientes) == 1:
+                    compartida.wal.escribir(self.pendientes[0])
+                else:
+                    compartida.wal.escribir(['TX', self.pendientes])
+            compartida.publicar(self.tablas, self.indices)
+            if compartida.wal is not None:
+                if self.checkpoint_pendiente or compartida.wal.requiere_checkpoint():
+                    compartida.checkpoint()
+                elif sincronizar:
+                    compartida.wal.sincronizar()
+        finally:
+            self._terminar()
+
+    def deshacer(self):
+        if self.escribiendo and self.en_sitio:
+            # sentencia suelta escrita en el lugar: no hay copia a la que volver y lo que
+            # alcanzó a cambiar ya está en memoria, quizás a medias dentro de una operación.
+            # Se confirma y la bitácora se reemplaza por un checkpoint de ese estado, así
+            # recuperar da lo mismo que hay en memoria
+            self.checkpoint_pendiente = True
+            self.confirmar()
+        elif self.escribiendo:
+            self._terminar()
+        self.tablas, self.indices = self.compartida.version()
+
+    def _terminar(self):
+        self.propias = set()
+        self.pendientes = []
+        self.checkpoint_pendiente = False
+        self.escribiendo = False
+        if self.en_sitio:
+            self.en_sitio = False
+            self.compartida.cerrojo_solo.release()
+        self.compartida.cerrojo_escritura.release()
\ No newline at end of file
@@ -0,0 +1,228 @@
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import sys
+import time
+
+from lexer import tokenizar
+from base_datos import BaseDatosMemoria
+from parser import Parser
+
+# cantidad de filas de la tabla principal en cada escala; las tablas t2, t3 y t4 tienen
+# 10, 100 y 1000 veces menos (al menos MIN_FILAS) y cada una apunta a la siguiente por ref
+ESCALAS = (1000, 100000, 1000000)
+MIN_FILAS = 10
+TABLAS = ('t1', 't2', 't3', 't4')
+COLUMNAS = [('id', 'entero'), ('grupo', 'entero'), ('valor', 'flotante'), ('nombre', 'cadena'), ('ref', 'entero')]
+TIPOS_SQLITE = {'entero': 'INTEGER', 'flotante': 'REAL', 'cadena': 'TEXT'}
+GRUPOS = 97
+LOTE_INSERT = 1000
+# cuántas veces se ejecuta cada consulta (con constantes distintas) para los percentiles
+REPETICIONES = {'select_punto': 100, 'select_rango': 20, 'agrupar': 5, 'ordenar_top': 10,
+                'join_2': 5, 'join_3': 5, 'join_4': 5, 'actualizar': 5, 'borrar': 5, 'verificar': 1}
+
+def filas_de(n):
+    return {tabla: max(MIN_FILAS, n // 10 ** k) for k, tabla in enumerate(TABLAS)}
+
+def generar_filas(cantidad, destino):
+    # valor es múltiplo de 0.25: las sumas en flotante son exactas en los dos motores
+    for i in range(cantidad):
+        yield (i, i % GRUPOS, (i * 7919 % cantidad) * 0.5 + 0.25, f'nombre {i % 1000}', i % destino)
+
+def carga(n):
+    # (sql del motor, sql de sqlite, filas) de cada sentencia que crea y llena las tablas;
+    # solo cambian los nombres de los tipos en CREATE TABLE
+    filas = filas_de(n)
+    for tabla in TABLAS:
+        yield (f"CREATE TABLE {tabla} ({', '.join(f'{c} {t}' for c, t in COLUMNAS)})",
+               f"CREATE TABLE {tabla} ({', '.join(f'{c} {TIPOS_SQLITE[t]}' for c, t in COLUMNAS)})", 0)
+    for k, tabla in enumerate(TABLAS):
+        destino = filas[TABLAS[k + 1]] if k + 1 < len(TABLAS) else MIN_FILAS
+        lote = []
+        for fila in generar_filas(filas[tabla], destino):
+            lote.append("(%d, %d, %r, '%s', %d)" % fila)
+            if len(lote) == LOTE_INSERT:
+                yield _insert(tabla, lote)
+                lote = []
+        if lote:
+            yield _insert(tabla, lote)
+
+def _insert(tabla, lote):
+    sql = f"INSERT INTO {tabla} ({', '.join(c for c, _ in COLUMNAS)}) VALUES {', '.join(lote)}"
+    return sql, sql, len(lote)
+
+def consultas(n, rnd):
+    # (nombre, sql, ordenada) de la carga de trabajo, en el orden en que se ejecuta: las
+    # escrituras van al final y verificar compara el estado que dejaron
+    for _ in range(REPETICIONES['select_punto']):
+        yield 'select_punto', f"SELECT id, nombre, valor FROM t1 WHERE id = {rnd.randrange(n)}", False
+    for _ in range(REPETICIONES['select_rango']):
+        yield ('select_rango', f"SELECT COUNT(*), SUM(valor) FROM t1 WHERE valor > {rnd.randrange(n) * 0.5}"
+               f" AND grupo < {rnd.randrange(GRUPOS)}", False)
+    for _ in range(REPETICIONES['agrupar']):
+        yield ('agrupar', f"SELECT grupo, COUNT(*), SUM(valor), MIN(nombre), MAX(id) FROM t1"
+               f" WHERE id >= {rnd.randrange(n // 2)} GROUP BY grupo", False)
+    for _ in range(REPETICIONES['ordenar_top']):
+        yield ('ordenar_top', f"SELECT id, valor FROM t1 WHERE grupo = {rnd.randrange(GRUPOS)}"
+               f" ORDER BY valor DESC, id LIMIT 10", True)
+    for _ in range(REPETICIONES['join_2']):
+        yield ('join_2', f"SELECT t2.grupo, COUNT(*), SUM(t1.valor) FROM t1, t2 WHERE t1.ref = t2.id"
+               f" AND t2.grupo < {rnd.randrange(1, GRUPOS)} GROUP BY t2.grupo", False)
+    for _ in range(REPETICIONES['join_3']):
+        yield ('join_3', f"SELECT t3.grupo, COUNT(*), SUM(t1.valor) FROM t1, t2, t3 WHERE t1.ref = t2.id"
+               f" AND t2.ref = t3.id AND t3.grupo < {rnd.randrange(1, GRUPOS)} GROUP BY t3.grupo", False)
+    for _ in range(REPETICIONES['join_4']):
+        yield ('join_4', f"SELECT t4.nombre, COUNT(*), SUM(t1.valor), SUM(t3.valor) FROM t1, t2, t3, t4"
+               f" WHERE t1.ref = t2.id AND t2.ref = t3.id AND t3.ref = t4.id AND t1.grupo = {rnd.randrange(GRUPOS)}"
+               f" GROUP BY t4.nombre", False)
+    for _ in range(REPETICIONES['actualizar']):
+        yield 'actualizar', f"UPDATE t1 SET valor = valor + 1 WHERE grupo = {rnd.randrange(GRUPOS)}", False
+    for _ in range(REPETICIONES['borrar']):
+        yield 'borrar', f"DELETE FROM t1 WHERE grupo = {rnd.randrange(GRUPOS)} AND id < {rnd.randrange(n)}", False
+    yield 'verificar', "SELECT COUNT(*), SUM(valor), MIN(id), MAX(id) FROM t1", False
+
+class Motor:
+    # el motor de este proyecto: cada sentencia pasa por el lexer, el Parser y la base
+    def __init__(self, almacenamiento, diccionario_cadenas=False):
+        self.bd = BaseDatosMemoria(almacenamiento, diccionario_cadenas=diccionario_cadenas)
+
+    def ejecutar(self, sql):
+        # filas de un SELECT o cantidad de filas que cambió una escritura
+        capturadas = []
+        parser = Parser(tokenizar(sql), self.bd, salida=lambda schema, filas: capturadas.append(list(filas)))
+        res = parser.parsear_programa()[0]
+        if parser.errores:
+            raise RuntimeError(f"{sql}: {parser.errores[0].get('mensaje')}")
+        if capturadas:
+            return capturadas[0]
+        for clave in ('insertadas', 'afectadas', 'borrados'):
+            if clave in res:
+                return res[clave]
+        return None
+
+class Sqlite:
+    def __init__(self):
+        self.conexion = sqlite3.connect(':memory:', isolation_level=None)
+
+    def ejecutar(self, sql):
+        cursor = self.conexion.execute(sql)
+        if cursor.description is not None:
+            return cursor.fetchall()
+        return cursor.rowcount if cursor.rowcount >= 0 else None
+
+def normalizar(resultado, ordenada):
+    # los dos motores tienen que dar las mismas filas; sin ORDER BY en cualquier orden
+    if not isinstance(resultado, list):
+        return resultado
+    filas = [tuple(float(v) if isinstance(v, float) else v for v in fila) for fila in resultado]
+    return filas if ordenada else sorted(filas, key=repr)
+
+def percentil(tiempos, p):
+    # percentil por rango más cercano de una lista ya ordenada
+    return tiempos[max(0, -(-len(tiempos) * p // 100) - 1)]
+
+def resumen(tiempos, filas=None):
+    tiempos = sorted(tiempos)
+    total = sum(tiempos)
+    datos = {'ejecuciones': len(tiempos), 'total_s': total,
+             'ops_por_s': len(tiempos) / total if total else None,
+             'latencia_ms': {f'p{p}': percentil(tiempos, p) * 1000 for p in (50, 90, 99)}}
+    datos['latencia_ms']['max'] = tiempos[-1] * 1000
+    if filas is not None:
+        datos['filas_por_s'] = filas / total if total else None
+    return datos
+
+def medir(motor, sql):
+    inicio = time.perf_counter()
+    resultado = motor.ejecutar(sql)
+    return resultado, time.perf_counter() - inicio
+
+def correr_escala(n, almacenamiento, semilla, diccionario_cadenas=False):
+    # ejecuta la carga en los dos motores sentencia por sentencia y junta los tiempos por
+    # operación; diferencias guarda las consultas cuyos resultados no coinciden
+    motores = {'motor': Motor(almacenamiento, diccionario_cadenas), 'sqlite': Sqlite()}
+    tiempos = {}
+    filas_insertadas = 0
+    diferencias = []
+    for sql_motor, sql_sqlite, filas in carga(n):
+        nombre = 'insertar' if filas else 'crear'
+        filas_insertadas += filas
+        for clave, sql in (('motor', sql_motor), ('sqlite', sql_sqlite)):
+            _, segundos = medir(motores[clave], sql)
+            tiempos.setdefault(nombre, {'motor': [], 'sqlite': []})[clave].append(segundos)
+    for nombre, sql, ordenada in consultas(n, random.Random(semilla)):
+        resultados = {}
+        for clave in ('motor', 'sqlite'):
+            resultado, segundos = medir(motores[clave], sql)
+            resultados[clave] = normalizar(resultado, ordenada)
+            tiempos.setdefault(nombre, {'motor': [], 'sqlite': []})[clave].append(segundos)
+        if resultados['motor'] != resultados['sqlite']:
+            diferencias.append({'operacion': nombre, 'sql': sql, 'motor': repr(resultados['motor'])[:200],
+                                'sqlite': repr(resultados['sqlite'])[:200]})
+    operaciones = {}
+    for nombre, por_motor in tiempos.items():
+        filas = filas_insertadas if nombre == 'insertar' else None
+        operaciones[nombre] = {clave: resumen(valores, filas) for clave, valores in por_motor.items()}
+        operaciones[nombre]['coinciden'] = not any(d['operacion'] == nombre for d in diferencias)
+    return {'filas': filas_de(n), 'operaciones': operaciones, 'diferencias': diferencias}
+
+def regresiones(actual, base, umbral):
+    # operaciones cuya latencia mediana en el motor creció más que umbral (0.2 = 20 %)
+    # respecto de la base; solo se comparan las escalas y operaciones presentes en las dos
+    encontradas = []
+    for escala, datos in actual['escalas'].items():
+        datos_base = base.get('escalas', {}).get(escala)
+        if datos_base is None:
+            continue
+        for nombre, operacion in datos['operaciones'].items():
+            operacion_base = datos_base['operaciones'].get(nombre)
+            if operacion_base is None:
+                continue
+            ahora = operacion['motor']['latencia_ms']['p50']
+            antes = operacion_base['motor']['latencia_ms']['p50']
+            if ahora > antes * (1 + umbral):
+                encontradas.append({'escala': escala, 'operacion': nombre, 'p50_base_ms': antes, 'p50_ms': ahora,
+                                    'cambio': ahora / antes - 1 if antes else None})
+    return encontradas
+
+if __name__ == '__main__':
+    argumentos = argparse.ArgumentParser(description="carga sintética en el motor y en sqlite3 :memory:")
+    argumentos.add_argument('--escalas', default=','.join(map(str, ESCALAS)),
+                            help="filas de la tabla principal, separadas por coma")
+    argumentos.add_argument('--almacenamiento', choices=('filas', 'columnar', 'tuplas'), default='filas')
+    argumentos.add_argument('--diccionario-cadenas', action='store_true',
+                            help="columnas cadena codificadas con diccionario (solo almacenamiento columnar)")
+    argumentos.add_argument('--semilla', type=int, default=7)
+    argumentos.add_argument('--salida', help="archivo para el JSON en lugar de la consola")
+    argumentos.add_argument('--base', help="JSON de una corrida anterior contra el que buscar regresiones")
+    argumentos.add_argument('--umbral', type=float, default=0.2,
+                            help="cuánto más lenta (fracción de la mediana) puede ser una operación que en la base")
+    opciones = argumentos.parse_args()
+
+    informe = {'almacenamiento': opciones.almacenamiento, 'diccionario_cadenas': opciones.diccionario_cadenas,
+               'semilla': opciones.semilla,
+               'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'escalas': {}}
+    for escala in opciones.escalas.split(','):
+        informe['escalas'][escala] = correr_escala(int(escala), opciones.almacenamiento, opciones.semilla,
+                                                   opciones.diccionario_cadenas)
+    fallas = [d for datos in informe['escalas'].values() for d in datos['diferencias']]
+    if opciones.base is not None:
+        with open(opciones.base, encoding='utf-8') as f:
+            informe['regresiones'] = regresiones(informe, json.load(f), opciones.umbral)
+        informe['umbral'] = opciones.umbral
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if opciones.salida is None:
+        print(texto)
+    else:
+        with open(opciones.salida, 'w', encoding='utf-8') as f:
+            f.write(texto + "\n")
+    # resultados distintos a los de sqlite o una regresión: la corrida falla
+    if fallas or informe.get('regresiones'):
+        for d in fallas:
+            print(f"Resultado distinto de sqlite en {d['operacion']}: {d['sql']}", file=sys.stderr)
+        for r in informe.get('regresiones', ()):
+            print(f"Regresión en {r['operacion']} ({r['escala']} filas): p50 {r['p50_base_ms']:.3f} ms -> {r['p50_ms']:.3f} ms",
+                  file=sys.stderr)
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,133 @@
+import collections
+import io
+import random
+import re
+import sys
+import time
+
+import lexer
+from lexer import tokenizar_flujo
+
+# el lexer anterior, como referencia: un match por posición (también para espacios y
+# comentarios, que después se descartan), IGNORECASE, upper() en cada identificador y
+# tokens con __dict__
+PATRONES_ANTERIORES = [
+    ('ESPACIO', r'\s+'),
+    ('COMENTARIO', r'--[^\n]*'),
+    ('NUMERO', r'\d+\.\d+|\d+'),
+    ('CADENA', r"'([^'\\]|\\.)*'|\"([^\"\\]|\\.)*\""),
+    ('PUNTO_COMA', r';'),
+    ('COMA', r','),
+    ('PAR_ABRE', r'\('),
+    ('PAR_CIERRA', r'\)'),
+    ('AST', r'\*'),
+    ('MENOR_IGUAL', r'<='),
+    ('MAYOR_IGUAL', r'>='),
+    ('DISTINTO', r'<>|!='),
+    ('MENOR', r'<'),
+    ('MAYOR', r'>'),
+    ('IGUAL', r'='),
+    ('MAS', r'\+'),
+    ('MENOS', r'-'),
+    ('POR', r'\*'),
+    ('DIV', r'\/'),
+    ('PUNTO', r'\.'),
+    ('PARAM', r'\?|:[A-Za-z_][A-Za-z0-9_]*'),
+    ('DOS_PUNTOS', r':'),
+    ('IDENT', r'[A-Za-z_][A-Za-z0-9_]*'),
+]
+regex_anterior = re.compile('|'.join('(?P<%s>%s)' % par for par in PATRONES_ANTERIORES), re.IGNORECASE)
+
+class TokenAnterior:
+    def __init__(self, tipo, valor, linea, columna):
+        self.tipo = tipo
+        self.valor = valor
+        self.linea = linea
+        self.columna = columna
+
+def tokens_anteriores(texto):
+    pos = 0
+    linea = 1
+    columna = 1
+    while pos < len(texto):
+        m = regex_anterior.match(texto, pos)
+        if not m:
+            raise SyntaxError(f"Error léxico en línea {linea} columna {columna}: {texto[pos]!r}")
+        tipo = m.lastgroup
+        valor = m.group(tipo)
+        if tipo == 'ESPACIO':
+            nueva_lineas = valor.count('\n')
+            if nueva_lineas:
+                linea += nueva_lineas
+                columna = len(valor) - valor.rfind('\n')
+            else:
+                columna += len(valor)
+            pos = m.end()
+            continue
+        if tipo == 'COMENTARIO':
+            columna += len(valor)
+            pos = m.end()
+            continue
+        if tipo == 'IDENT':
+            if valor.upper() in lexer.PALABRAS_RESERVADAS:
+                tipo = valor.upper()
+                valor = valor.upper()
+            elif valor.upper() in lexer.FUNCIONES_AGREGADAS:
+                tipo = 'AGREGADO'
+        yield TokenAnterior(tipo, valor, linea, columna)
+        pos = m.end()
+        columna += len(valor)
+    yield TokenAnterior('EOF', '', linea, columna)
+
+def generar_guion(megas):
+    # script de unos megas MB con las sentencias que acepta el parser, comentarios,
+    # cadenas, parámetros y saltos de línea \n y \r\n
+    rnd = random.Random(7)
+    partes = []
+    tamano = 0
+    i = 0
+    while tamano < megas * 1000000:
+        i += 1
+        k = i % 5
+        if k == 0:
+            sentencia = (f"INSERT INTO pedidos (id, cliente_id, total, nota) VALUES ({i}, {rnd.randint(1, 999)},"
+                         f" {rnd.randint(1, 9999)}.{rnd.randint(0, 99)}, 'nota del pedido {i}');\n")
+        elif k == 1:
+            sentencia = (f"-- consulta {i}\nSELECT p.id, c.nombre, SUM(p.total) AS suma FROM pedidos p, clientes c\n"
+                         f"    WHERE p.cliente_id = c.id AND p.total >= {i} GROUP BY c.nombre ORDER BY suma DESC LIMIT 10;\n")
+        elif k == 2:
+            sentencia = f"UPDATE pedidos SET total = total + 1.5 WHERE id <> {i} AND nota != 'x';\r\n"
+        elif k == 3:
+            sentencia = "select count(*) from Clientes where Nombre = :nombre and id < ? ;\n\n"
+        else:
+            sentencia = f"DELETE FROM pedidos WHERE id = {i} OR (total / 2 > 10 AND cliente_id <= 3);\n"
+        partes.append(sentencia)
+        tamano += len(sentencia)
+    return ''.join(partes)
+
+def medir(tokens):
+    # (cantidad, segundos) recorriendo los tokens sin guardarlos: con 100 MB la lista
+    # completa no entraría en memoria
+    inicio = time.perf_counter()
+    ultimo = collections.deque(enumerate(tokens, 1), maxlen=1)
+    return ultimo[0][0], time.perf_counter() - inicio
+
+def comparar(texto):
+    # los dos lexers tienen que dar exactamente los mismos tokens, líneas y columnas
+    nuevos = tokenizar_flujo(io.StringIO(texto))
+    for anterior, nuevo in zip(tokens_anteriores(texto), nuevos):
+        if (anterior.tipo, anterior.valor, anterior.linea, anterior.columna) != (nuevo.tipo, nuevo.valor, nuevo.linea, nuevo.columna):
+            return False
+    return next(nuevos, None) is None
+
+if __name__ == '__main__':
+    megas = float(sys.argv[1]) if len(sys.argv) > 1 else 100
+    texto = generar_guion(megas)
+    if not comparar(texto[:texto.index(';', 1000000) + 1]):
+        print("Los tokens no coinciden con los del lexer anterior")
+        sys.exit(1)
+    cantidad, t_anterior = medir(tokens_anteriores(texto))
+    _, t_nuevo = medir(tokenizar_flujo(io.StringIO(texto)))
+    print(f"{len(texto) / 1000000:.1f} MB, {cantidad} tokens")
+    print(f"anterior {t_anterior:8.2f}s {cantidad / t_anterior:12.0f} tokens/s")
+    print(f"actual   {t_nuevo:8.2f}s {cantidad / t_nuevo:12.0f} tokens/s  x{t_anterior / t_nuevo:.2f}")
\ No newline at end of file
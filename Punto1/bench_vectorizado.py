@@ -0,0 +1,53 @@
+import io
+import random
+import sys
+import time
+import contextlib
+
+from lexer import tokenizar
+from base_datos import BaseDatosMemoria
+from parser import Parser
+import vectorizado
+
+CONSULTAS = [
+    "SELECT id FROM t WHERE total > 990 AND cantidad < 3;",
+    "SELECT id, ciudad FROM t WHERE ciudad = 'Cali' AND total + total >= 1990;",
+    "UPDATE t SET total = total + 1 WHERE cantidad = 7;",
+    "DELETE FROM t WHERE total / 2 > 499.5;",
+]
+
+def crear_base(n):
+    rnd = random.Random(7)
+    bd = BaseDatosMemoria('columnar')
+    bd.crear_tabla('t', [('id', 'entero'), ('total', 'flotante'), ('cantidad', 'entero'), ('ciudad', 'cadena')])
+    ciudades = ['Bogota', 'Cali', 'Medellin', 'Pasto']
+    columnas = {
+        'id': list(range(n)),
+        'total': [rnd.randint(0, 1000) + 0.5 for _ in range(n)],
+        'cantidad': [rnd.randint(0, 10) for _ in range(n)],
+        'ciudad': [rnd.choice(ciudades) for _ in range(n)],
+    }
+    bd.tablas['t']['registros'].cargar_columnas(columnas, n)
+    return bd
+
+def medir(n, habilitado):
+    vectorizado.HABILITADO = habilitado
+    bd = crear_base(n)
+    tiempos = []
+    for consulta in CONSULTAS:
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            Parser(tokenizar(consulta), bd).parsear_programa()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    if not vectorizado.disponible():
+        print("NumPy no está instalado; solo hay evaluación fila a fila")
+        sys.exit(1)
+    escalar = medir(n, False)
+    vectorial = medir(n, True)
+    print(f"{n} filas")
+    for consulta, t_esc, t_vec in zip(CONSULTAS, escalar, vectorial):
+        print(f"{t_esc:8.3f}s {t_vec:8.3f}s  x{t_esc / t_vec:6.1f}  {consulta}")
\ No newline at end of file
@@ -0,0 +1,76 @@
+from itertools import compress
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# fracción de filas borradas a partir de la cual DELETE compacta la tabla
+UMBRAL_COMPACTACION = 0.25
+
+class Borrados:
+    # bitmap de las filas borradas de una tabla (bit en 1 = borrada). DELETE solo marca:
+    # las posiciones de las demás filas, que son las que guardan los índices, no cambian
+    # hasta que se compacta la tabla
+    def __init__(self):
+        self.bits = bytearray()
+        self.cantidad = 0
+        # la copia de una sesión comparte el bitmap hasta que marca una fila
+        self.propio = True
+
+    def copia(self):
+        nuevo = Borrados()
+        nuevo.bits = self.bits
+        nuevo.cantidad = self.cantidad
+        nuevo.propio = False
+        return nuevo
+
+    def borrada(self, pos):
+        byte = pos >> 3
+        return byte < len(self.bits) and (self.bits[byte] >> (pos & 7)) & 1
+
+    def marcar(self, pos):
+        if not self.propio:
+            self.bits = bytearray(self.bits)
+            self.propio = True
+        byte = pos >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if not (self.bits[byte] >> (pos & 7)) & 1:
+            self.bits[byte] |= 1 << (pos & 7)
+            self.cantidad += 1
+
+    def _vivas(self, n):
+        # un booleano por posición, True si la fila sigue viva
+        borrada = self.borrada
+        return (not borrada(pos) for pos in range(n))
+
+    def vivos(self, registros):
+        if not self.cantidad:
+            return registros
+        return compress(registros, self._vivas(len(registros)))
+
+    def enumerar(self, registros):
+        # (posición, registro) de las filas vivas
+        if not self.cantidad:
+            return enumerate(registros)
+        return compress(enumerate(registros), self._vivas(len(registros)))
+
+    def posiciones_vivas(self, n):
+        return list(compress(range(n), self._vivas(n)))
+
+    def posiciones_borradas(self, n):
+        return [pos for pos in range(min(n, len(self.bits) * 8)) if self.borrada(pos)]
+
+    def mascara_vivas(self, n):
+        # arreglo de NumPy con las filas vivas; None si no hay ninguna borrada
+        if not self.cantidad:
+            return None
+        bits = np.unpackbits(np.frombuffer(bytes(self.bits), dtype=np.uint8), bitorder='little')
+        vivas = np.ones(n, dtype=bool)
+        hasta = min(n, len(bits))
+        vivas[:hasta] = bits[:hasta] == 0
+        return vivas
+
+    def supera(self, total, umbral):
+        return total > 0 and self.cantidad > umbral * total
\ No newline at end of file
@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+def _versiones(nombres, tablas):
+    # versión actual de cada tabla; None si alguna no existe
+    versiones = []
+    for nombre in nombres:
+        if nombre not in tablas:
+            return None
+        versiones.append((nombre, tablas[nombre]['version']))
+    return tuple(versiones)
+
+def _valores(parametros):
+    # los parámetros con su tipo: 1, 1.0 y True son iguales como claves pero no como resultado
+    if parametros is None:
+        return ()
+    if isinstance(parametros, dict):
+        return tuple(sorted((nombre, type(valor), valor) for nombre, valor in parametros.items()))
+    return tuple((type(valor), valor) for valor in parametros)
+
+class CacheResultados:
+    # filas de los SELECT ya ejecutados, por texto normalizado de la sentencia, valores de
+    # sus parámetros y versión de cada tabla que lee. Toda escritura le pone una versión
+    # nueva a su tabla, así que una entrada vieja no se vuelve a pedir y termina saliendo
+    # por LRU. capacidad es el máximo de filas guardadas sumando todas las entradas
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self.entradas = OrderedDict()
+        self.filas = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.cerrojo = threading.Lock()
+
+    def clave(self, sentencia, parametros, tablas):
+        # None si la sentencia no se puede guardar
+        texto = sentencia.get('texto')
+        versiones = _versiones([nombre for nombre, _ in sentencia['tablas']], tablas)
+        if texto is None or versiones is None:
+            return None
+        clave = (texto, _valores(parametros) if sentencia.get('con_parametros') else (), versiones)
+        try:
+            hash(clave)
+        except TypeError:
+            return None
+        return clave
+
+    def buscar(self, clave):
+        # (schema, filas) guardados o None
+        with self.cerrojo:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def guardar(self, clave, schema, filas):
+        tamano = max(1, len(filas))
+        if tamano > self.capacidad:
+            return
+        with self.cerrojo:
+            anterior = self.entradas.pop(clave, None)
+            if anterior is not None:
+                self.filas -= max(1, len(anterior[1]))
+            self.entradas[clave] = (schema, filas)
+            self.filas += tamano
+            while self.filas > self.capacidad:
+                _, (_, descartadas) = self.entradas.popitem(last=False)
+                self.filas -= max(1, len(descartadas))
+
+    def guardar_al_terminar(self, clave, schema, filas, tablas):
+        # deja pasar las filas a medida que se piden y las guarda solo si se leyeron todas,
+        # no superan la capacidad y ninguna tabla cambió de versión mientras tanto (una
+        # sentencia suelta sin otras sesiones escribe sobre las mismas tablas)
+        guardadas = []
+        for fila in filas:
+            if guardadas is not None:
+                guardadas.append(fila)
+                if len(guardadas) > self.capacidad:
+                    guardadas = None
+            yield fila
+        if guardadas is not None and _versiones([nombre for nombre, _ in clave[2]], tablas) == clave[2]:
+            self.guardar(clave, schema, tuple(guardadas))
\ No newline at end of file
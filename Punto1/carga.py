@@ -0,0 +1,145 @@
+import csv
+import json
+
+from tipos import tipo_valor_runtime, convertir_lote
+
+TAMANO_LOTE = 10000
+
+EXTENSIONES_JSON = ('.jsonl', '.ndjson', '.json')
+
+_CONVERSION_RAPIDA = {'entero': int, 'flotante': float}
+
+def _convertir_texto(tipo, texto):
+    # un campo del CSV al tipo de la columna; el campo vacío es nulo
+    if texto == '':
+        return None
+    if tipo == 'entero':
+        try:
+            return int(texto)
+        except ValueError:
+            # mismas reglas que INSERT: un flotante en columna entera se trunca
+            return int(float(texto))
+    if tipo == 'flotante':
+        return float(texto)
+    if tipo == 'booleano':
+        if texto.upper() == 'TRUE':
+            return True
+        if texto.upper() == 'FALSE':
+            return False
+        raise ValueError(texto)
+    return texto
+
+def convertir_textos(tipo, textos):
+    # columna de textos -> (valores, índices de los que no se pudieron convertir); se
+    # intenta primero toda la columna con map y solo si falla se va valor a valor
+    rapida = _CONVERSION_RAPIDA.get(tipo)
+    if rapida is not None and '' not in textos:
+        try:
+            return list(map(rapida, textos)), []
+        except ValueError:
+            pass
+    if tipo == 'cadena':
+        return [None if t == '' else t for t in textos], []
+    valores = []
+    malos = []
+    for i, texto in enumerate(textos):
+        try:
+            valores.append(_convertir_texto(tipo, texto))
+        except (ValueError, OverflowError):
+            valores.append(None)
+            malos.append(i)
+    return valores, malos
+
+def _sin_filas(columnas, malos):
+    malos = set(malos)
+    return {col: [v for i, v in enumerate(valores) if i not in malos] for col, valores in columnas.items()}
+
+def _lotes_csv(archivo, esquema, tamano_lote):
+    # la primera fila trae los nombres de las columnas
+    lector = csv.reader(archivo)
+    cabecera = next(lector, None)
+    if cabecera is None:
+        return
+    errores = []
+    usadas = []
+    for i, col in enumerate(cabecera):
+        col = col.strip()
+        if col in esquema:
+            usadas.append((i, col))
+        else:
+            errores.append((f"columna {col} no existe", 1))
+    filas = []
+    lineas = []
+    for campos in lector:
+        if len(campos) != len(cabecera):
+            if campos:
+                errores.append((f"la línea tiene {len(campos)} campos y la cabecera {len(cabecera)}", lector.line_num))
+            continue
+        filas.append(campos)
+        lineas.append(lector.line_num)
+        if len(filas) >= tamano_lote:
+            yield _lote_csv(filas, lineas, usadas, esquema, errores)
+            filas, lineas, errores = [], [], []
+    if filas or errores:
+        yield _lote_csv(filas, lineas, usadas, esquema, errores)
+
+def _lote_csv(filas, lineas, usadas, esquema, errores):
+    transpuesta = list(zip(*filas)) if filas else []
+    columnas = {}
+    malos = set()
+    for i, col in usadas:
+        textos = transpuesta[i] if transpuesta else ()
+        valores, malos_col = convertir_textos(esquema[col], textos)
+        for k in malos_col:
+            errores.append((f"valor {textos[k]!r} no es válido para la columna {col} ({esquema[col]})", lineas[k]))
+        malos.update(malos_col)
+        columnas[col] = valores
+    if malos:
+        columnas = _sin_filas(columnas, malos)
+    return columnas, len(filas) - len(malos), errores
+
+def _lotes_json(archivo, esquema, tamano_lote):
+    # un objeto JSON por línea; los valores siguen las reglas de conversión de INSERT
+    objetos = []
+    errores = []
+    desconocidas = set()
+    for numero, linea in enumerate(archivo, 1):
+        if not linea.strip():
+            continue
+        try:
+            objeto = json.loads(linea)
+        except ValueError as e:
+            errores.append((f"JSON inválido: {e}", numero))
+            continue
+        if not isinstance(objeto, dict):
+            errores.append(("cada línea debe ser un objeto JSON", numero))
+            continue
+        for col in objeto:
+            if col not in esquema and col not in desconocidas:
+                desconocidas.add(col)
+                errores.append((f"columna {col} no existe", numero))
+        objetos.append(objeto)
+        if len(objetos) >= tamano_lote:
+            yield _lote_json(objetos, esquema), len(objetos), errores
+            objetos, errores = [], []
+    if objetos or errores:
+        yield _lote_json(objetos, esquema), len(objetos), errores
+
+def _lote_json(objetos, esquema):
+    presentes = set()
+    for objeto in objetos:
+        presentes.update(objeto)
+    columnas = {}
+    for col, tipo in esquema.items():
+        if col not in presentes:
+            continue
+        valores = [objeto.get(col) for objeto in objetos]
+        columnas[col] = convertir_lote(tipo, [tipo_valor_runtime(v) for v in valores], valores)
+    return columnas
+
+def leer_lotes(archivo, ruta, esquema, tamano_lote=TAMANO_LOTE):
+    # produce (columna -> valores convertidos, cantidad de filas, [(mensaje, línea del archivo)])
+    # de a tamano_lote filas; el formato sale de la extensión (JSON por líneas o CSV)
+    if ruta.lower().endswith(EXTENSIONES_JSON):
+        return _lotes_json(archivo, esquema, tamano_lote)
+    return _lotes_csv(archivo, esquema, tamano_lote)
\ No newline at end of file
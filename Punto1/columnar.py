@@ -0,0 +1,348 @@
+import array
+
+CODIGOS_ARRAY = {'entero': 'q', 'flotante': 'd', 'booleano': 'b'}
+VALOR_VACIO = {'entero': 0, 'flotante': 0.0, 'booleano': False}
+CLASES = {'entero': int, 'flotante': float, 'booleano': bool, 'cadena': str}
+# buffer de los códigos de una columna cadena con diccionario
+CODIGO_DICCIONARIO = 'i'
+
+def convertir_valor(tipo, valor, col):
+    # mismas reglas de coerción que parsear_insert; lo que no encaja en el buffer es error
+    if tipo == 'entero':
+        if isinstance(valor, float):
+            return int(valor)
+        if isinstance(valor, int) and not isinstance(valor, bool):
+            return valor
+    elif tipo == 'flotante':
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            return float(valor)
+    elif tipo == 'booleano':
+        if isinstance(valor, bool):
+            return valor
+    elif tipo == 'cadena':
+        return valor if isinstance(valor, str) else str(valor)
+    else:
+        return valor
+    raise RuntimeError(f"Valor {valor!r} no es compatible con la columna {col} ({tipo})")
+
+class DiccionarioCadenas:
+    # diccionario de una columna cadena codificada: cada texto distinto se guarda una sola
+    # vez en valores y las filas guardan su posición ahí (el código). Solo crece, así que
+    # un código nunca cambia de texto y la copia de una sesión puede compartirlo con la
+    # versión publicada; la compactación arma uno nuevo con los textos que siguen en uso
+    __slots__ = ('codigos', 'valores')
+
+    def __init__(self):
+        self.codigos = {}
+        self.valores = []
+
+    def codificar(self, valor):
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def codigo(self, valor):
+        # código de un texto, None si ninguna fila lo tuvo nunca
+        return self.codigos.get(valor)
+
+class RegistrosColumnares:
+    # tabla guardada por columnas: array.array para entero/flotante/booleano, lista para
+    # cadena y un bitmap de validez por columna para los nulos. Se comporta como la lista
+    # de registros de la versión por filas: len, iteración e indexado devuelven dicts.
+    # Con diccionario las columnas cadena guardan un código por fila (array.array) y su
+    # DiccionarioCadenas; se decodifican al leerlas
+    def __init__(self, columnas, diccionario=False):
+        self.columnas = dict(columnas)
+        self.nombres = list(self.columnas)
+        self.diccionarios = {col: DiccionarioCadenas() for col, tipo in self.columnas.items()
+                             if diccionario and tipo == 'cadena'}
+        self.datos = {col: self._buffer(col) for col in self.nombres}
+        self.validos = {col: bytearray() for col in self.nombres}
+        self.nulos = {col: 0 for col in self.nombres}
+        self.total = 0
+        # columnas cuyos buffers son todavía los de la versión de la que se copió
+        self.compartidas = set()
+
+    @classmethod
+    def desde_buffers(cls, columnas, datos, validos, nulos, total):
+        # tabla armada sobre buffers ya existentes (las vistas de un snapshot abierto con
+        # mmap); no se copia nada hasta que se escribe una columna
+        registros = cls(columnas)
+        registros.datos = datos
+        registros.validos = validos
+        registros.nulos = nulos
+        registros.total = total
+        return registros
+
+    def copia(self):
+        # copia para una sesión que escribe: comparte los buffers de todas las columnas.
+        # Agregar filas los sigue compartiendo, como el DiccionarioCadenas: la otra versión
+        # no lee más allá de su total; escribible() duplica la columna antes de modificar
+        # una fila que ya existía
+        nueva = RegistrosColumnares(self.columnas)
+        nueva.diccionarios = dict(self.diccionarios)
+        nueva.datos = dict(self.datos)
+        nueva.validos = dict(self.validos)
+        nueva.compartidas = set(self.nombres)
+        nueva.nulos = dict(self.nulos)
+        nueva.total = self.total
+        return nueva
+
+    def _buffer(self, col):
+        codigo = CODIGO_DICCIONARIO if col in self.diccionarios else CODIGOS_ARRAY.get(self.columnas[col])
+        return array.array(codigo) if codigo else []
+
+    def _vacio(self, col):
+        # lo que ocupa el lugar de un nulo en el buffer
+        return 0 if col in self.diccionarios else VALOR_VACIO.get(self.columnas[col])
+
+    def _guardable(self, col, valor):
+        # un valor no nulo tal como va al buffer de la columna
+        diccionario = self.diccionarios.get(col)
+        return valor if diccionario is None else diccionario.codificar(valor)
+
+    def _guardables(self, col, valores):
+        # valores (None = nulo) tal como van al buffer de la columna
+        diccionario = self.diccionarios.get(col)
+        if diccionario is None:
+            vacio = VALOR_VACIO.get(self.columnas[col])
+            if vacio is None:
+                return valores
+            return [vacio if v is None else v for v in valores]
+        codificar = diccionario.codificar
+        return [0 if v is None else codificar(v) for v in valores]
+
+    def buffers(self, col):
+        # (datos, validez) de la columna con solo las filas de esta versión: los buffers
+        # compartidos pueden tener al final filas que agregó otra versión
+        datos = self.datos[col]
+        validos = self.validos[col]
+        if len(datos) > self.total:
+            datos = datos[:self.total]
+        if len(validos) > (self.total + 7) >> 3:
+            validos = validos[:(self.total + 7) >> 3]
+        return datos, validos
+
+    def _duplicar(self, col):
+        # buffers propios de la columna, copiados con solo las filas de esta versión
+        datos, validos = self.buffers(col)
+        if isinstance(datos, memoryview):
+            copia = array.array(datos.format)
+            copia.frombytes(datos.cast('B'))
+        elif isinstance(datos, (array.array, list)):
+            copia = datos[:]
+        else:
+            copia = list(datos)
+        self.datos[col] = copia
+        self.validos[col] = bytearray(validos)
+        self.compartidas.discard(col)
+
+    def escribible(self, col):
+        # las columnas compartidas con otra versión y las vistas de solo lectura de un
+        # snapshot se copian la primera vez que se modifica una fila
+        if col in self.compartidas or not self._modificables(col):
+            self._duplicar(col)
+        return self.datos[col]
+
+    def _modificables(self, col):
+        # False si los buffers de la columna son vistas de solo lectura de un snapshot
+        return isinstance(self.datos[col], (array.array, list)) and isinstance(self.validos[col], bytearray)
+
+    def _agregar_en(self, col, agregar):
+        # agregar(col) pone filas nuevas al final de los buffers de la columna. Antes se
+        # recorta lo que haya dejado más allá del total una copia descartada; si alguien
+        # lee los buffers por una vista (NumPy) no pueden cambiar de tamaño y se agrega
+        # sobre una copia propia
+        if not self._modificables(col):
+            self._duplicar(col)
+        try:
+            del self.datos[col][self.total:]
+            del self.validos[col][(self.total + 7) >> 3:]
+            agregar(col)
+        except BufferError:
+            self._duplicar(col)
+            agregar(col)
+
+    def __len__(self):
+        return self.total
+
+    def _valido(self, col, pos):
+        return (self.validos[col][pos >> 3] >> (pos & 7)) & 1
+
+    def _marcar(self, col, pos, valido):
+        if valido:
+            self.validos[col][pos >> 3] |= 1 << (pos & 7)
+        else:
+            self.validos[col][pos >> 3] &= ~(1 << (pos & 7)) & 0xFF
+
+    def leer(self, col, pos):
+        if self.nulos[col] and not self._valido(col, pos):
+            return None
+        valor = self.datos[col][pos]
+        if col in self.diccionarios:
+            return self.diccionarios[col].valores[valor]
+        if self.columnas[col] == 'booleano':
+            return bool(valor)
+        return valor
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += self.total
+        if not 0 <= pos < self.total:
+            raise IndexError(pos)
+        return {col: self.leer(col, pos) for col in self.nombres}
+
+    def columna(self, col):
+        # valores de una columna como lista de Python, con None en los nulos
+        valores = self.buffers(col)[0]
+        valores = valores.tolist() if isinstance(valores, (array.array, memoryview)) else list(valores)
+        if self.columnas[col] == 'booleano':
+            valores = [bool(v) for v in valores]
+        if self.nulos[col]:
+            validos = self.validos[col]
+            for pos in range(self.total):
+                if not (validos[pos >> 3] >> (pos & 7)) & 1:
+                    valores[pos] = None
+        if col in self.diccionarios:
+            textos = self.diccionarios[col].valores
+            if self.nulos[col]:
+                return [None if codigo is None else textos[codigo] for codigo in valores]
+            return [textos[codigo] for codigo in valores]
+        return valores
+
+    def __iter__(self):
+        nombres = self.nombres
+        for valores in zip(*[self.columna(col) for col in nombres]):
+            yield dict(zip(nombres, valores))
+
+    def convertir_valores(self, valores):
+        # columna -> valor con cada valor convertido al tipo de su columna; RuntimeError si
+        # alguno no es compatible
+        return {col: None if valor is None else convertir_valor(self.columnas[col], valor, col)
+                for col, valor in valores.items()}
+
+    def convertir_fila(self, fila):
+        # la fila completa convertida, con None en las columnas que no trae
+        return self.convertir_valores({col: fila.get(col) for col in self.nombres})
+
+    def append(self, fila):
+        # se convierte todo antes de tocar los buffers para no dejar filas a medias
+        convertidos = self.convertir_fila(fila)
+        pos = self.total
+
+        def agregar(col):
+            valor = convertidos[col]
+            if pos & 7 == 0:
+                self.validos[col].append(0)
+            self.datos[col].append(self._vacio(col) if valor is None else self._guardable(col, valor))
+            self._marcar(col, pos, valor is not None)
+
+        for col, valor in convertidos.items():
+            self._agregar_en(col, agregar)
+            if valor is None:
+                self.nulos[col] += 1
+        self.total += 1
+
+    def __setitem__(self, pos, fila):
+        self.escribir(pos, self.convertir_fila(fila))
+
+    def escribir(self, pos, valores):
+        # cambia en la fila pos solo las columnas de valores, ya convertidos; las demás
+        # columnas pueden seguir compartidas con otra versión
+        for col, valor in valores.items():
+            self.escribible(col)
+            era_valido = self._valido(col, pos)
+            if valor is None:
+                if era_valido:
+                    self.nulos[col] += 1
+                self._marcar(col, pos, False)
+                self.datos[col][pos] = self._vacio(col)
+            else:
+                if not era_valido:
+                    self.nulos[col] -= 1
+                self._marcar(col, pos, True)
+                self.datos[col][pos] = self._guardable(col, valor)
+
+    def extender(self, columnas, n):
+        # agrega n filas de una vez; columnas es columna -> lista de valores (None = nulo).
+        # Se valida y convierte todo el lote antes de tocar los buffers
+        listas = {}
+        for col in self.nombres:
+            valores = columnas.get(col)
+            if valores is None:
+                listas[col] = [None] * n
+                continue
+            tipo = self.columnas[col]
+            clase = CLASES.get(tipo)
+            if clase is None or not all(v is None or type(v) is clase for v in valores):
+                valores = [None if v is None else convertir_valor(tipo, v, col) for v in valores]
+            listas[col] = valores
+        inicio = self.total
+        nulos = {col: valores.count(None) for col, valores in listas.items()}
+
+        def agregar(col):
+            valores = listas[col]
+            self.datos[col].extend(self._guardables(col, valores) if nulos[col] or col in self.diccionarios else valores)
+            self._extender_validos(col, valores, inicio, nulos[col])
+
+        for col in listas:
+            self._agregar_en(col, agregar)
+            self.nulos[col] += nulos[col]
+        self.total = inicio + n
+
+    def _extender_validos(self, col, valores, inicio, nulos):
+        validos = self.validos[col]
+        if not nulos:
+            # bits que faltan del último byte y después bytes completos en 1
+            for pos in range(inicio, min(inicio + len(valores), (inicio + 7) & ~7)):
+                self._marcar(col, pos, True)
+            validos.extend(b'\xff' * (((inicio + len(valores) + 7) >> 3) - len(validos)))
+            return
+        # el último byte puede traer bits en 1 de más: cada posición se marca explícitamente
+        for pos, v in enumerate(valores, inicio):
+            if pos & 7 == 0:
+                validos.append(0)
+            self._marcar(col, pos, v is not None)
+
+    def marcar_validas(self, col, posiciones):
+        if not self.nulos[col]:
+            return
+        self.escribible(col)
+        for pos in posiciones:
+            if not self._valido(col, pos):
+                self._marcar(col, pos, True)
+                self.nulos[col] -= 1
+
+    def cargar_columnas(self, columnas, total):
+        # reemplaza el contenido por listas de valores ya convertidos (None = nulo)
+        for col in self.nombres:
+            valores = columnas[col]
+            nulos = valores.count(None)
+            datos = self._guardables(col, valores) if nulos or col in self.diccionarios else valores
+            buffer = self._buffer(col)
+            buffer.extend(datos)
+            self.datos[col] = buffer
+            if nulos:
+                validos = bytearray((total + 7) >> 3)
+                for pos, v in enumerate(valores):
+                    if v is not None:
+                        validos[pos >> 3] |= 1 << (pos & 7)
+            else:
+                validos = bytearray(b'\xff' * ((total + 7) >> 3))
+            self.validos[col] = validos
+            self.nulos[col] = nulos
+            self.compartidas.discard(col)
+        self.total = total
+
+    def con_posiciones(self, conservar):
+        # tabla nueva con solo las filas de esas posiciones, en ese orden; los diccionarios
+        # se rehacen con los textos que quedan
+        nueva = RegistrosColumnares(self.columnas, bool(self.diccionarios))
+        columnas = {}
+        for col in self.nombres:
+            valores = self.columna(col)
+            columnas[col] = [valores[pos] for pos in conservar]
+        nueva.cargar_columnas(columnas, len(conservar))
+        return nueva
\ No newline at end of file
@@ -0,0 +1,178 @@
+import re
+from collections import OrderedDict
+
+from lexer import tokenizar
+from base_datos import BaseDatosMemoria
+from parser import Parser
+from ejecutor import Ejecutor
+
+TAMANO_CACHE_PLANES = 256
+
+_ESPACIOS_FUERA_DE_CADENAS = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")|(?:\s|--[^\n]*)+")
+
+def normalizar_sql(sql):
+    # clave del caché: cada tramo de espacios y comentarios '--' fuera de los literales de
+    # cadena queda como un solo espacio. Los comentarios se quitan junto con los espacios:
+    # si no, '-- c\nWHERE' y '-- c WHERE' darían la misma clave y en el segundo el WHERE
+    # está comentado
+    return _ESPACIOS_FUERA_DE_CADENAS.sub(lambda m: m.group(1) or ' ', sql).strip()
+
+class SentenciaPreparada:
+    # sentencias ya analizadas; ejecutarlas no vuelve a pasar por el lexer ni el parser
+    def __init__(self, conexion, sql, sentencias):
+        self.conexion = conexion
+        self.sql = sql
+        self.sentencias = sentencias
+
+    def execute(self, parametros=None):
+        return self.conexion.cursor().ejecutar_preparada(self, parametros)
+
+class Cursor:
+    # interfaz al estilo DB-API: execute ejecuta el script y, si la última sentencia es un
+    # SELECT o EXPLAIN, deja sus filas como un generador que se consume con
+    # fetchone/fetchmany/fetchall
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.arraysize = 1
+        self.description = None
+        self.rowcount = -1
+        self.errores = []
+        self._filas = None
+
+    def execute(self, sql, parametros=None):
+        return self.ejecutar_preparada(self.conexion.prepare(sql), parametros)
+
+    def executemany(self, sql, secuencia_parametros):
+        preparada = self.conexion.prepare(sql)
+        sesion = self.conexion.sesion
+        if sesion.en_transaccion:
+            for parametros in secuencia_parametros:
+                self.ejecutar_preparada(preparada, parametros)
+            return self
+        # todo el lote en una transacción: las tablas se copian una vez y no por fila
+        sesion.iniciar_transaccion()
+        try:
+            for parametros in secuencia_parametros:
+                self.ejecutar_preparada(preparada, parametros)
+        except BaseException:
+            sesion.terminar_transaccion(False)
+            raise
+        sesion.terminar_transaccion(True)
+        return self
+
+    def ejecutar_preparada(self, preparada, parametros=None):
+        if self.conexion.base_datos is None:
+            raise RuntimeError("La conexión está cerrada")
+        self.description = None
+        self.rowcount = -1
+        self._filas = None
+        ejecutor = Ejecutor(self.conexion.sesion)
+        res = None
+        for sentencia in preparada.sentencias:
+            if res is not None and 'filas' in res:
+                # un SELECT que no es el último se agota antes de la siguiente sentencia
+                for _ in res['filas']:
+                    pass
+            res = ejecutor.ejecutar(sentencia, parametros)
+        self.errores = ejecutor.errores
+        if res is None:
+            return self
+        if 'filas' in res:
+            self.description = [(nombre, tipo, None, None, None, None, None) for nombre, tipo in res['schema']]
+            self._filas = res['filas']
+        else:
+            for clave in ('insertadas', 'afectadas', 'borrados'):
+                if clave in res:
+                    self.rowcount = res[clave]
+        return self
+
+    def fetchone(self):
+        if self._filas is None:
+            return None
+        return next(self._filas, None)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        if self._filas is None or size <= 0:
+            return []
+        filas = []
+        for fila in self._filas:
+            filas.append(fila)
+            if len(filas) >= size:
+                break
+        return filas
+
+    def fetchall(self):
+        if self._filas is None:
+            return []
+        return list(self._filas)
+
+    def __iter__(self):
+        return iter(self._filas or ())
+
+    def close(self):
+        self._filas = None
+
+class Conexion:
+    def __init__(self, almacenamiento='filas', tamano_cache=TAMANO_CACHE_PLANES, ruta_wal=None, base_datos=None,
+                 cache_resultados=0, diccionario_cadenas=False):
+        # con base_datos la conexión comparte una base ya abierta (p.ej. una por hilo) y
+        # también su caché de resultados
+        self.base_datos = base_datos if base_datos is not None else BaseDatosMemoria(
+            almacenamiento, ruta_wal, cache_resultados=cache_resultados, diccionario_cadenas=diccionario_cadenas)
+        self.propia = base_datos is None
+        self.sesion = self.base_datos.sesion()
+        # LRU de sentencias analizadas por texto normalizado
+        self.cache_planes = OrderedDict()
+        self.tamano_cache = tamano_cache
+        self.aciertos_cache = 0
+        self.fallos_cache = 0
+
+    def prepare(self, sql):
+        clave = normalizar_sql(sql)
+        preparada = self.cache_planes.get(clave)
+        if preparada is not None:
+            self.cache_planes.move_to_end(clave)
+            self.aciertos_cache += 1
+            return preparada
+        self.fallos_cache += 1
+        preparada = SentenciaPreparada(self, sql, Parser(tokenizar(sql), self.sesion).preparar_programa())
+        self.cache_planes[clave] = preparada
+        if len(self.cache_planes) > self.tamano_cache:
+            self.cache_planes.popitem(last=False)
+        return preparada
+
+    def cursor(self):
+        return Cursor(self)
+
+    def execute(self, sql, parametros=None):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, secuencia_parametros):
+        return self.cursor().executemany(sql, secuencia_parametros)
+
+    def commit(self):
+        # confirma la transacción abierta con BEGIN, si la hay, y hace el fsync de lo que
+        # quedó pendiente en la bitácora
+        if self.base_datos is None:
+            return
+        if self.sesion.en_transaccion:
+            self.sesion.terminar_transaccion(True)
+        self.base_datos.sincronizar()
+
+    def rollback(self):
+        if self.base_datos is not None and self.sesion.en_transaccion:
+            self.sesion.terminar_transaccion(False)
+
+    def close(self):
+        if self.base_datos is None:
+            return
+        self.rollback()
+        if self.propia:
+            self.base_datos.cerrar()
+        self.base_datos = None
+
+def connect(almacenamiento='filas', ruta_wal=None, base_datos=None, cache_resultados=0, diccionario_cadenas=False):
+    return Conexion(almacenamiento, ruta_wal=ruta_wal, base_datos=base_datos, cache_resultados=cache_resultados,
+                    diccionario_cadenas=diccionario_cadenas)
\ No newline at end of file
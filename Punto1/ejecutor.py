@@ -0,0 +1,342 @@
+from tipos import TIPOS_VALIDOS, convertir_lote, convertir_para_columna
+from expresiones import evaluar_expr_sin_contexto, compilar_valor, enlazar_registro, enlazador_por_slots, ligar_parametros
+from columnar import RegistrosColumnares
+from tuplas import RegistrosTuplas
+import vectorizado
+from carga import leer_lotes
+from planificador import separar_conjunciones, posiciones_por_indice, columna_sin_alias
+from plan import planear, explicar, Project, Insert, Update, Delete
+from perfil import actual as perfil_actual
+
+def ligar_sentencia(sentencia, parametros):
+    # copia de la sentencia con los parámetros sustituidos por constantes
+    ligada = dict(sentencia)
+    if 'valores' in ligada:
+        ligada['valores'] = [[ligar_parametros(v, parametros) for v in fila] for fila in ligada['valores']]
+    if 'asignaciones' in ligada:
+        ligada['asignaciones'] = {col: ligar_parametros(expr, parametros) for col, expr in ligada['asignaciones'].items()}
+    if ligada.get('where') is not None:
+        ligada['where'] = ligar_parametros(ligada['where'], parametros)
+    if ligada.get('having') is not None:
+        ligada['having'] = ligar_parametros(ligada['having'], parametros)
+    if ligada.get('grupo'):
+        ligada['grupo'] = [ligar_parametros(expr, parametros) for expr in ligada['grupo']]
+    if ligada.get('orden'):
+        ligada['orden'] = [(ligar_parametros(expr, parametros), descendente) for expr, descendente in ligada['orden']]
+    for clave in ('limite', 'desplazamiento'):
+        if ligada.get(clave) is not None:
+            ligada[clave] = ligar_parametros(ligada[clave], parametros)
+    if 'campos' in ligada:
+        ligada['campos'] = [dict(campo, expr=ligar_parametros(campo['expr'], parametros)) if campo['tipo'] == 'EXPR' else campo
+                            for campo in ligada['campos']]
+    if 'sentencia' in ligada:
+        ligada['sentencia'] = ligar_sentencia(ligada['sentencia'], parametros)
+    return ligada
+
+TRANSACCIONES = ('BEGIN', 'COMMIT', 'ROLLBACK')
+
+class Ejecutor:
+    # ejecuta sobre la base de datos el plan lógico (plan.py) de las sentencias que arma el
+    # Parser; los errores de ejecución se acumulan en self.errores igual que antes lo hacía el Parser.
+    # Trabaja sobre una Sesion de la base: fuera de BEGIN ... COMMIT cada sentencia se
+    # confirma sola al terminar
+    def __init__(self, base_datos, errores=None):
+        self.base_datos = base_datos.sesion()
+        self.errores = errores if errores is not None else []
+
+    def ejecutar(self, sentencia, parametros=None):
+        tipo = sentencia['tipo_sentencia']
+        if tipo in TRANSACCIONES:
+            return self.ejecutar_transaccion(sentencia)
+        sesion = self.base_datos
+        if sesion.en_transaccion:
+            return self.ejecutar_sentencia(sentencia, parametros)
+        sesion.refrescar()
+        try:
+            resultado = self.ejecutar_sentencia(sentencia, parametros)
+        except BaseException:
+            sesion.deshacer()
+            raise
+        sesion.confirmar()
+        return resultado
+
+    def ejecutar_sentencia(self, sentencia, parametros=None):
+        tipo = sentencia['tipo_sentencia']
+        # EXPLAIN se puede pedir sin valores para los parámetros
+        if sentencia.get('con_parametros') and not (tipo == 'EXPLAIN' and parametros is None):
+            sentencia = ligar_sentencia(sentencia, parametros)
+        if tipo == 'CREATE':
+            return self.ejecutar_create(sentencia)
+        if tipo == 'CREATE INDEX':
+            return self.ejecutar_create_index(sentencia)
+        if tipo == 'COPY':
+            return self.ejecutar_copia(sentencia)
+        if tipo in ('SAVE SNAPSHOT', 'OPEN SNAPSHOT'):
+            return self.ejecutar_snapshot(sentencia)
+        if tipo == 'ANALYZE':
+            return self.ejecutar_analyze(sentencia)
+        if tipo == 'EXPLAIN':
+            return self.ejecutar_explain(sentencia['sentencia'])
+        if tipo == 'SELECT':
+            # las filas salen de un generador: se planea sobre una foto de las tablas para
+            # que lo que se confirme mientras se consumen no cambie el resultado
+            return self.ejecutar_select(sentencia, parametros, self.base_datos.vista())
+        return self.ejecutar_plan(planear(sentencia, self.base_datos, self.errores))
+
+    def ejecutar_select(self, sentencia, parametros, vista):
+        cache = self.base_datos.cache_resultados
+        clave = None if cache is None else cache.clave(sentencia, parametros, vista.tablas)
+        if clave is not None:
+            guardado = cache.buscar(clave)
+            if guardado is not None:
+                schema, filas = guardado
+                return {'tipo_sentencia': 'SELECT', 'schema': schema, 'filas': iter(filas)}
+        errores = len(self.errores)
+        resultado = self.ejecutar_plan(planear(sentencia, vista, self.errores))
+        # un SELECT con errores de planificación no se guarda
+        if clave is not None and len(self.errores) == errores:
+            resultado['filas'] = cache.guardar_al_terminar(clave, resultado['schema'], resultado['filas'], vista.tablas)
+        return resultado
+
+    def ejecutar_transaccion(self, sentencia):
+        tipo = sentencia['tipo_sentencia']
+        sesion = self.base_datos
+        if tipo == 'BEGIN':
+            if sesion.en_transaccion:
+                self.errores.append({'mensaje': "BEGIN: ya hay una transacción abierta", 'linea': sentencia['linea']})
+            else:
+                sesion.iniciar_transaccion()
+        elif not sesion.en_transaccion:
+            self.errores.append({'mensaje': f"{tipo}: no hay una transacción abierta", 'linea': sentencia['linea']})
+        else:
+            sesion.terminar_transaccion(tipo == 'COMMIT', sincronizar=True)
+        return {'tipo_sentencia': tipo}
+
+    def ejecutar_plan(self, plan):
+        if isinstance(plan, Project):
+            return {'tipo_sentencia': 'SELECT', 'schema': plan.schema, 'filas': plan.filas()}
+        if isinstance(plan, Insert):
+            return self.ejecutar_insert(plan)
+        if isinstance(plan, Update):
+            return self.ejecutar_update(plan)
+        if isinstance(plan, Delete):
+            return self.ejecutar_delete(plan)
+        raise RuntimeError(f"Plan desconocido: {plan.describir()}")
+
+    def ejecutar_explain(self, sentencia):
+        plan = planear(sentencia, self.base_datos.vista(), self.errores)
+        if plan is None:
+            objeto = sentencia.get('tabla', sentencia.get('ruta'))
+            lineas = [sentencia['tipo_sentencia'] if objeto is None else f"{sentencia['tipo_sentencia']} {objeto}"]
+        else:
+            lineas = explicar(plan)
+        return {'tipo_sentencia': 'EXPLAIN', 'schema': [('plan', 'cadena')], 'filas': iter([(linea,) for linea in lineas])}
+
+    def ejecutar_create(self, sentencia):
+        columnas = {}
+        for nombre_col, tipo_col, linea in sentencia['columnas']:
+            if tipo_col not in TIPOS_VALIDOS:
+                self.errores.append({'mensaje': f"Tipo desconocido {tipo_col} para columna {nombre_col}", 'linea': linea})
+            columnas[nombre_col] = tipo_col
+        try:
+            self.base_datos.crear_tabla(sentencia['tabla'], columnas.items())
+        except Exception as e:
+            self.errores.append({'mensaje': str(e), 'linea': sentencia['linea']})
+        return {'tipo_sentencia': 'CREATE', 'tabla': sentencia['tabla'], 'columnas': columnas}
+
+    def ejecutar_create_index(self, sentencia):
+        try:
+            self.base_datos.crear_indice(sentencia['indice'], sentencia['tabla'], sentencia['columna'])
+        except Exception as e:
+            self.errores.append({'mensaje': str(e), 'linea': sentencia['linea']})
+        return {'tipo_sentencia': 'CREATE INDEX', 'indice': sentencia['indice'], 'tabla': sentencia['tabla'], 'columna': sentencia['columna']}
+
+    def posiciones_candidatas(self, nombre_tabla, condicion, columna_de_ref):
+        indices = self.base_datos.tablas[nombre_tabla]['indices']
+        if condicion is None or not indices:
+            return None
+        return posiciones_por_indice(separar_conjunciones(condicion), columna_de_ref, indices)
+
+    def contar_lectura(self, nombre_tabla, posiciones):
+        # para el perfil: las filas del índice o todas las vivas de la tabla
+        perfil = perfil_actual()
+        if perfil is not None:
+            tabla = self.base_datos.tablas[nombre_tabla]
+            vivas = len(tabla['registros']) - tabla['borrados'].cantidad
+            perfil.leer(nombre_tabla, vivas if posiciones is None else len(posiciones))
+
+    def enlazador_local(self, nombre_tabla):
+        # UPDATE/DELETE leen del propio registro: por nombre en un dict o por posición si
+        # la tabla guarda tuplas
+        registros = self.base_datos.tablas[nombre_tabla]['registros']
+        if isinstance(registros, RegistrosTuplas):
+            return enlazador_por_slots(registros.slots)
+        return enlazar_registro
+
+    def compilar_condicion_local(self, condicion, enlazar):
+        # condición de UPDATE/DELETE sobre un único registro, compilada una vez por sentencia
+        if condicion is None:
+            return lambda registro: True
+        valor_fn = compilar_valor(condicion, enlazar)
+        return lambda registro: bool(valor_fn(registro))
+
+    def ejecutar_insert(self, plan):
+        nombre_tabla = plan.tabla
+        columnas = plan.columnas
+        valores = plan.valores
+        linea = plan.linea
+        if nombre_tabla not in self.base_datos.tablas:
+            self.errores.append({'mensaje': f"Tabla {nombre_tabla} no existe", 'linea': linea})
+            return {'tipo_sentencia': 'INSERT', 'tabla': nombre_tabla, 'columnas': columnas, 'valores': valores}
+        esquema = self.base_datos.tablas[nombre_tabla]['columnas']
+        for fila in valores:
+            if len(columnas) != len(fila):
+                self.errores.append({'mensaje': f"INSERT: número de columnas y valores no coincide para {nombre_tabla}", 'linea': linea})
+        if len(valores) == 1:
+            return self.insertar_fila(plan, esquema)
+        # se arma el lote por columnas; los literales ya vienen evaluados del parser y solo
+        # se evalúa lo que tenía parámetros
+        lote = {}
+        for i, col in enumerate(columnas):
+            if col not in esquema:
+                self.errores.append({'mensaje': f"INSERT: columna {col} no existe en {nombre_tabla}", 'linea': linea})
+                continue
+            tipos = []
+            datos = []
+            for fila, constantes in zip(valores, plan.constantes):
+                tipo_val, valor = constantes[i] if constantes[i] is not None else evaluar_expr_sin_contexto(fila[i])
+                tipos.append(tipo_val)
+                datos.append(valor)
+            lote[col] = convertir_lote(esquema[col], tipos, datos)
+        insertadas = 0
+        try:
+            insertadas = self.base_datos.insertar_lote(nombre_tabla, lote, len(valores))
+        except Exception as e:
+            self.errores.append({'mensaje': str(e), 'linea': linea})
+        return {'tipo_sentencia': 'INSERT', 'tabla': nombre_tabla, 'columnas': columnas, 'valores': valores, 'insertadas': insertadas}
+
+    def insertar_fila(self, plan, esquema):
+        # INSERT de una sola tupla: sin armar columnas para un lote de un elemento
+        fila = {}
+        valores = plan.valores[0]
+        constantes = plan.constantes[0]
+        for i, col in enumerate(plan.columnas):
+            if col not in esquema:
+                self.errores.append({'mensaje': f"INSERT: columna {col} no existe en {plan.tabla}", 'linea': plan.linea})
+                continue
+            tipo_val, valor = constantes[i] if constantes[i] is not None else evaluar_expr_sin_contexto(valores[i])
+            fila[col] = convertir_para_columna(esquema[col], tipo_val, valor)
+        insertadas = 0
+        try:
+            self.base_datos.insertar(plan.tabla, fila)
+            insertadas = 1
+        except Exception as e:
+            self.errores.append({'mensaje': str(e), 'linea': plan.linea})
+        return {'tipo_sentencia': 'INSERT', 'tabla': plan.tabla, 'columnas': plan.columnas, 'valores': plan.valores, 'insertadas': insertadas}
+
+    def ejecutar_copia(self, sentencia):
+        nombre_tabla = sentencia['tabla']
+        linea = sentencia['linea']
+        if nombre_tabla not in self.base_datos.tablas:
+            self.errores.append({'mensaje': f"COPY: tabla {nombre_tabla} no existe", 'linea': linea})
+            return {'tipo_sentencia': 'COPY', 'tabla': nombre_tabla, 'insertadas': 0}
+        esquema = self.base_datos.tablas[nombre_tabla]['columnas']
+        try:
+            archivo = open(sentencia['ruta'], 'r', encoding='utf-8', newline='')
+        except OSError as e:
+            self.errores.append({'mensaje': f"COPY: no se pudo abrir {sentencia['ruta']}: {e}", 'linea': linea})
+            return {'tipo_sentencia': 'COPY', 'tabla': nombre_tabla, 'insertadas': 0}
+        insertadas = 0
+        with archivo:
+            for lote, n, errores in leer_lotes(archivo, sentencia['ruta'], esquema):
+                for mensaje, linea_archivo in errores:
+                    self.errores.append({'mensaje': f"COPY {sentencia['ruta']} línea {linea_archivo}: {mensaje}", 'linea': linea})
+                if not n:
+                    continue
+                try:
+                    insertadas += self.base_datos.insertar_lote(nombre_tabla, lote, n)
+                except Exception as e:
+                    self.errores.append({'mensaje': f"COPY {sentencia['ruta']}: {e}", 'linea': linea})
+        return {'tipo_sentencia': 'COPY', 'tabla': nombre_tabla, 'insertadas': insertadas}
+
+    def ejecutar_snapshot(self, sentencia):
+        tipo = sentencia['tipo_sentencia']
+        tablas = 0
+        try:
+            if tipo == 'SAVE SNAPSHOT':
+                tablas = self.base_datos.guardar_snapshot(sentencia['ruta'])
+            else:
+                tablas = self.base_datos.abrir_snapshot(sentencia['ruta'])
+        except (OSError, ValueError, RuntimeError) as e:
+            self.errores.append({'mensaje': f"{tipo}: {sentencia['ruta']}: {e}", 'linea': sentencia['linea']})
+        return {'tipo_sentencia': tipo, 'ruta': sentencia['ruta'], 'tablas': tablas}
+
+    def ejecutar_analyze(self, sentencia):
+        nombre_tabla = sentencia['tabla']
+        if nombre_tabla is None:
+            tablas = list(self.base_datos.tablas)
+        elif nombre_tabla in self.base_datos.tablas:
+            tablas = [nombre_tabla]
+        else:
+            self.errores.append({'mensaje': f"ANALYZE: tabla {nombre_tabla} no existe", 'linea': sentencia['linea']})
+            tablas = []
+        for nombre in tablas:
+            self.base_datos.analizar(nombre)
+        return {'tipo_sentencia': 'ANALYZE', 'tablas': tablas}
+
+    def ejecutar_update(self, plan):
+        nombre_tabla = plan.tabla
+        asignaciones = plan.asignaciones
+        condicion = plan.condicion
+        if nombre_tabla not in self.base_datos.tablas:
+            self.errores.append({'mensaje': f"UPDATE: tabla {nombre_tabla} no existe", 'linea': plan.linea})
+            return {'tipo_sentencia': 'UPDATE', 'tabla': nombre_tabla, 'asignaciones': asignaciones, 'where': condicion}
+        esquema = self.base_datos.tablas[nombre_tabla]['columnas']
+        for col in asignaciones.keys():
+            if col not in esquema:
+                self.errores.append({'mensaje': f"UPDATE: columna {col} no existe en {nombre_tabla}", 'linea': plan.linea})
+        # las asignaciones a columnas que no existen ya quedaron como error y no se aplican
+        asignaciones = {col: expr for col, expr in asignaciones.items() if col in esquema}
+        if not asignaciones:
+            return {'tipo_sentencia': 'UPDATE', 'tabla': nombre_tabla, 'afectadas': 0}
+        enlazar = self.enlazador_local(nombre_tabla)
+        condicion_fn = self.compilar_condicion_local(condicion, enlazar)
+        asign_fns = {}
+        for col, expr in asignaciones.items():
+            asign_fns[col] = compilar_valor(expr, enlazar)
+        posiciones = self.posiciones_candidatas(nombre_tabla, condicion, columna_sin_alias)
+        self.contar_lectura(nombre_tabla, posiciones)
+        registros = self.base_datos.tablas[nombre_tabla]['registros']
+        borrados = self.base_datos.tablas[nombre_tabla]['borrados']
+        if posiciones is None and isinstance(registros, RegistrosColumnares):
+            preparado = vectorizado.preparar_actualizacion(registros, condicion, asignaciones, borrados)
+            if preparado is not None:
+                conteo = self.base_datos.escribir_columnas(nombre_tabla, *preparado)
+                return {'tipo_sentencia': 'UPDATE', 'tabla': nombre_tabla, 'afectadas': conteo}
+            if condicion is not None:
+                posiciones = vectorizado.posiciones_que_cumplen(registros, condicion, borrados=borrados)
+        conteo = 0
+        try:
+            conteo = self.base_datos.actualizar(nombre_tabla, condicion_fn, asign_fns, posiciones)
+        except Exception as e:
+            self.errores.append({'mensaje': str(e), 'linea': plan.linea})
+        return {'tipo_sentencia': 'UPDATE', 'tabla': nombre_tabla, 'afectadas': conteo}
+
+    def ejecutar_delete(self, plan):
+        nombre_tabla = plan.tabla
+        condicion = plan.condicion
+        if nombre_tabla not in self.base_datos.tablas:
+            self.errores.append({'mensaje': f"DELETE: tabla {nombre_tabla} no existe", 'linea': plan.linea})
+            return {'tipo_sentencia': 'DELETE', 'tabla': nombre_tabla, 'where': condicion}
+        condicion_fn = self.compilar_condicion_local(condicion, self.enlazador_local(nombre_tabla))
+        posiciones = self.posiciones_candidatas(nombre_tabla, condicion, columna_sin_alias)
+        self.contar_lectura(nombre_tabla, posiciones)
+        registros = self.base_datos.tablas[nombre_tabla]['registros']
+        if posiciones is None and condicion is not None and isinstance(registros, RegistrosColumnares):
+            posiciones = vectorizado.posiciones_que_cumplen(registros, condicion, borrados=self.base_datos.tablas[nombre_tabla]['borrados'])
+        borrados = 0
+        try:
+            borrados = self.base_datos.borrar(nombre_tabla, condicion_fn, posiciones)
+        except Exception as e:
+            self.errores.append({'mensaje': str(e), 'linea': plan.linea})
+        return {'tipo_sentencia': 'DELETE', 'tabla': nombre_tabla, 'borrados': borrados}
\ No newline at end of file
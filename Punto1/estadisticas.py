@@ -0,0 +1,221 @@
+import hashlib
+import heapq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# tamaño del boceto de valores distintos: es exacto hasta K_DISTINTOS valores y después
+# el error relativo esperado ronda 1 / sqrt(K_DISTINTOS)
+K_DISTINTOS = 256
+# filas borradas o actualizadas desde el último ANALYZE a partir de las cuales las
+# estadísticas de la tabla se rehacen solas: ANALISIS_BASE más ANALISIS_FRACCION de las
+# filas vivas, así el costo de rehacerlas se reparte entre las filas modificadas
+ANALISIS_BASE = 50
+ANALISIS_FRACCION = 0.1
+_MASCARA = (1 << 64) - 1
+
+def _hash64(valor):
+    # hash de 64 bits uniforme y estable entre ejecuciones (hash() de las cadenas cambia
+    # en cada proceso); los números pasan por splitmix64 porque hash(n) == n
+    if isinstance(valor, str):
+        return int.from_bytes(hashlib.blake2b(valor.encode('utf-8'), digest_size=8).digest(), 'little')
+    z = (hash(valor) + 0x9E3779B97F4A7C15) & _MASCARA
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASCARA
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASCARA
+    return z ^ (z >> 31)
+
+# desde este tamaño un lote de enteros se hashea con NumPy
+LOTE_VECTORIAL = 4096
+_LIMITE_HASH = (1 << 61) - 1
+
+def _menores_hashes(valores):
+    # los K hashes más chicos de un lote de valores distintos
+    if np is not None and len(valores) >= LOTE_VECTORIAL and all(type(v) is int for v in valores):
+        try:
+            arreglo = np.fromiter(valores, dtype=np.int64, count=len(valores))
+        except OverflowError:
+            arreglo = None
+        # el mismo splitmix64 de _hash64 sobre hash(v), que para estos enteros es v (salvo -1)
+        if arreglo is not None and np.all(np.abs(arreglo) < _LIMITE_HASH):
+            z = np.where(arreglo == -1, -2, arreglo).astype(np.uint64)
+            z = z + np.uint64(0x9E3779B97F4A7C15)
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            z = z ^ (z >> np.uint64(31))
+            if len(z) > K_DISTINTOS:
+                z = np.partition(z, K_DISTINTOS)[:K_DISTINTOS]
+            return sorted(z.tolist())
+    return heapq.nsmallest(K_DISTINTOS, map(_hash64, valores))
+
+class BocetoDistintos:
+    # K mínimos valores (KMV): guarda los K hashes más chicos vistos; si el K-ésimo es h,
+    # en el espacio de 2^64 hashes caben unos (K - 1) * 2^64 / h valores distintos
+    def __init__(self):
+        self.monticulo = []
+        self.hashes = set()
+
+    def copia(self):
+        nuevo = BocetoDistintos()
+        nuevo.monticulo = list(self.monticulo)
+        nuevo.hashes = set(self.hashes)
+        return nuevo
+
+    def agregar(self, valor):
+        h = _hash64(valor)
+        if h in self.hashes:
+            return
+        # el monticulo guarda los hashes negados para tener el mayor arriba
+        if len(self.monticulo) < K_DISTINTOS:
+            heapq.heappush(self.monticulo, -h)
+            self.hashes.add(h)
+        elif h < -self.monticulo[0]:
+            self.hashes.discard(-heapq.heapreplace(self.monticulo, -h))
+            self.hashes.add(h)
+
+    def agregar_lote(self, valores):
+        # valores ya sin repetir: de todo el lote solo pueden entrar sus K hashes más chicos
+        for h in _menores_hashes(valores):
+            if h in self.hashes:
+                continue
+            if len(self.monticulo) < K_DISTINTOS:
+                heapq.heappush(self.monticulo, -h)
+            elif h < -self.monticulo[0]:
+                self.hashes.discard(-heapq.heapreplace(self.monticulo, -h))
+            else:
+                break
+            self.hashes.add(h)
+
+    def estimar(self):
+        if len(self.monticulo) < K_DISTINTOS:
+            return len(self.monticulo)
+        return round((K_DISTINTOS - 1) * (1 << 64) / (-self.monticulo[0] + 1))
+
+class EstadisticasColumna:
+    # valores distintos (boceto) y mínimo/máximo de los valores no nulos. Se alimentan con
+    # cada valor escrito y no se descuentan al borrar: hasta que se rehacen son cotas
+    def __init__(self):
+        self.distintos = BocetoDistintos()
+        self.minimo = None
+        self.maximo = None
+        self.ordenable = True
+
+    def copia(self):
+        nueva = EstadisticasColumna()
+        nueva.distintos = self.distintos.copia()
+        nueva.minimo = self.minimo
+        nueva.maximo = self.maximo
+        nueva.ordenable = self.ordenable
+        return nueva
+
+    def agregar(self, valor):
+        if valor is None:
+            return
+        self.distintos.agregar(valor)
+        if self.ordenable:
+            try:
+                if self.minimo is None or valor < self.minimo:
+                    self.minimo = valor
+                if self.maximo is None or valor > self.maximo:
+                    self.maximo = valor
+            except TypeError:
+                self._sin_orden()
+
+    def agregar_lote(self, valores):
+        # cada valor distinto del lote una sola vez
+        distintos = set(valores)
+        distintos.discard(None)
+        if not distintos:
+            return
+        self.distintos.agregar_lote(distintos)
+        if self.ordenable:
+            try:
+                menor = min(distintos)
+                mayor = max(distintos)
+                if self.minimo is None or menor < self.minimo:
+                    self.minimo = menor
+                if self.maximo is None or mayor > self.maximo:
+                    self.maximo = mayor
+            except TypeError:
+                self._sin_orden()
+
+    def _sin_orden(self):
+        # valores que no se pueden comparar entre sí: no hay mínimo ni máximo
+        self.ordenable = False
+        self.minimo = None
+        self.maximo = None
+
+class Estadisticas:
+    # estadísticas de una tabla; la cantidad de filas sale siempre exacta de la tabla
+    def __init__(self, columnas):
+        self.columnas = {col: EstadisticasColumna() for col in columnas}
+        # en una copia, columnas cuyas estadísticas ya son propias (None: todas)
+        self.propias = None
+        # filas borradas o actualizadas desde que se armaron
+        self.modificadas = 0
+
+    def copia(self):
+        # la copia de una sesión comparte las de cada columna hasta que las modifica
+        nuevas = Estadisticas(())
+        nuevas.columnas = dict(self.columnas)
+        nuevas.propias = set()
+        nuevas.modificadas = self.modificadas
+        return nuevas
+
+    def _escribible(self, col):
+        if self.propias is not None and col not in self.propias:
+            self.columnas[col] = self.columnas[col].copia()
+            self.propias.add(col)
+        return self.columnas[col]
+
+    def agregar_fila(self, fila):
+        for col, valor in fila.items():
+            self._escribible(col).agregar(valor)
+
+    def agregar_columnas(self, columnas):
+        for col, valores in columnas.items():
+            self._escribible(col).agregar_lote(valores)
+
+    def modificar(self, filas, vivas):
+        # anota filas borradas o actualizadas; True si ya son tantas que hay que rehacerlas
+        self.modificadas += filas
+        return self.modificadas > ANALISIS_BASE + ANALISIS_FRACCION * vivas
+
+    def distintos(self, col, filas):
+        # valores distintos estimados de la columna, nunca más que las filas vivas
+        estadistica = self.columnas.get(col)
+        if estadistica is None or not filas:
+            return None
+        return max(1, min(estadistica.distintos.estimar(), filas))
+
+    def a_json(self):
+        return {col: {'hashes': sorted(-h for h in e.distintos.monticulo), 'minimo': e.minimo, 'maximo': e.maximo,
+                      'ordenable': e.ordenable}
+                for col, e in self.columnas.items()}
+
+    @classmethod
+    def desde_json(cls, descripcion):
+        estadisticas = cls(())
+        for col, datos in descripcion.items():
+            e = EstadisticasColumna()
+            e.distintos.monticulo = [-h for h in reversed(datos['hashes'])]
+            e.distintos.hashes = set(datos['hashes'])
+            e.minimo = datos['minimo']
+            e.maximo = datos['maximo']
+            e.ordenable = datos['ordenable']
+            estadisticas.columnas[col] = e
+        return estadisticas
+
+def analizar(tabla):
+    # ANALYZE: estadísticas nuevas con solo las filas vivas de la tabla
+    estadisticas = Estadisticas(tabla['columnas'])
+    registros = tabla['registros']
+    borrados = tabla['borrados']
+    for col in tabla['columnas']:
+        if hasattr(registros, 'columna'):
+            valores = borrados.vivos(registros.columna(col))
+        else:
+            valores = (registro.get(col) for registro in borrados.vivos(registros))
+        estadisticas.columnas[col].agregar_lote(valores)
+    return estadisticas
\ No newline at end of file
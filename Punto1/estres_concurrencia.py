@@ -0,0 +1,103 @@
+import random
+import sys
+import threading
+import time
+
+from base_datos import BaseDatosMemoria
+from conexion import connect
+
+# un escritor mueve saldo de las cuentas a movimientos (y a veces lo devuelve) en
+# transacciones; los lectores comprueban que cada foto que ven conserva el total
+CUENTAS = 200
+SALDO_INICIAL = 1000
+TOTAL = CUENTAS * SALDO_INICIAL
+
+def crear_base(almacenamiento):
+    bd = BaseDatosMemoria(almacenamiento)
+    con = connect(base_datos=bd)
+    con.execute("CREATE TABLE cuentas (id ENTERO, saldo ENTERO); CREATE INDEX ix_cuentas ON cuentas (id);"
+                "CREATE TABLE movimientos (id ENTERO, cuenta ENTERO, monto ENTERO);")
+    con.executemany("INSERT INTO cuentas (id, saldo) VALUES (?, ?)", [(i, SALDO_INICIAL) for i in range(CUENTAS)])
+    con.close()
+    return bd
+
+def escritor(bd, transacciones, resultado):
+    rnd = random.Random(1)
+    con = connect(base_datos=bd)
+    pendientes = []
+    siguiente = 0
+    for _ in range(transacciones):
+        con.execute("BEGIN")
+        if pendientes and rnd.random() < 0.2:
+            # se borran los movimientos más viejos y su monto vuelve a la cuenta 0
+            corte = pendientes[len(pendientes) // 2][0]
+            devuelto = sum(monto for id_mov, monto in pendientes if id_mov <= corte)
+            con.execute("DELETE FROM movimientos WHERE id <= ?", (corte,))
+            con.execute("UPDATE cuentas SET saldo = saldo + ? WHERE id = 0", (devuelto,))
+            pendientes = [(id_mov, monto) for id_mov, monto in pendientes if id_mov > corte]
+        else:
+            cuenta = rnd.randrange(CUENTAS)
+            monto = rnd.randint(1, 5)
+            con.execute("UPDATE cuentas SET saldo = saldo - ? WHERE id = ?", (monto, cuenta))
+            con.execute("INSERT INTO movimientos (id, cuenta, monto) VALUES (?, ?, ?)", (siguiente, cuenta, monto))
+            if rnd.random() < 0.1:
+                con.execute("ROLLBACK")
+                continue
+            pendientes.append((siguiente, monto))
+            siguiente += 1
+        con.execute("COMMIT")
+    resultado['escritas'] = transacciones
+    con.close()
+
+def lector(bd, fin, resultado, errores):
+    con = connect(base_datos=bd)
+    lecturas = 0
+    while not fin.is_set():
+        con.execute("BEGIN")
+        saldos = con.execute("SELECT saldo FROM cuentas").fetchall()
+        montos = con.execute("SELECT monto FROM movimientos").fetchall()
+        con.execute("COMMIT")
+        total = sum(s for s, in saldos) + sum(m for m, in montos)
+        if len(saldos) != CUENTAS or total != TOTAL:
+            errores.append(f"foto inconsistente: {len(saldos)} cuentas, total {total}")
+        lecturas += 1
+    resultado.append(lecturas)
+    con.close()
+
+def ejecutar(almacenamiento, lectores, transacciones):
+    bd = crear_base(almacenamiento)
+    fin = threading.Event()
+    errores = []
+    lecturas = []
+    escritura = {}
+    hilos = [threading.Thread(target=lector, args=(bd, fin, lecturas, errores)) for _ in range(lectores)]
+    for hilo in hilos:
+        hilo.start()
+    inicio = time.perf_counter()
+    hilo_escritor = threading.Thread(target=escritor, args=(bd, transacciones, escritura))
+    hilo_escritor.start()
+    hilo_escritor.join()
+    fin.set()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+    # al final, con todo confirmado, el total se tiene que seguir conservando
+    con = connect(base_datos=bd)
+    total = sum(s for s, in con.execute("SELECT saldo FROM cuentas")) + sum(m for m, in con.execute("SELECT monto FROM movimientos"))
+    if total != TOTAL:
+        errores.append(f"estado final inconsistente: total {total}")
+    print(f"{almacenamiento}: {escritura.get('escritas', 0)} transacciones, {sum(lecturas)} lecturas en {lectores} hilos, {duracion:.2f}s")
+    return errores
+
+if __name__ == '__main__':
+    lectores = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    transacciones = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    errores = []
+    for almacenamiento in ('filas', 'columnar', 'tuplas'):
+        errores += ejecutar(almacenamiento, lectores, transacciones)
+    for error in errores[:20]:
+        print("-", error)
+    if errores:
+        print(f"{len(errores)} errores")
+        sys.exit(1)
+    print("sin inconsistencias")
\ No newline at end of file
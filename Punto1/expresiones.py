@@ -1,4 +1,7 @@
+import operator
+
 from tipos import tipo_literal_desde_valor, promover_tipos, es_numerico, tipo_valor_runtime
+from perfil import actual as perfil_actual, contar_evaluaciones
 
 def evaluar_expr_sin_contexto(nodo_expr):
     tipo, valor = evaluar_expr_con_contexto(nodo_expr, {}, None)
@@ -9,6 +12,8 @@ def evaluar_expr_con_contexto(nodo_expr, contexto_alias_a_registro, esquema_loca
         op = nodo_expr[0]
         if op == 'LIT':
             return tipo_literal_desde_valor(nodo_expr[1])
+        if op == 'VAL':
+            return nodo_expr[1], nodo_expr[2]
         if op == 'REF':
             alias, col = nodo_expr[1], nodo_expr[2]
             if alias is None:
@@ -97,4 +102,216 @@ def evaluar_expr_con_contexto(nodo_expr, contexto_alias_a_registro, esquema_loca
         if op == 'NOT':
             t, v = evaluar_expr_con_contexto(nodo_expr[1], contexto_alias_a_registro, esquema_local)
             return 'booleano', (not bool(v))
-    return 'nulo', None
\ No newline at end of file
+    return 'nulo', None
+
+_TIPO_POR_CLASE = {bool: 'booleano', int: 'entero', float: 'flotante', str: 'cadena', type(None): 'nulo'}
+_NULO = ('nulo', None)
+_NUMERICOS = ('entero', 'flotante')
+_PROMOCION = {}
+for _t1 in ('entero', 'flotante', 'cadena', 'booleano', 'nulo'):
+    for _t2 in ('entero', 'flotante', 'cadena', 'booleano', 'nulo'):
+        _PROMOCION[(_t1, _t2)] = promover_tipos(_t1, _t2)
+
+_ARITMETICOS = {
+    'MAS': operator.add,
+    'MENOS': operator.sub,
+    'POR': operator.mul,
+}
+
+_COMPARADORES = {
+    'IGUAL': operator.eq,
+    'DISTINTO': operator.ne,
+    'MENOR': operator.lt,
+    'MAYOR': operator.gt,
+    'MENOR_IGUAL': operator.le,
+    'MAYOR_IGUAL': operator.ge,
+}
+
+def _valor_parametro(parametros, clave):
+    if parametros is None:
+        raise RuntimeError(f"Falta el valor del parámetro {clave}")
+    try:
+        return parametros[clave]
+    except (IndexError, KeyError, TypeError):
+        raise RuntimeError(f"Falta el valor del parámetro {clave}")
+
+def ligar_parametros(nodo_expr, parametros):
+    # reemplaza cada ('PARAM', clave) por la constante ('VAL', tipo, valor); '?' usa la
+    # posición en la secuencia de parámetros y ':nombre' la clave del diccionario
+    if not isinstance(nodo_expr, tuple) or nodo_expr[0] in ('LIT', 'VAL', 'REF'):
+        return nodo_expr
+    if nodo_expr[0] == 'PARAM':
+        valor = _valor_parametro(parametros, nodo_expr[1])
+        return ('VAL', tipo_valor_runtime(valor), valor)
+    return (nodo_expr[0],) + tuple(ligar_parametros(hijo, parametros) for hijo in nodo_expr[1:])
+
+def contiene_parametros(nodo_expr):
+    if not isinstance(nodo_expr, tuple) or nodo_expr[0] in ('LIT', 'VAL', 'REF'):
+        return False
+    if nodo_expr[0] == 'PARAM':
+        return True
+    return any(contiene_parametros(hijo) for hijo in nodo_expr[1:])
+
+def contiene_agregado(nodo_expr):
+    if not isinstance(nodo_expr, tuple) or nodo_expr[0] in ('LIT', 'VAL', 'REF', 'PARAM'):
+        return False
+    if nodo_expr[0] == 'AGREGADO':
+        return True
+    return any(contiene_agregado(hijo) for hijo in nodo_expr[1:])
+
+_SIMBOLOS = {
+    'MAS': '+', 'MENOS': '-', 'POR': '*', 'DIV': '/',
+    'IGUAL': '=', 'DISTINTO': '<>', 'MENOR': '<', 'MAYOR': '>',
+    'MENOR_IGUAL': '<=', 'MAYOR_IGUAL': '>=', 'AND': 'AND', 'OR': 'OR',
+}
+
+def expr_a_texto(nodo_expr):
+    # forma legible de la expresión para EXPLAIN
+    if not isinstance(nodo_expr, tuple):
+        return 'NULL'
+    op = nodo_expr[0]
+    if op == 'LIT':
+        return nodo_expr[1]
+    if op == 'VAL':
+        return repr(nodo_expr[2]) if nodo_expr[1] == 'cadena' else str(nodo_expr[2])
+    if op == 'PARAM':
+        return '?' if isinstance(nodo_expr[1], int) else f":{nodo_expr[1]}"
+    if op == 'REF':
+        if isinstance(nodo_expr[2], tuple):
+            # columna de un Aggregate: se muestra la expresión que la calcula
+            return expr_a_texto(nodo_expr[2])
+        return nodo_expr[2] if nodo_expr[1] is None else f"{nodo_expr[1]}.{nodo_expr[2]}"
+    if op == 'NEG':
+        return f"-{_operando_a_texto(nodo_expr[1])}"
+    if op == 'NOT':
+        return f"NOT {_operando_a_texto(nodo_expr[1])}"
+    if op == 'AGREGADO':
+        return f"{nodo_expr[1]}({'*' if nodo_expr[2] is None else expr_a_texto(nodo_expr[2])})"
+    if op in _SIMBOLOS:
+        return f"{_operando_a_texto(nodo_expr[1])} {_SIMBOLOS[op]} {_operando_a_texto(nodo_expr[2])}"
+    return str(nodo_expr)
+
+def _operando_a_texto(nodo_expr):
+    if isinstance(nodo_expr, tuple) and nodo_expr[0] in _SIMBOLOS:
+        return f"({expr_a_texto(nodo_expr)})"
+    return expr_a_texto(nodo_expr)
+
+def enlazar_registro(alias, col):
+    # UPDATE/DELETE: la fila es el propio registro; las referencias con alias valen nulo
+    if alias is not None:
+        return lambda registro: None
+    return lambda registro: registro.get(col)
+
+def enlazador_por_slots(slots):
+    # lo mismo para un registro guardado como tupla (tuplas.py): cada columna se lee de
+    # su posición en el esquema
+    def enlazar(alias, col):
+        if alias is not None or col not in slots:
+            return lambda registro: None
+        return operator.itemgetter(slots[col])
+    return enlazar
+
+def compilar_valor(nodo_expr, enlazar):
+    # como compilar_expr pero la función devuelve solo el valor; evita armar la
+    # tupla (tipo, valor) en los nodos donde el tipo no se necesita
+    f = _compilar_valor(nodo_expr, enlazar)
+    perfil = perfil_actual()
+    if perfil is None or not isinstance(nodo_expr, tuple):
+        return f
+    return contar_evaluaciones(f, perfil, nodo_expr[0])
+
+def _compilar_valor(nodo_expr, enlazar):
+    if not isinstance(nodo_expr, tuple):
+        return lambda fila: None
+    op = nodo_expr[0]
+    if op in ('LIT', 'VAL'):
+        valor = evaluar_expr_sin_contexto(nodo_expr)[1]
+        return lambda fila: valor
+    if op == 'REF':
+        return enlazar(nodo_expr[1], nodo_expr[2])
+    if op in _COMPARADORES:
+        comparar = _COMPARADORES[op]
+        f1 = compilar_valor(nodo_expr[1], enlazar)
+        if isinstance(nodo_expr[2], tuple) and nodo_expr[2][0] in ('LIT', 'VAL'):
+            constante = evaluar_expr_sin_contexto(nodo_expr[2])[1]
+            return lambda fila: comparar(f1(fila), constante)
+        f2 = compilar_valor(nodo_expr[2], enlazar)
+        return lambda fila: comparar(f1(fila), f2(fila))
+    if op == 'AND':
+        f1 = compilar_valor(nodo_expr[1], enlazar)
+        f2 = compilar_valor(nodo_expr[2], enlazar)
+        return lambda fila: bool(f1(fila)) and bool(f2(fila))
+    if op == 'OR':
+        f1 = compilar_valor(nodo_expr[1], enlazar)
+        f2 = compilar_valor(nodo_expr[2], enlazar)
+        return lambda fila: bool(f1(fila)) or bool(f2(fila))
+    if op == 'NOT':
+        f = compilar_valor(nodo_expr[1], enlazar)
+        return lambda fila: not f(fila)
+    f = _compilar_expr(nodo_expr, enlazar)
+    return lambda fila: f(fila)[1]
+
+def compilar_expr(nodo_expr, enlazar):
+    # traduce el árbol una sola vez a funciones anidadas fila -> (tipo, valor) con la
+    # misma semántica que evaluar_expr_con_contexto (incluidos los 'nulo'); enlazar(alias, col)
+    # resuelve cada referencia antes de ejecutar y devuelve la función que la lee de la fila.
+    # Con un perfil activo cada nodo cuenta sus evaluaciones
+    f = _compilar_expr(nodo_expr, enlazar)
+    perfil = perfil_actual()
+    if perfil is None or not isinstance(nodo_expr, tuple):
+        return f
+    return contar_evaluaciones(f, perfil, nodo_expr[0])
+
+def _compilar_expr(nodo_expr, enlazar):
+    if not isinstance(nodo_expr, tuple):
+        return lambda fila: _NULO
+    op = nodo_expr[0]
+    if op in ('LIT', 'VAL'):
+        resultado = evaluar_expr_sin_contexto(nodo_expr)
+        return lambda fila: resultado
+    if op == 'REF':
+        cargar = enlazar(nodo_expr[1], nodo_expr[2])
+        def ref(fila):
+            val = cargar(fila)
+            return _TIPO_POR_CLASE.get(type(val), 'cadena'), val
+        return ref
+    if op == 'NEG':
+        f = compilar_expr(nodo_expr[1], enlazar)
+        def neg(fila):
+            t, v = f(fila)
+            if t not in _NUMERICOS:
+                return _NULO
+            return t, -v
+        return neg
+    if op in _ARITMETICOS or op == 'DIV':
+        f1 = compilar_expr(nodo_expr[1], enlazar)
+        f2 = compilar_expr(nodo_expr[2], enlazar)
+        if op == 'DIV':
+            def div(fila):
+                t1, v1 = f1(fila)
+                t2, v2 = f2(fila)
+                if _PROMOCION.get((t1, t2)) is None:
+                    return _NULO
+                try:
+                    if v2 == 0:
+                        return _NULO
+                    return 'flotante', (v1 / v2)
+                except Exception:
+                    return _NULO
+            return div
+        aplicar = _ARITMETICOS[op]
+        def aritmetica(fila):
+            t1, v1 = f1(fila)
+            t2, v2 = f2(fila)
+            tp = _PROMOCION.get((t1, t2))
+            if tp is None:
+                return _NULO
+            try:
+                return tp, aplicar(v1, v2)
+            except Exception:
+                return _NULO
+        return aritmetica
+    if op in _COMPARADORES or op in ('AND', 'OR', 'NOT'):
+        f = _compilar_valor(nodo_expr, enlazar)
+        return lambda fila: ('booleano', f(fila))
+    return lambda fila: _NULO
\ No newline at end of file
@@ -0,0 +1,292 @@
+import bisect
+
+# pares (valor, posición) por página del orden; una página que llega al doble se parte
+TAMANO_PAGINA = 512
+# valores distintos por página del hash en promedio; al pasarse se duplican las páginas
+TAMANO_HASH = 256
+
+def _numero(valor):
+    # hash bien mezclado del valor: el de un entero es el propio entero y sus bits bajos,
+    # que eligen la página, se repiten en valores como 100, 200, 300
+    return hash((valor,))
+
+class Indice:
+    # el hash (valor -> posiciones) y el orden (pares (valor, posición) ordenados) van en
+    # páginas. La copia de una sesión que escribe comparte todas las páginas con la versión
+    # publicada y duplica solo las que modifica, y dentro del hash cada lista de
+    # posiciones se duplica recién cuando cambia
+    def __init__(self, nombre, tabla, columna):
+        self.nombre = nombre
+        self.tabla = tabla
+        self.columna = columna
+        self.paginas = [{}]
+        self.claves = 0
+        # páginas del orden y el último par de cada una; None si los valores no se pueden
+        # comparar entre sí y el índice solo sirve para igualdad
+        self.orden = []
+        self.maximos = []
+        self.nulos = 0
+        # en una copia, valores cuya lista de posiciones ya es propia (None: todas) e id()
+        # de las páginas propias; las demás son de otra versión y siguen vivas mientras se
+        # compartan, así que un id no se confunde con el de otra página
+        self.propias = None
+        self.paginas_propias = set()
+
+    def copia(self):
+        nuevo = Indice(self.nombre, self.tabla, self.columna)
+        nuevo.paginas = list(self.paginas)
+        nuevo.claves = self.claves
+        if self.orden is not None:
+            nuevo.orden = list(self.orden)
+            nuevo.maximos = list(self.maximos)
+        else:
+            nuevo.orden = nuevo.maximos = None
+        nuevo.nulos = self.nulos
+        nuevo.propias = set()
+        return nuevo
+
+    def _pagina_propia(self, paginas, i):
+        pagina = paginas[i]
+        if id(pagina) not in self.paginas_propias:
+            pagina = paginas[i] = pagina.copy()
+            self.paginas_propias.add(id(pagina))
+        return pagina
+
+    def _repartir(self, hash_completo):
+        # vuelve a repartir todo el hash en tantas páginas como hagan falta
+        cantidad = 1
+        while cantidad * TAMANO_HASH < len(hash_completo):
+            cantidad *= 2
+        self.paginas = [{} for _ in range(cantidad)]
+        self.paginas_propias.update(id(pagina) for pagina in self.paginas)
+        mascara = cantidad - 1
+        for valor, posiciones in hash_completo.items():
+            self.paginas[_numero(valor) & mascara][valor] = posiciones
+        self.claves = len(hash_completo)
+
+    def _hash_completo(self):
+        completo = {}
+        for pagina in self.paginas:
+            completo.update(pagina)
+        return completo
+
+    def posiciones(self, valor):
+        # lista de posiciones con ese valor (de solo lectura) o None
+        return self.paginas[_numero(valor) & (len(self.paginas) - 1)].get(valor)
+
+    def _posiciones(self, valor):
+        # lista de posiciones de ese valor lista para modificar, creándola si no está
+        pagina = self._pagina_propia(self.paginas, _numero(valor) & (len(self.paginas) - 1))
+        posiciones = pagina.get(valor)
+        if posiciones is None:
+            posiciones = pagina[valor] = []
+            if self.propias is not None:
+                self.propias.add(valor)
+            self.claves += 1
+            if self.claves > TAMANO_HASH * 2 * len(self.paginas):
+                self._repartir(self._hash_completo())
+        elif self.propias is not None and valor not in self.propias:
+            posiciones = pagina[valor] = list(posiciones)
+            self.propias.add(valor)
+        return posiciones
+
+    def _quitar_valor(self, valor):
+        pagina = self._pagina_propia(self.paginas, _numero(valor) & (len(self.paginas) - 1))
+        del pagina[valor]
+        self.claves -= 1
+
+    def _paginar(self, pares):
+        # pares ya ordenados
+        self.orden = [pares[k:k + TAMANO_PAGINA] for k in range(0, len(pares), TAMANO_PAGINA)]
+        self.maximos = [pagina[-1] for pagina in self.orden]
+        self.paginas_propias.update(id(pagina) for pagina in self.orden)
+
+    def _pares(self):
+        return [par for pagina in self.orden for par in pagina]
+
+    def _insertar_par(self, par):
+        if not self.orden:
+            self._paginar([par])
+            return
+        i = min(bisect.bisect_left(self.maximos, par), len(self.orden) - 1)
+        pagina = self._pagina_propia(self.orden, i)
+        bisect.insort(pagina, par)
+        self.maximos[i] = pagina[-1]
+        if len(pagina) >= 2 * TAMANO_PAGINA:
+            mitades = [pagina[:TAMANO_PAGINA], pagina[TAMANO_PAGINA:]]
+            self.orden[i:i + 1] = mitades
+            self.maximos[i:i + 1] = [mitad[-1] for mitad in mitades]
+            self.paginas_propias.update(id(mitad) for mitad in mitades)
+
+    def _quitar_par(self, par):
+        i = bisect.bisect_left(self.maximos, par)
+        if i == len(self.orden):
+            return
+        j = bisect.bisect_left(self.orden[i], par)
+        if j < len(self.orden[i]) and self.orden[i][j] == par:
+            pagina = self._pagina_propia(self.orden, i)
+            del pagina[j]
+            if pagina:
+                self.maximos[i] = pagina[-1]
+            else:
+                del self.orden[i]
+                del self.maximos[i]
+
+    def reconstruir(self, registros, borrados=None):
+        # borrados: bitmap de filas borradas de la tabla, que no entran al índice
+        self.propias = None
+        self.paginas_propias = set()
+        self.nulos = 0
+        completo = {}
+        pares = []
+        if hasattr(registros, 'columna'):
+            # tabla por columnas o por tuplas: se lee solo la columna del índice
+            valores = registros.columna(self.columna)
+        else:
+            valores = (registro.get(self.columna) for registro in registros)
+        filas = enumerate(valores) if borrados is None else borrados.enumerar(valores if isinstance(valores, list) else list(valores))
+        for pos, valor in filas:
+            completo.setdefault(valor, []).append(pos)
+            if valor is None:
+                self.nulos += 1
+            else:
+                pares.append((valor, pos))
+        self._repartir(completo)
+        try:
+            pares.sort()
+            self._paginar(pares)
+        except TypeError:
+            self.orden = self.maximos = None
+
+    def agregar(self, valor, pos):
+        self._posiciones(valor).append(pos)
+        if valor is None:
+            self.nulos += 1
+        elif self.orden is not None:
+            try:
+                self._insertar_par((valor, pos))
+            except TypeError:
+                self.orden = self.maximos = None
+
+    def agregar_lote(self, valores, inicio):
+        # valores de las filas agregadas a partir de la posición inicio
+        pares = []
+        for pos, valor in enumerate(valores, inicio):
+            self._posiciones(valor).append(pos)
+            if valor is None:
+                self.nulos += 1
+            else:
+                pares.append((valor, pos))
+        if self.orden is not None:
+            try:
+                pares.sort()
+                if len(pares) * 8 < len(self.orden) * TAMANO_PAGINA:
+                    for par in pares:
+                        self._insertar_par(par)
+                else:
+                    # dos tramos ya ordenados: sort los mezcla en tiempo lineal
+                    todos = self._pares()
+                    todos.extend(pares)
+                    todos.sort()
+                    self._paginar(todos)
+            except TypeError:
+                self.orden = self.maximos = None
+
+    def quitar(self, valor, pos):
+        if self.posiciones(valor) is not None:
+            posiciones = self._posiciones(valor)
+            posiciones.remove(pos)
+            if not posiciones:
+                self._quitar_valor(valor)
+        if valor is None:
+            self.nulos -= 1
+        elif self.orden is not None:
+            self._quitar_par((valor, pos))
+
+    def quitar_lote(self, pares):
+        # quita varias (valor, posición) de una vez: cada lista del hash y el orden se
+        # recorren una sola vez en lugar de una vez por fila
+        por_valor = {}
+        for valor, pos in pares:
+            por_valor.setdefault(valor, set()).add(pos)
+        for valor, posiciones in por_valor.items():
+            actuales = self.posiciones(valor)
+            if actuales is None:
+                continue
+            quedan = [pos for pos in actuales if pos not in posiciones]
+            if quedan:
+                pagina = self._pagina_propia(self.paginas, _numero(valor) & (len(self.paginas) - 1))
+                pagina[valor] = quedan
+                if self.propias is not None:
+                    self.propias.add(valor)
+            else:
+                self._quitar_valor(valor)
+        self.nulos -= len(por_valor.get(None, ()))
+        if self.orden is not None:
+            if len(pares) * 8 < len(self.orden) * TAMANO_PAGINA:
+                for valor, pos in pares:
+                    if valor is not None:
+                        self._quitar_par((valor, pos))
+            else:
+                quitadas = {pos for valor, pos in pares}
+                self._paginar([par for par in self._pares() if par[1] not in quitadas])
+
+    def renumerar(self, nuevas):
+        # después de compactar la tabla: nuevas[pos] es la posición nueva de cada fila o -1
+        # si se eliminó; como la renumeración conserva el orden, el orden sigue ordenado
+        completo = {}
+        nulos = 0
+        for pagina in self.paginas:
+            for valor, posiciones in pagina.items():
+                quedan = [nuevas[pos] for pos in posiciones if nuevas[pos] >= 0]
+                if quedan:
+                    completo[valor] = quedan
+                    if valor is None:
+                        nulos = len(quedan)
+        self.propias = None
+        self.paginas_propias = set()
+        self._repartir(completo)
+        self.nulos = nulos
+        if self.orden is not None:
+            self._paginar([(valor, nuevas[pos]) for valor, pos in self._pares() if nuevas[pos] >= 0])
+
+    def _corte(self, clave, derecha):
+        # (página, lugar en la página) del primer par mayor (derecha) o mayor o igual a clave
+        buscar = bisect.bisect_right if derecha else bisect.bisect_left
+        i = buscar(self.maximos, clave)
+        if i == len(self.orden):
+            return i, 0
+        return i, buscar(self.orden[i], clave)
+
+    def _hasta(self, i, j):
+        posiciones = [pos for pagina in self.orden[:i] for _, pos in pagina]
+        if i < len(self.orden):
+            posiciones.extend(pos for _, pos in self.orden[i][:j])
+        return posiciones
+
+    def _desde(self, i, j):
+        if i == len(self.orden):
+            return []
+        posiciones = [pos for _, pos in self.orden[i][j:]]
+        posiciones.extend(pos for pagina in self.orden[i + 1:] for _, pos in pagina)
+        return posiciones
+
+    def buscar(self, op, valor):
+        # posiciones candidatas para `columna op valor`; None si el índice no sirve
+        if op == 'IGUAL':
+            try:
+                return list(self.posiciones(valor) or ())
+            except TypeError:
+                return None
+        if self.orden is None or self.nulos:
+            # comparar NULL con < lanza error en la evaluación normal; no se puede saltar
+            return None
+        if op == 'MENOR':
+            return self._hasta(*self._corte((valor,), False))
+        if op == 'MENOR_IGUAL':
+            return self._hasta(*self._corte((valor, float('inf')), True))
+        if op == 'MAYOR':
+            return self._desde(*self._corte((valor, float('inf')), True))
+        if op == 'MAYOR_IGUAL':
+            return self._desde(*self._corte((valor,), False))
+        return None
\ No newline at end of file
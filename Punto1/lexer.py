@@ -1,10 +1,11 @@
+import gc
 import re
+import time
 
 PATTERNS = [
-    ('ESPACIO', r'\s+'),
-    ('COMENTARIO', r'--[^\n]*'),
+    ('IDENT', r'[A-Za-z_][A-Za-z0-9_]*'),
     ('NUMERO', r'\d+\.\d+|\d+'),
-    ('CADENA', r"'([^'\\]|\\.)*'|\"([^\"\\]|\\.)*\""),
+    ('CADENA', r"'[^'\\]*(?:\\.[^'\\]*)*'|\"[^\"\\]*(?:\\.[^\"\\]*)*\""),
     ('PUNTO_COMA', r';'),
     ('COMA', r','),
     ('PAR_ABRE', r'\('),
@@ -12,7 +13,7 @@ PATTERNS = [
     ('AST', r'\*'),
     ('MENOR_IGUAL', r'<='),
     ('MAYOR_IGUAL', r'>='),
-    ('DISTINTO', r'<>|!='),  
+    ('DISTINTO', r'<>|!='),
     ('MENOR', r'<'),
     ('MAYOR', r'>'),
     ('IGUAL', r'='),
@@ -21,19 +22,88 @@ PATTERNS = [
     ('POR', r'\*'),
     ('DIV', r'\/'),
     ('PUNTO', r'\.'),
+    ('PARAM', r'\?|:[A-Za-z_][A-Za-z0-9_]*'),
     ('DOS_PUNTOS', r':'),
-    ('IDENT', r'[A-Za-z_][A-Za-z0-9_]*'),
 ]
 
+# espacios y comentarios: no son tokens, se consumen delante de cada token dentro del
+# mismo match. El lookahead con referencia hace el salto atómico (como *+ desde Python
+# 3.11): si después no hay un token no se devuelve parte de un comentario y '--' no
+# termina leído como dos MENOS
+SALTO = r'(?=((?:\s+|--[^\n]*)*))\1'
+
 PALABRAS_RESERVADAS = {
     'SELECT', 'FROM', 'WHERE', 'INSERT', 'INTO', 'VALUES',
     'UPDATE', 'SET', 'DELETE', 'CREATE', 'TABLE', 'AS',
-    'AND', 'OR', 'NOT', 'NULL', 'TRUE', 'FALSE',
+    'AND', 'OR', 'NOT', 'NULL', 'TRUE', 'FALSE', 'INDEX', 'ON', 'EXPLAIN',
+    'COPY', 'LOAD', 'SAVE', 'OPEN', 'SNAPSHOT', 'BEGIN', 'COMMIT', 'ROLLBACK',
+    'GROUP', 'BY', 'HAVING', 'ORDER', 'ASC', 'DESC', 'LIMIT', 'OFFSET', 'ANALYZE',
 }
 
-token_regex = re.compile('|'.join('(?P<%s>%s)' % pair for pair in PATTERNS), re.IGNORECASE)
+# se leen como AGREGADO conservando el texto original: el parser solo las toma como
+# función si sigue un paréntesis, así una columna puede seguir llamándose p.ej. total o max
+FUNCIONES_AGREGADAS = {'COUNT', 'SUM', 'AVG', 'MIN', 'MAX'}
+
+# dos grupos, el salto y el token: token_regex.split(texto) deja
+# [hueco, salto, token, hueco, salto, token, ..., resto] y un hueco no vacío es algo
+# que no es token
+token_regex = re.compile(SALTO + '(' + '|'.join('(?:%s)' % patron for _, patron in PATTERNS) + ')')
+salto_regex = re.compile(SALTO)
+_PATRONES = [(tipo, re.compile(patron)) for tipo, patron in PATTERNS]
+
+# cuántos textos distintos de identificadores y símbolos recuerda _Clases
+MAX_PALABRAS = 1 << 16
+# números y cadenas: se reconocen por el primer carácter y no se guardan en _Clases
+_TIPO_POR_INICIAL = dict.fromkeys('0123456789', 'NUMERO')
+_TIPO_POR_INICIAL.update({"'": 'CADENA', '"': 'CADENA'})
+
+class _Clases(dict):
+    # (tipo, valor) de cada texto de token, para no probar los patrones ni pasar cada
+    # identificador por upper(): de entrada tiene las palabras reservadas y las funciones
+    # escritas en mayúsculas, minúsculas y con inicial mayúscula; los identificadores y
+    # símbolos se van agregando hasta MAX_PALABRAS
+    def __init__(self):
+        super().__init__()
+        for palabra in PALABRAS_RESERVADAS | FUNCIONES_AGREGADAS:
+            for escrita in (palabra, palabra.lower(), palabra.capitalize()):
+                self[escrita] = self._clasificar(escrita)
+
+    def __missing__(self, texto):
+        tipo = _TIPO_POR_INICIAL.get(texto[0])
+        if tipo is not None:
+            return (tipo, texto)
+        clase = self._clasificar(texto)
+        if len(self) < MAX_PALABRAS:
+            self[texto] = clase
+        return clase
+
+    @staticmethod
+    def _clasificar(texto):
+        # el primer patrón que lo reconoce entero, como en la alternativa de token_regex
+        tipo = next(tipo for tipo, patron in _PATRONES if patron.fullmatch(texto))
+        if tipo == 'IDENT':
+            mayusculas = texto.upper()
+            if mayusculas in PALABRAS_RESERVADAS:
+                return (mayusculas, mayusculas)
+            if mayusculas in FUNCIONES_AGREGADAS:
+                return ('AGREGADO', texto)
+        return (tipo, texto)
+
+_CLASES = _Clases()
+
+# caracteres que se leen de una vez de un archivo en tokenizar_flujo (y que se separan
+# de una vez en tokenizar): split arma una lista de tres piezas por token del bloque
+TAMANO_BLOQUE = 1 << 16
+# un token que termina a menos de esto del final del texto leído podría seguir en el
+# bloque siguiente: '12.' puede ser el comienzo de '12.5' y '<' el de '<='
+_MARGEN = 2
+
+class ErrorLexico(SyntaxError):
+    pass
 
 class Token:
+    __slots__ = ('tipo', 'valor', 'linea', 'columna')
+
     def __init__(self, tipo, valor, linea, columna):
         self.tipo = tipo
         self.valor = valor
@@ -43,45 +113,99 @@ class Token:
         return f"Token({self.tipo}, {self.valor!r}, {self.linea}, {self.columna})"
 
 def tokenizar(texto):
-    pos = 0
+    # el recolector de ciclos se pausa mientras se arma la lista: si no, recorre una y otra
+    # vez los tokens ya creados, que no forman ciclos
+    pausar = gc.isenabled()
+    if pausar:
+        gc.disable()
+    try:
+        return list(_generar_tokens(texto[i:i + TAMANO_BLOQUE] for i in range(0, len(texto), TAMANO_BLOQUE)))
+    finally:
+        if pausar:
+            gc.enable()
+
+def tokenizar_flujo(archivo, tamano_bloque=TAMANO_BLOQUE):
+    # tokens de un archivo de texto abierto, leído de a bloques: en memoria queda solo el
+    # bloque actual y el token que lo cruza (una cadena puede ocupar varios bloques)
+    return _generar_tokens(iter(lambda: archivo.read(tamano_bloque), ''))
+
+def _generar_tokens(bloques):
+    # la columna sale de la posición: ultimo es el índice en texto del último salto de
+    # línea que hubo en espacios o comentarios (los de dentro de una cadena no cuentan)
+    texto = ''
+    fin = False
     linea = 1
-    columna = 1
-    tokens = []
-    while pos < len(texto):
-        m = token_regex.match(texto, pos)
-        if not m:
-            raise SyntaxError(f"Error léxico en línea {linea} columna {columna}: {texto[pos]!r}")
-        tipo = m.lastgroup
-        valor = m.group(tipo)
-        if tipo == 'ESPACIO':
-            nueva_lineas = valor.count('\n')
-            if nueva_lineas:
-                linea += nueva_lineas
-                columna = len(valor) - valor.rfind('\n')
-            else:
-                columna += len(valor)
-            pos = m.end()
-            continue
-        if tipo == 'COMENTARIO':
-            nueva_lineas = valor.count('\n')
-            if nueva_lineas:
-                linea += nueva_lineas
-                columna = 1
-            else:
-                columna += len(valor)
-            pos = m.end()
-            continue
-        if tipo == 'IDENT':
-            if valor.upper() in PALABRAS_RESERVADAS:
-                tipo = valor.upper()
-                valor = valor.upper()
-            else:
-                pass
-        tokens.append(Token(tipo, valor, linea, columna))
-        advance = len(valor)
-        pos = m.end()
-        columna += advance
-    tokens.append(Token('EOF', '', linea, columna))
-    return tokens
-
-__all__ = ['Token', 'tokenizar', 'PALABRAS_RESERVADAS']
\ No newline at end of file
+    ultimo = -1
+    clases = _CLASES
+    while not fin:
+        bloque = next(bloques, '')
+        if bloque:
+            texto += bloque
+        else:
+            fin = True
+        limite = len(texto) if fin else len(texto) - _MARGEN
+        piezas = token_regex.split(texto)
+        pos = 0
+        hueco = ''
+        for hueco, salto, valor in zip(piezas[::3], piezas[1::3], piezas[2::3]):
+            inicio = pos + len(salto)
+            final = inicio + len(valor)
+            if hueco or final > limite:
+                # algo que no es token, o un token que puede seguir en el próximo bloque
+                break
+            if salto and '\n' in salto:
+                linea += salto.count('\n')
+                ultimo = pos + salto.rfind('\n')
+            pos = final
+            tipo, valor = clases[valor]
+            yield Token(tipo, valor, linea, inicio - ultimo)
+        # lo ya reconocido se descarta del texto
+        texto = texto[pos:]
+        ultimo -= pos
+        if hueco and not fin:
+            # solo una cadena sin cerrar puede completarse con los bloques siguientes
+            resto = salto_regex.match(texto).end()
+            if resto < limite - pos and texto[resto] not in '\'"':
+                break
+    # después del último token solo pueden quedar espacios y comentarios
+    final = salto_regex.match(texto).end()
+    saltos = texto.count('\n', 0, final)
+    if saltos:
+        linea += saltos
+        ultimo = texto.rfind('\n', 0, final)
+    if final < len(texto):
+        raise ErrorLexico(f"Error léxico en línea {linea} columna {final - ultimo}: {texto[final]!r}")
+    yield Token('EOF', '', linea, final - ultimo)
+
+class FlujoTokens:
+    # los tokens de un generador con la interfaz de lista que usa el Parser: se piden al
+    # generador a medida que se indexan y descartar() suelta los de sentencias ya
+    # ejecutadas; los índices son siempre los del programa completo. Con medir se acumula
+    # en tiempo lo que tardó el lexer
+    def __init__(self, generador, medir=False):
+        self.generador = generador
+        self.leidos = []
+        self.base = 0
+        self.medir = medir
+        self.tiempo = 0.0
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.leidos[i.start - self.base:i.stop - self.base]
+        k = i - self.base
+        while k >= len(self.leidos):
+            inicio = time.perf_counter() if self.medir else None
+            token = next(self.generador, None)
+            if inicio is not None:
+                self.tiempo += time.perf_counter() - inicio
+            if token is None:
+                raise IndexError(i)
+            self.leidos.append(token)
+        return self.leidos[k]
+
+    def descartar(self, hasta):
+        del self.leidos[:hasta - self.base]
+        self.base = hasta
+
+__all__ = ['Token', 'tokenizar', 'tokenizar_flujo', 'FlujoTokens', 'ErrorLexico', 'TAMANO_BLOQUE',
+           'PALABRAS_RESERVADAS', 'FUNCIONES_AGREGADAS']
\ No newline at end of file
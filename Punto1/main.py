@@ -1,11 +1,15 @@
+import argparse
 import os
 
 RUTA_ENTRADA = os.path.join(os.path.dirname(__file__), 'entrada.txt')
 
-def ejecutar_archivo_entrada(ruta=RUTA_ENTRADA):
+def ejecutar_archivo_entrada(ruta=RUTA_ENTRADA, almacenamiento='filas', ruta_wal=None, perfil=None, ruta_perfil=None):
+    # el script se lee de a bloques y cada sentencia se ejecuta al llegar a su punto y coma,
+    # sin guardar los resultados: la memoria depende de la sentencia más grande y no del
+    # tamaño del archivo. Devuelve cuántas sentencias se ejecutaron.
+    # perfil: None, 'reporte' o 'json'; se imprime al final (o se escribe en ruta_perfil)
     try:
-        with open(ruta, 'r', encoding='utf-8') as f:
-            texto = f.read()
+        archivo = open(ruta, 'r', encoding='utf-8')
     except FileNotFoundError:
         print(f"Archivo de entrada no encontrado: {ruta}")
         return
@@ -13,15 +17,19 @@ def ejecutar_archivo_entrada(ruta=RUTA_ENTRADA):
         print(f"Error leyendo {ruta}: {e}")
         return
 
+    with archivo:
+        return _ejecutar_flujo(archivo, almacenamiento, ruta_wal, perfil, ruta_perfil)
+
+def _ejecutar_flujo(archivo, almacenamiento, ruta_wal, perfil, ruta_perfil):
     try:
-        from lexer import tokenizar
+        from lexer import tokenizar_flujo, FlujoTokens, ErrorLexico
     except Exception as e:
         print("Error lexer.py:", e)
         try:
             import importlib, inspect
             m = importlib.import_module('lexer')
             print("Módulo lexer cargado desde:", getattr(m, '__file__', 'desconocido'))
-            if not hasattr(m, 'tokenizar'):
+            if not hasattr(m, 'tokenizar_flujo'):
                 print("Verifica lexer.py")
         except Exception:
             pass
@@ -29,25 +37,38 @@ def ejecutar_archivo_entrada(ruta=RUTA_ENTRADA):
 
     try:
         from base_datos import BaseDatosMemoria
-        from parser import Parser
+        from parser import Parser, imprimir_resultado
+        from perfil import reporte, a_json
     except Exception as e:
         print("Error", e)
         return
 
-    # tokenizar y parsear
+    # con ruta_wal la base se recupera de la bitácora y los cambios del script quedan en ella
     try:
-        tokens = tokenizar(texto)
+        bd = BaseDatosMemoria(almacenamiento, ruta_wal)
     except Exception as e:
-        print("Error tokenización:", e)
+        print("Error recuperando la bitácora:", e)
         return
-
-    bd = BaseDatosMemoria()
-    parser = Parser(tokens, bd)
+    # el lexer avanza a medida que el parser pide tokens; con perfil cada sentencia mide
+    # aparte el tiempo que el lexer pasó leyendo sus tokens
+    tokens = FlujoTokens(tokenizar_flujo(archivo), medir=perfil is not None)
+    parser = Parser(tokens, bd, salida=imprimir_resultado, perfilar=perfil is not None)
+    perfiles = []
+    ejecutadas = 0
     try:
-        resultados = parser.parsear_programa()
+        for res in parser.ejecutar_sentencias():
+            ejecutadas += 1
+            if perfil is not None:
+                perfiles.append(res['perfil'])
+    except ErrorLexico as e:
+        # las sentencias anteriores al error ya se ejecutaron
+        print("Error tokenización:", e)
+        return ejecutadas
     except Exception as e:
         print("Error parseo/ejecución:", e)
-        return
+        return ejecutadas
+    finally:
+        bd.cerrar()
 
     if parser.errores:
         print("\nERRORES ENCONTRADOS:")
@@ -55,7 +76,23 @@ def ejecutar_archivo_entrada(ruta=RUTA_ENTRADA):
             print("-", e.get('mensaje', str(e)))
     else:
         print("\nEjecución completada sin errores.")
-    return resultados
+    if perfil is not None:
+        salida = a_json(perfiles) if perfil == 'json' else reporte(perfiles)
+        if ruta_perfil is None:
+            print()
+            print(salida)
+        else:
+            with open(ruta_perfil, 'w', encoding='utf-8') as f:
+                f.write(salida + "\n")
+    return ejecutadas
 
 if __name__ == '__main__':
-    ejecutar_archivo_entrada()
\ No newline at end of file
+    argumentos = argparse.ArgumentParser()
+    argumentos.add_argument('entrada', nargs='?', default=RUTA_ENTRADA)
+    argumentos.add_argument('--almacenamiento', choices=('filas', 'columnar', 'tuplas'), default='filas')
+    argumentos.add_argument('--wal', dest='ruta_wal', help="bitácora para el modo durable")
+    argumentos.add_argument('--profile', dest='perfil', nargs='?', const='reporte', choices=('reporte', 'json'),
+                            help="perfil de cada sentencia, de la más lenta a la más rápida")
+    argumentos.add_argument('--profile-salida', dest='ruta_perfil', help="archivo para el perfil en lugar de la consola")
+    opciones = argumentos.parse_args()
+    ejecutar_archivo_entrada(opciones.entrada, opciones.almacenamiento, opciones.ruta_wal, opciones.perfil, opciones.ruta_perfil)
\ No newline at end of file
@@ -1,14 +1,40 @@
+import time
+
 from lexer import tokenizar, Token
 from tipos import tipo_literal_desde_valor, TIPOS_VALIDOS
 from base_datos import BaseDatosMemoria
-from expresiones import evaluar_expr_con_contexto, evaluar_expr_sin_contexto
+from expresiones import evaluar_expr_sin_contexto, contiene_parametros
+from ejecutor import Ejecutor
+from perfil import Perfil, activo
+
+def imprimir_resultado(resultado_schema, filas, titulo="RESULTADO SELECT:"):
+    # salida por consola de un SELECT o EXPLAIN; devuelve cuántas filas imprimió
+    print(titulo)
+    if not resultado_schema:
+        print("No hay columnas en proyección")
+        return 0
+    print("\t".join(c[0] for c in resultado_schema))
+    conteo = 0
+    for fila in filas:
+        print("\t".join(str(v) for v in fila))
+        conteo += 1
+    return conteo
 
 class Parser:
-    def __init__(self, tokens, base_datos):
+    def __init__(self, tokens, base_datos, salida=None, perfilar=False):
+        # salida(schema, filas): destino opcional de los resultados de SELECT (p.ej.
+        # imprimir_resultado); sin salida las filas quedan en el resultado de la sentencia.
+        # Con perfilar cada resultado de parsear_programa trae su 'perfil' (perfil.py).
+        # tokens es una lista o un FlujoTokens (lexer.py) que se va leyendo y soltando
         self.tokens = tokens
         self.pos = 0
         self.base_datos = base_datos
-        self.errores = []
+        self.salida = salida
+        self.perfilar = perfilar
+        self.ejecutor = Ejecutor(base_datos)
+        self.errores = self.ejecutor.errores
+        self.num_parametros = 0
+        self.con_parametros = False
 
     def actual(self):
         return self.tokens[self.pos]
@@ -18,7 +44,9 @@ class Parser:
         return self.tokens[self.pos - 1]
 
     def aceptar(self, tipo):
-        if self.actual().tipo == tipo:
+        tipo_actual = self.actual().tipo
+        # los nombres de funciones de agregación también sirven como identificadores
+        if tipo_actual == tipo or (tipo == 'IDENT' and tipo_actual == 'AGREGADO'):
             return self.adelantar()
         return None
 
@@ -30,38 +58,141 @@ class Parser:
         return t
 
     def parsear_programa(self):
-        resultados = []
+        return list(self.ejecutar_sentencias())
+
+    def ejecutar_sentencias(self):
+        # generador: ejecuta cada sentencia en cuanto termina de leerla (al ver su punto y
+        # coma) y la entrega; con un FlujoTokens los tokens de las sentencias ya ejecutadas
+        # se sueltan, así que la memoria depende de la sentencia más grande y no del script
+        soltar = getattr(self.tokens, 'descartar', None)
         while self.actual().tipo != 'EOF':
             if self.actual().tipo == 'PUNTO_COMA':
                 self.adelantar()
                 continue
-            res = self.parsear_sentencia()
-            resultados.append(res)
+            if self.perfilar:
+                res = self.parsear_sentencia_perfilada()
+            else:
+                res = self.parsear_sentencia()
+                self.consumir(res)
             if self.aceptar('PUNTO_COMA'):
                 pass
-        return resultados
+            if soltar is not None:
+                soltar(self.pos)
+            yield res
+        sesion = self.ejecutor.base_datos
+        if sesion.en_transaccion:
+            # lo que no se confirmó al terminar el programa se descarta
+            sesion.terminar_transaccion(False)
+            self.errores.append({'mensaje': "Transacción sin COMMIT al final del programa: se deshizo", 'linea': self.actual().linea})
+
+    def preparar_programa(self):
+        # solo el análisis: lista de sentencias para Ejecutor.ejecutar
+        sentencias = []
+        while self.actual().tipo != 'EOF':
+            if self.aceptar('PUNTO_COMA'):
+                continue
+            sentencias.append(self.leer_sentencia())
+        return sentencias
 
     def parsear_sentencia(self):
+        return self.ejecutor.ejecutar(self.leer_sentencia())
+
+    def consumir(self, res):
+        if 'filas' in res:
+            # las filas se consumen antes de seguir: la siguiente sentencia puede modificar las tablas
+            if res['tipo_sentencia'] == 'EXPLAIN' and self.salida is not None:
+                res['filas_emitidas'] = self.salida(res['schema'], res.pop('filas'), titulo="PLAN:")
+            elif self.salida is not None:
+                res['filas_emitidas'] = self.salida(res['schema'], res.pop('filas'))
+            else:
+                cabeceras = [c[0] for c in res['schema']]
+                res['filas'] = [dict(zip(cabeceras, fila)) for fila in res['filas']]
+
+    def parsear_sentencia_perfilada(self):
+        # como parsear_sentencia + consumir, midiendo cada etapa; el tiempo de ejecutar
+        # incluye recorrer las filas, que salen de generadores
+        inicio = self.pos
+        primer_parametro = self.num_parametros
+        perfil = Perfil(linea=self.actual().linea)
+        lexer_antes = getattr(self.tokens, 'tiempo', 0.0)
+        with activo(perfil):
+            t0 = time.perf_counter()
+            sentencia = self.leer_sentencia()
+            t1 = time.perf_counter()
+            res = self.ejecutor.ejecutar(sentencia)
+            self.consumir(res)
+            t2 = time.perf_counter()
+        # con un FlujoTokens el lexer trabaja mientras se parsea: ese tiempo va aparte
+        perfil.tiempos['tokenizar'] = getattr(self.tokens, 'tiempo', 0.0) - lexer_antes
+        perfil.tiempos['parsear'] = t1 - t0 - perfil.tiempos['tokenizar']
+        perfil.tiempos['ejecutar'] = t2 - t1
+        perfil.sentencia = self.texto_normalizado(inicio, primer_parametro)
+        if 'filas_emitidas' in res:
+            perfil.filas_emitidas = res['filas_emitidas']
+        elif isinstance(res.get('filas'), list):
+            perfil.filas_emitidas = len(res['filas'])
+        else:
+            perfil.filas_emitidas = res.get('insertadas', res.get('afectadas', res.get('borrados', 0)))
+        res['perfil'] = perfil.a_dict()
+        return res
+
+    def leer_sentencia(self):
         tok = self.actual()
+        inicio = self.pos
+        primer_parametro = self.num_parametros
+        self.con_parametros = False
         if tok.tipo == 'SELECT':
-            return self.parsear_select()
-        if tok.tipo == 'INSERT':
-            return self.parsear_insert()
-        if tok.tipo == 'UPDATE':
-            return self.parsear_update()
-        if tok.tipo == 'DELETE':
-            return self.parsear_delete()
-        if tok.tipo == 'CREATE':
-            return self.parsear_create()
-        raise SyntaxError(f"Sentencia desconocida en linea {tok.linea} col {tok.columna}: {tok.valor}")
+            sentencia = self.parsear_select()
+        elif tok.tipo == 'INSERT':
+            sentencia = self.parsear_insert()
+        elif tok.tipo == 'UPDATE':
+            sentencia = self.parsear_update()
+        elif tok.tipo == 'DELETE':
+            sentencia = self.parsear_delete()
+        elif tok.tipo == 'CREATE':
+            sentencia = self.parsear_create()
+        elif tok.tipo in ('COPY', 'LOAD'):
+            sentencia = self.parsear_copy()
+        elif tok.tipo in ('SAVE', 'OPEN'):
+            sentencia = self.parsear_snapshot()
+        elif tok.tipo == 'ANALYZE':
+            sentencia = self.parsear_analyze()
+        elif tok.tipo in ('BEGIN', 'COMMIT', 'ROLLBACK'):
+            self.adelantar()
+            sentencia = {'tipo_sentencia': tok.tipo, 'linea': tok.linea}
+        elif tok.tipo == 'EXPLAIN':
+            self.adelantar()
+            sentencia = {'tipo_sentencia': 'EXPLAIN', 'sentencia': self.leer_sentencia()}
+        else:
+            raise SyntaxError(f"Sentencia desconocida en linea {tok.linea} col {tok.columna}: {tok.valor}")
+        sentencia['con_parametros'] = self.con_parametros
+        if sentencia['tipo_sentencia'] == 'SELECT':
+            sentencia['texto'] = self.texto_normalizado(inicio, primer_parametro)
+        return sentencia
+
+    def texto_normalizado(self, inicio, primer_parametro):
+        # la sentencia leída desde inicio, un token tras otro (sin comentarios y con las
+        # palabras reservadas en mayúsculas); cada ? lleva su número porque el mismo texto
+        # puede tomar distintos parámetros según su lugar en el script
+        partes = []
+        numero = primer_parametro
+        for tok in self.tokens[inicio:self.pos]:
+            if tok.tipo == 'PARAM' and tok.valor == '?':
+                partes.append(f"?{numero}")
+                numero += 1
+            else:
+                partes.append(tok.valor)
+        return ' '.join(partes)
 
     def parsear_create(self):
         self.esperar('CREATE')
+        if self.actual().tipo == 'INDEX':
+            return self.parsear_create_index()
         self.esperar('TABLE')
         id_tok = self.esperar('IDENT')
         nombre_tabla = id_tok.valor
         self.esperar('PAR_ABRE')
-        columnas = {}
+        columnas = []
         first = True
         while True:
             if not first:
@@ -70,17 +201,21 @@ class Parser:
             col_tok = self.esperar('IDENT')
             nombre_col = col_tok.valor
             tipo_tok = self.esperar('IDENT')
-            tipo_col = tipo_tok.valor.lower()
-            if tipo_col not in TIPOS_VALIDOS:
-                self.errores.append({'mensaje': f"Tipo desconocido {tipo_col} para columna {nombre_col}", 'linea': tipo_tok.linea})
-            columnas[nombre_col] = tipo_col
+            columnas.append((nombre_col, tipo_tok.valor.lower(), tipo_tok.linea))
             if self.aceptar('PAR_CIERRA'):
                 break
-        try:
-            self.base_datos.crear_tabla(nombre_tabla, columnas.items())
-        except Exception as e:
-            self.errores.append({'mensaje': str(e), 'linea': id_tok.linea})
-        return {'tipo_sentencia': 'CREATE', 'tabla': nombre_tabla, 'columnas': columnas}
+        return {'tipo_sentencia': 'CREATE', 'tabla': nombre_tabla, 'columnas': columnas, 'linea': id_tok.linea}
+
+    def parsear_create_index(self):
+        self.esperar('INDEX')
+        nombre_indice = self.esperar('IDENT').valor
+        self.esperar('ON')
+        id_tok = self.esperar('IDENT')
+        nombre_tabla = id_tok.valor
+        self.esperar('PAR_ABRE')
+        columna = self.esperar('IDENT').valor
+        self.esperar('PAR_CIERRA')
+        return {'tipo_sentencia': 'CREATE INDEX', 'indice': nombre_indice, 'tabla': nombre_tabla, 'columna': columna, 'linea': id_tok.linea}
 
     def parsear_insert(self):
         self.esperar('INSERT')
@@ -99,8 +234,20 @@ class Parser:
             if self.aceptar('PAR_CIERRA'):
                 break
         self.esperar('VALUES')
+        valores = []
+        constantes = []
+        while True:
+            fila, constantes_fila = self.parsear_tupla_valores()
+            valores.append(fila)
+            constantes.append(constantes_fila)
+            if not self.aceptar('COMA'):
+                break
+        return {'tipo_sentencia': 'INSERT', 'tabla': nombre_tabla, 'columnas': columnas, 'valores': valores, 'constantes': constantes, 'linea': id_tok.linea}
+
+    def parsear_tupla_valores(self):
         self.esperar('PAR_ABRE')
         valores = []
+        constantes = []
         first = True
         while True:
             if not first:
@@ -108,39 +255,38 @@ class Parser:
             first = False
             expr = self.parsear_expr()
             valores.append(expr)
+            # los valores sin parámetros se evalúan una vez aquí y no en cada ejecución
+            constantes.append(None if contiene_parametros(expr) else evaluar_expr_sin_contexto(expr))
             if self.aceptar('PAR_CIERRA'):
                 break
-        if nombre_tabla not in self.base_datos.tablas:
-            self.errores.append({'mensaje': f"Tabla {nombre_tabla} no existe", 'linea': id_tok.linea})
-            return {'tipo_sentencia': 'INSERT', 'tabla': nombre_tabla, 'columnas': columnas, 'valores': valores}
-        esquema = self.base_datos.tablas[nombre_tabla]['columnas']
-        if len(columnas) != len(valores):
-            self.errores.append({'mensaje': f"INSERT: número de columnas y valores no coincide para {nombre_tabla}", 'linea': id_tok.linea})
-        fila = {}
-        for i, col in enumerate(columnas):
-            if col not in esquema:
-                self.errores.append({'mensaje': f"INSERT: columna {col} no existe en {nombre_tabla}", 'linea': id_tok.linea})
-                continue
-            tipo_col = esquema[col]
-            tipo_val, valor = evaluar_expr_sin_contexto(valores[i])
-            if tipo_val != tipo_col:
-                if tipo_val == 'entero' and tipo_col == 'flotante':
-                    valor = float(valor)
-                    tipo_val = 'flotante'
-                elif tipo_val == 'flotante' and tipo_col == 'entero':
-                    valor = int(valor)
-                    tipo_val = 'entero'
-                elif tipo_col == 'cadena':
-                    valor = str(valor)
-                    tipo_val = 'cadena'
-                else:
-                    pass
-            fila[col] = valor
-        try:
-            self.base_datos.insertar(nombre_tabla, fila)
-        except Exception as e:
-            self.errores.append({'mensaje': str(e), 'linea': id_tok.linea})
-        return {'tipo_sentencia': 'INSERT', 'tabla': nombre_tabla, 'columnas': columnas, 'valores': valores}
+        return valores, constantes
+
+    def parsear_copy(self):
+        # COPY tabla FROM 'archivo'  |  LOAD 'archivo' INTO tabla
+        if self.aceptar('COPY'):
+            id_tok = self.esperar('IDENT')
+            self.esperar('FROM')
+            ruta_tok = self.esperar('CADENA')
+        else:
+            self.esperar('LOAD')
+            ruta_tok = self.esperar('CADENA')
+            self.esperar('INTO')
+            id_tok = self.esperar('IDENT')
+        ruta = tipo_literal_desde_valor(ruta_tok.valor)[1]
+        return {'tipo_sentencia': 'COPY', 'tabla': id_tok.valor, 'ruta': ruta, 'linea': id_tok.linea}
+
+    def parsear_snapshot(self):
+        # SAVE SNAPSHOT 'archivo'  |  OPEN SNAPSHOT 'archivo'
+        tok = self.adelantar()
+        self.esperar('SNAPSHOT')
+        ruta = tipo_literal_desde_valor(self.esperar('CADENA').valor)[1]
+        return {'tipo_sentencia': f"{tok.tipo} SNAPSHOT", 'ruta': ruta, 'linea': tok.linea}
+
+    def parsear_analyze(self):
+        # ANALYZE [tabla]: sin tabla se recalculan las estadísticas de todas
+        tok = self.esperar('ANALYZE')
+        id_tok = self.aceptar('IDENT')
+        return {'tipo_sentencia': 'ANALYZE', 'tabla': id_tok.valor if id_tok else None, 'linea': tok.linea}
 
     def parsear_update(self):
         self.esperar('UPDATE')
@@ -162,27 +308,7 @@ class Parser:
         condicion = None
         if self.aceptar('WHERE'):
             condicion = self.parsear_expr()
-        if nombre_tabla not in self.base_datos.tablas:
-            self.errores.append({'mensaje': f"UPDATE: tabla {nombre_tabla} no existe", 'linea': id_tok.linea})
-            return {'tipo_sentencia': 'UPDATE', 'tabla': nombre_tabla, 'asignaciones': asignaciones, 'where': condicion}
-        esquema = self.base_datos.tablas[nombre_tabla]['columnas']
-        for col in asignaciones.keys():
-            if col not in esquema:
-                self.errores.append({'mensaje': f"UPDATE: columna {col} no existe en {nombre_tabla}", 'linea': id_tok.linea})
-        def condicion_fn(registro):
-            if condicion is None:
-                return True
-            tipo_c, val = evaluar_expr_con_contexto(condicion, {None: registro}, esquema)
-            if tipo_c != 'booleano':
-                return bool(val)
-            return bool(val)
-        asign_fns = {}
-        for col, expr in asignaciones.items():
-            def make_fn(e):
-                return lambda reg, e=e: evaluar_expr_con_contexto(e, {None: reg}, esquema)[1]
-            asign_fns[col] = make_fn(expr)
-        conteo = self.base_datos.actualizar(nombre_tabla, condicion_fn, asign_fns)
-        return {'tipo_sentencia': 'UPDATE', 'tabla': nombre_tabla, 'afectadas': conteo}
+        return {'tipo_sentencia': 'UPDATE', 'tabla': nombre_tabla, 'asignaciones': asignaciones, 'where': condicion, 'linea': id_tok.linea}
 
     def parsear_delete(self):
         self.esperar('DELETE')
@@ -192,18 +318,7 @@ class Parser:
         condicion = None
         if self.aceptar('WHERE'):
             condicion = self.parsear_expr()
-        if nombre_tabla not in self.base_datos.tablas:
-            self.errores.append({'mensaje': f"DELETE: tabla {nombre_tabla} no existe", 'linea': id_tok.linea})
-            return {'tipo_sentencia': 'DELETE', 'tabla': nombre_tabla, 'where': condicion}
-        def condicion_fn(registro):
-            if condicion is None:
-                return True
-            tipo_c, val = evaluar_expr_con_contexto(condicion, {None: registro}, self.base_datos.tablas[nombre_tabla]['columnas'])
-            if tipo_c != 'booleano':
-                return bool(val)
-            return bool(val)
-        borrados = self.base_datos.borrar(nombre_tabla, condicion_fn)
-        return {'tipo_sentencia': 'DELETE', 'tabla': nombre_tabla, 'borrados': borrados}
+        return {'tipo_sentencia': 'DELETE', 'tabla': nombre_tabla, 'where': condicion, 'linea': id_tok.linea}
 
     def parsear_select(self):
         self.esperar('SELECT')
@@ -212,13 +327,13 @@ class Parser:
             lista_campos.append({'tipo': 'STAR'})
         else:
             while True:
-                tok_campo = self.esperar('IDENT')
-                nombre = tok_campo.valor
-                if self.aceptar('PUNTO'):
-                    col_tok = self.esperar('IDENT')
-                    campo = {'tipo': 'CAMPO', 'tabla_o_alias': nombre, 'columna': col_tok.valor, 'linea': tok_campo.linea}
+                tok_campo = self.actual()
+                expr = self.parsear_expr()
+                if expr[0] == 'REF':
+                    campo = {'tipo': 'CAMPO', 'tabla_o_alias': expr[1], 'columna': expr[2], 'linea': tok_campo.linea}
                 else:
-                    campo = {'tipo': 'CAMPO', 'tabla_o_alias': None, 'columna': nombre, 'linea': tok_campo.linea}
+                    # expresión calculada, p.ej. SUM(total) o COUNT(*)
+                    campo = {'tipo': 'EXPR', 'expr': expr, 'linea': tok_campo.linea}
                 if self.aceptar('AS'):
                     alias_tok = self.esperar('IDENT')
                     campo['alias'] = alias_tok.valor
@@ -236,113 +351,44 @@ class Parser:
                 alias = alias_tok.valor
             else:
                 nxt = self.tokens[self.pos]
-                if nxt.tipo not in ('COMA', 'PUNTO_COMA', 'WHERE', 'EOF'):
+                if nxt.tipo not in ('COMA', 'PUNTO_COMA', 'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'OFFSET', 'EOF'):
                     alias = self.adelantar().valor
             lista_tablas.append((nombre_tabla, alias or nombre_tabla))
             if not self.aceptar('COMA'):
                 break
-        columnas_disponibles = {}
-        for nombre_tabla, alias in lista_tablas:
-            if nombre_tabla not in self.base_datos.tablas:
-                self.errores.append({'mensaje': f"SELECT: tabla {nombre_tabla} no existe", 'linea': tbl_tok.linea})
-                continue
-            esquema = self.base_datos.tablas[nombre_tabla]['columnas']
-            for col, tipo in esquema.items():
-                if col not in columnas_disponibles:
-                    columnas_disponibles[col] = []
-                columnas_disponibles[col].append({'alias': alias, 'tabla': nombre_tabla, 'tipo': tipo})
         condicion = None
         if self.aceptar('WHERE'):
             condicion = self.parsear_expr()
-        resultado_schema = []
-        def resolver_campo(campo):
-            if campo['tipo'] == 'STAR':
-                expansiones = []
-                for nombre_tabla, alias in lista_tablas:
-                    esquema = self.base_datos.tablas.get(nombre_tabla, {}).get('columnas', {})
-                    for col, tipo in esquema.items():
-                        nombre_salida = f"{alias}.{col}"
-                        expansiones.append({'alias': alias, 'tabla': nombre_tabla, 'columna': col, 'tipo': tipo, 'nombre_salida': nombre_salida})
-                return expansiones
-            col = campo['columna']
-            if campo['tabla_o_alias'] is not None:
-                alias = campo['tabla_o_alias']
-                for nombre_tabla, al in lista_tablas:
-                    if al == alias:
-                        esquema = self.base_datos.tablas.get(nombre_tabla, {}).get('columnas', {})
-                        if col not in esquema:
-                            self.errores.append({'mensaje': f"Columna {col} no existe en tabla {nombre_tabla} (alias {alias})", 'linea': campo.get('linea')})
-                            return []
-                        nombre_salida = campo.get('alias', col)
-                        return [{'alias': alias, 'tabla': nombre_tabla, 'columna': col, 'tipo': esquema[col], 'nombre_salida': nombre_salida}]
-                self.errores.append({'mensaje': f"Alias o tabla {alias} no encontrada en FROM", 'linea': campo.get('linea')})
-                return []
-            else:
-                entradas = columnas_disponibles.get(col, [])
-                if len(entradas) == 0:
-                    self.errores.append({'mensaje': f"Columna {col} no encontrada en FROM", 'linea': campo.get('linea')})
-                    return []
-                if len(entradas) > 1:
-                    self.errores.append({'mensaje': f"Columna {col} es ambigua en FROM; use alias", 'linea': campo.get('linea')})
-                    return []
-                entrada = entradas[0]
-                nombre_salida = campo.get('alias', col)
-                return [{'alias': entrada['alias'], 'tabla': entrada['tabla'], 'columna': col, 'tipo': entrada['tipo'], 'nombre_salida': nombre_salida}]
-        proyecciones = []
-        for campo in lista_campos:
-            expans = resolver_campo(campo)
-            for e in expans:
-                resultado_schema.append((e['nombre_salida'], e['tipo']))
-                proyecciones.append(e)
-        def funcion_ejecucion():
-            tablas_registros = []
-            for nombre_tabla, alias in lista_tablas:
-                if nombre_tabla not in self.base_datos.tablas:
-                    tablas_registros.append((alias, []))
-                else:
-                    tablas_registros.append((alias, self.base_datos.tablas[nombre_tabla]['registros']))
-            resultados = []
-            def combinar(i, contexto):
-                if i >= len(tablas_registros):
-                    if condicion is not None:
-                        tipo_c, val = evaluar_expr_con_contexto(condicion, contexto, None)
-                        if tipo_c != 'booleano':
-                            if not val:
-                                return
-                        else:
-                            if not val:
-                                return
-                    fila = {}
-                    for p in proyecciones:
-                        alias = p['alias']
-                        col = p['columna']
-                        nombre_salida = p['nombre_salida']
-                        valor = None
-                        if alias in contexto:
-                            valor = contexto[alias].get(col)
-                        fila[nombre_salida] = valor
-                    resultados.append(fila)
-                    return
-                alias, registros = tablas_registros[i]
-                if len(registros) == 0:
-                    return
-                for reg in registros:
-                    contexto[alias] = reg
-                    combinar(i+1, contexto)
-                contexto.pop(alias, None)
-            combinar(0, {})
-            return resultados
-        filas = funcion_ejecucion()
-        print("RESULTADO SELECT:")
-        if resultado_schema:
-            cabeceras = [c[0] for c in resultado_schema]
-            print("\t".join(cabeceras))
-            for f in filas:
-                vals = [str(f.get(c, 'NULL')) for c in cabeceras]
-                print("\t".join(vals))
-        else:
-            print("No hay columnas en proyección")
-        return {'tipo_sentencia': 'SELECT', 'schema': resultado_schema, 'filas': filas}
+        grupo = []
+        if self.aceptar('GROUP'):
+            self.esperar('BY')
+            grupo.append(self.parsear_expr())
+            while self.aceptar('COMA'):
+                grupo.append(self.parsear_expr())
+        having = None
+        if self.aceptar('HAVING'):
+            having = self.parsear_expr()
+        # ORDER BY expr [ASC|DESC], ...: lista de (expr, descendente)
+        orden = []
+        if self.aceptar('ORDER'):
+            self.esperar('BY')
+            while True:
+                expr = self.parsear_expr()
+                descendente = self.aceptar('DESC') is not None
+                if not descendente:
+                    self.aceptar('ASC')
+                orden.append((expr, descendente))
+                if not self.aceptar('COMA'):
+                    break
+        limite = None
+        if self.aceptar('LIMIT'):
+            limite = self.parsear_expr()
+        desplazamiento = None
+        if self.aceptar('OFFSET'):
+            desplazamiento = self.parsear_expr()
+        return {'tipo_sentencia': 'SELECT', 'campos': lista_campos, 'tablas': lista_tablas, 'where': condicion,
+                'grupo': grupo, 'having': having, 'orden': orden, 'limite': limite, 'desplazamiento': desplazamiento,
+                'linea': tbl_tok.linea}
 
     def parsear_expr(self):
         return self.parsear_or()
@@ -404,7 +450,9 @@ class Parser:
         if tok.tipo in ('NUMERO','CADENA','TRUE','FALSE'):
             self.adelantar()
             return ('LIT', tok.valor)
-        if tok.tipo == 'IDENT':
+        if tok.tipo == 'AGREGADO' and self.tokens[self.pos + 1].tipo == 'PAR_ABRE':
+            return self.parsear_agregado()
+        if tok.tipo in ('IDENT', 'AGREGADO'):
             id1 = self.adelantar().valor
             if self.aceptar('PUNTO'):
                 col_tok = self.esperar('IDENT')
@@ -415,4 +463,23 @@ class Parser:
             self.adelantar()
             factor = self.parsear_factor()
             return ('NEG', factor)
-        raise SyntaxError(f"Factor inesperado {tok.tipo} ({tok.valor}) en linea {tok.linea}")
\ No newline at end of file
+        if tok.tipo == 'PARAM':
+            self.adelantar()
+            self.con_parametros = True
+            if tok.valor != '?':
+                return ('PARAM', tok.valor[1:])
+            self.num_parametros += 1
+            return ('PARAM', self.num_parametros - 1)
+        raise SyntaxError(f"Factor inesperado {tok.tipo} ({tok.valor}) en linea {tok.linea}")
+
+    def parsear_agregado(self):
+        # COUNT(*) | COUNT/SUM/AVG/MIN/MAX(expr) -> ('AGREGADO', función, expr o None)
+        tok = self.adelantar()
+        funcion = tok.valor.upper()
+        self.esperar('PAR_ABRE')
+        if funcion == 'COUNT' and self.aceptar('AST'):
+            argumento = None
+        else:
+            argumento = self.parsear_expr()
+        self.esperar('PAR_CIERRA')
+        return ('AGREGADO', funcion, argumento)
\ No newline at end of file
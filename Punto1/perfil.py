@@ -0,0 +1,90 @@
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# perfil de la sentencia que se está ejecutando en este hilo; None (lo normal) apaga
+# toda la instrumentación: los puntos de medición solo preguntan por él al compilar una
+# expresión o al arrancar un recorrido, nunca por fila
+_local = threading.local()
+
+def actual():
+    return getattr(_local, 'perfil', None)
+
+@contextmanager
+def activo(perfil):
+    previo = actual()
+    _local.perfil = perfil
+    try:
+        yield perfil
+    finally:
+        _local.perfil = previo
+
+class Perfil:
+    # lo que costó una sentencia: tiempos de cada etapa, filas que recorrió el acceso a
+    # cada tabla (por índice o entera), combinaciones de filas que probaron los joins,
+    # filas que devolvió o modificó y evaluaciones de cada tipo de nodo de expresión
+    def __init__(self, sentencia='', linea=None):
+        self.sentencia = sentencia
+        self.linea = linea
+        self.tiempos = {'tokenizar': 0.0, 'parsear': 0.0, 'ejecutar': 0.0}
+        self.filas_leidas = Counter()
+        self.combinaciones = 0
+        self.filas_emitidas = 0
+        self.evaluaciones = Counter()
+
+    def leer(self, tabla, filas):
+        self.filas_leidas[tabla] += filas
+
+    def evaluar_vectorial(self, nodo_expr, filas):
+        # una evaluación con NumPy cuenta como una por fila en cada nodo del árbol
+        if not isinstance(nodo_expr, tuple):
+            return
+        self.evaluaciones[nodo_expr[0]] += filas
+        if nodo_expr[0] not in ('LIT', 'VAL', 'REF', 'PARAM'):
+            for hijo in nodo_expr[1:]:
+                self.evaluar_vectorial(hijo, filas)
+
+    def total(self):
+        return sum(self.tiempos.values())
+
+    def a_dict(self):
+        return {'sentencia': self.sentencia, 'linea': self.linea, 'tiempos': dict(self.tiempos),
+                'total': self.total(), 'filas_leidas': dict(self.filas_leidas),
+                'combinaciones': self.combinaciones, 'filas_emitidas': self.filas_emitidas,
+                'evaluaciones': dict(self.evaluaciones)}
+
+def contar_filas(filas, perfil):
+    # deja pasar las filas de un join sumando cada una a sus combinaciones
+    for fila in filas:
+        perfil.combinaciones += 1
+        yield fila
+
+def contar_evaluaciones(f, perfil, op):
+    def contada(fila):
+        perfil.evaluaciones[op] += 1
+        return f(fila)
+    return contada
+
+def _recortar(texto, ancho=70):
+    return texto if len(texto) <= ancho else texto[:ancho - 3] + '...'
+
+def reporte(perfiles):
+    # texto con las sentencias de la más lenta a la más rápida
+    lineas = ["PERFIL:"]
+    for perfil in sorted(perfiles, key=lambda p: p['total'], reverse=True):
+        tiempos = perfil['tiempos']
+        lineas.append(f"{perfil['total'] * 1000:9.3f} ms  línea {perfil['linea']}: {_recortar(perfil['sentencia'])}")
+        lineas.append(f"             tokenizar {tiempos['tokenizar'] * 1000:.3f} ms, parsear {tiempos['parsear'] * 1000:.3f} ms,"
+                      f" ejecutar {tiempos['ejecutar'] * 1000:.3f} ms,"
+                      f" filas emitidas {perfil['filas_emitidas']}, combinaciones {perfil['combinaciones']}")
+        if perfil['filas_leidas']:
+            lineas.append("             filas leídas: " + ", ".join(f"{tabla} {n}" for tabla, n in sorted(perfil['filas_leidas'].items())))
+        if perfil['evaluaciones']:
+            evaluaciones = sorted(perfil['evaluaciones'].items(), key=lambda par: (-par[1], par[0]))
+            lineas.append("             evaluaciones: " + ", ".join(f"{op} {n}" for op, n in evaluaciones))
+    return "\n".join(lineas)
+
+def a_json(perfiles):
+    return json.dumps({'sentencias': sorted(perfiles, key=lambda p: p['total'], reverse=True)},
+                      ensure_ascii=False, indent=2)
\ No newline at end of file
@@ -0,0 +1,884 @@
+from itertools import islice
+from operator import itemgetter
+
+from expresiones import compilar_valor, evaluar_expr_sin_contexto, enlazar_registro, expr_a_texto, contiene_agregado
+from planificador import (separar_conjunciones, unir_conjunciones, alias_de_expr, buscar_equijoins,
+                          predicados_indexables, posiciones_por_indice, crear_enlazador, slots_de_tablas, columna_sin_alias,
+                          hash_join, producto_cartesiano, filtrar_registros, compilar_acumuladores, agregar_por_hash,
+                          ordenar, es_constante, OPERADOR_INVERSO)
+from tipos import promover_tipos
+from tramos import Tramos
+from perfil import actual as perfil_actual, contar_filas
+
+# selectividad supuesta de cada comparación cuando no hay estadísticas de la columna
+SELECTIVIDAD = {
+    'IGUAL': 0.1, 'DISTINTO': 0.9,
+    'MENOR': 1 / 3, 'MAYOR': 1 / 3, 'MENOR_IGUAL': 1 / 3, 'MAYOR_IGUAL': 1 / 3,
+}
+SELECTIVIDAD_OTRA = 0.5
+
+# con más tablas que esto el orden de los joins se elige de a una en vez de probar todos
+MAX_TABLAS_DP = 10
+
+def selectividad(condicion, estadistica=None):
+    # estadistica(nodo) da (estadísticas de la columna, valores distintos) de una referencia
+    # a la tabla filtrada, o None; sin ella se usan las selectividades fijas
+    if condicion is None:
+        return 1.0
+    if not isinstance(condicion, tuple):
+        return SELECTIVIDAD_OTRA
+    op = condicion[0]
+    if op == 'AND':
+        return selectividad(condicion[1], estadistica) * selectividad(condicion[2], estadistica)
+    if op == 'OR':
+        s1 = selectividad(condicion[1], estadistica)
+        s2 = selectividad(condicion[2], estadistica)
+        return s1 + s2 - s1 * s2
+    if op == 'NOT':
+        return 1 - selectividad(condicion[1], estadistica)
+    estimada = None if estadistica is None else _selectividad_columna(condicion, estadistica)
+    return SELECTIVIDAD.get(op, SELECTIVIDAD_OTRA) if estimada is None else estimada
+
+def _es_numero(valor):
+    return type(valor) in (int, float)
+
+def _selectividad_columna(condicion, estadistica):
+    # `columna op constante`: la igualdad con 1 / distintos y los rangos interpolando entre
+    # el mínimo y el máximo; None si la comparación no tiene esa forma
+    op = condicion[0]
+    if op not in OPERADOR_INVERSO and op != 'DISTINTO':
+        return None
+    _, izq, der = condicion
+    if es_constante(der):
+        ref, expr = izq, der
+    elif es_constante(izq):
+        ref, expr = der, izq
+        op = OPERADOR_INVERSO.get(op, op)
+    else:
+        return None
+    datos = estadistica(ref)
+    if datos is None:
+        return None
+    columna, distintos = datos
+    tipo, valor = evaluar_expr_sin_contexto(expr)
+    if tipo == 'nulo':
+        return None
+    minimo, maximo = columna.minimo, columna.maximo
+    if op in ('IGUAL', 'DISTINTO'):
+        # el mínimo y el máximo solo crecen: un valor fuera de ellos no está en la tabla
+        try:
+            fuera = minimo is not None and (valor < minimo or valor > maximo)
+        except TypeError:
+            fuera = False
+        igual = 0.0 if fuera else 1 / distintos
+        return igual if op == 'IGUAL' else 1 - igual
+    if not (_es_numero(valor) and _es_numero(minimo) and _es_numero(maximo)):
+        return None
+    if maximo == minimo:
+        menores = 0.0 if valor < minimo else 1.0
+    else:
+        menores = min(1.0, max(0.0, (valor - minimo) / (maximo - minimo)))
+    return menores if op in ('MENOR', 'MENOR_IGUAL') else 1 - menores
+
+def _filas_vivas(datos):
+    return len(datos['registros']) - datos['borrados'].cantidad
+
+def _a_filas(registros, j, ancho):
+    # registros de una tabla -> filas combinadas con el registro en la posición j
+    if ancho == 1:
+        return ([reg] for reg in registros)
+    return _combinar_en(registros, j, ancho)
+
+def _combinar_en(registros, j, ancho):
+    for reg in registros:
+        fila = [None] * ancho
+        fila[j] = reg
+        yield fila
+
+def _compilar_clave(exprs, enlazar):
+    if len(exprs) == 1:
+        return compilar_valor(exprs[0], enlazar)
+    fns = [compilar_valor(e, enlazar) for e in exprs]
+    return lambda fila: tuple(f(fila) for f in fns)
+
+class Nodo:
+    # nodo del plan lógico: filas() produce filas combinadas (un registro por tabla del
+    # FROM); los nodos de una sola tabla (Scan y Filter con j) también dan registros()
+    hijos = ()
+
+    def filas(self):
+        raise NotImplementedError
+
+    def describir(self):
+        return type(self).__name__
+
+    def filas_estimadas(self):
+        return 0
+
+class Scan(Nodo):
+    # lectura de una tabla; con conjunciones y columna_de_ref se leen solo las posiciones
+    # que devuelve el índice más selectivo
+    def __init__(self, base_datos, tabla, alias, j=0, ancho=1, conjunciones=(), columna_de_ref=None):
+        self.base_datos = base_datos
+        self.tabla = tabla
+        self.alias = alias
+        self.j = j
+        self.ancho = ancho
+        self.conjunciones = conjunciones
+        self.columna_de_ref = columna_de_ref
+
+    def _predicados(self):
+        datos = self.base_datos.tablas.get(self.tabla)
+        if datos is None or not self.conjunciones or self.columna_de_ref is None:
+            return []
+        return predicados_indexables(self.conjunciones, self.columna_de_ref, datos['indices'])
+
+    def fuente(self):
+        # (registros, bitmap de borrados que falta aplicarles o None); los índices ya no
+        # guardan las posiciones borradas
+        datos = self.base_datos.tablas.get(self.tabla)
+        if datos is None:
+            return [], None
+        registros = datos['registros']
+        perfil = perfil_actual()
+        if self.conjunciones and self.columna_de_ref is not None and datos['indices']:
+            posiciones = posiciones_por_indice(self.conjunciones, self.columna_de_ref, datos['indices'])
+            if posiciones is not None:
+                if perfil is not None:
+                    perfil.leer(self.tabla, len(posiciones))
+                return [registros[pos] for pos in posiciones], None
+        if perfil is not None:
+            perfil.leer(self.tabla, _filas_vivas(datos))
+        return registros, datos['borrados']
+
+    def registros(self):
+        registros, borrados = self.fuente()
+        return registros if borrados is None else borrados.vivos(registros)
+
+    def filas(self):
+        return _a_filas(self.registros(), self.j, self.ancho)
+
+    def describir(self):
+        texto = f"Scan {self.tabla}"
+        if self.alias != self.tabla:
+            texto += f" AS {self.alias}"
+        predicados = self._predicados()
+        if predicados:
+            texto += " usando " + ", ".join(f"{indice.nombre} ({expr_a_texto(c)})" for indice, _, _, c in predicados)
+        return texto
+
+    def lectura_por_indice(self):
+        # (filas que devuelve el índice más selectivo, conjunto del WHERE que resuelve)
+        mejor = None
+        for indice, op, expr_valor, c in self._predicados():
+            posiciones = indice.buscar(op, evaluar_expr_sin_contexto(expr_valor)[1])
+            if posiciones is not None and (mejor is None or len(posiciones) < mejor[0]):
+                mejor = (len(posiciones), c)
+        return mejor
+
+    def estadistica(self, nodo):
+        # (estadísticas de la columna, valores distintos) si nodo es una columna de la tabla
+        datos = self.base_datos.tablas.get(self.tabla)
+        col = None if self.columna_de_ref is None else self.columna_de_ref(nodo)
+        if datos is None or col is None:
+            return None
+        distintos = datos['estadisticas'].distintos(col, _filas_vivas(datos))
+        if distintos is None:
+            return None
+        return datos['estadisticas'].columnas[col], distintos
+
+    def filas_estimadas(self):
+        datos = self.base_datos.tablas.get(self.tabla)
+        if datos is None:
+            return 0
+        mejor = self.lectura_por_indice()
+        return _filas_vivas(datos) if mejor is None else mejor[0]
+
+class Filter(Nodo):
+    # con j filtra los registros de una sola tabla antes de los joins (puede ir por el
+    # camino vectorizado); sin j filtra filas ya combinadas
+    def __init__(self, hijo, condicion, enlazar, ancho=1, j=None, alias=None):
+        self.hijos = (hijo,)
+        self.condicion = condicion
+        self.enlazar = enlazar
+        self.ancho = ancho
+        self.j = j
+        self.alias = alias
+
+    def registros(self):
+        hijo = self.hijos[0]
+        if isinstance(hijo, Scan):
+            registros, borrados = hijo.fuente()
+        else:
+            registros, borrados = hijo.registros(), None
+        return filtrar_registros(registros, self.j, self.alias, separar_conjunciones(self.condicion),
+                                 self.enlazar, self.ancho, borrados)
+
+    def filas(self):
+        if self.j is not None:
+            return _a_filas(self.registros(), self.j, self.ancho)
+        filtro = compilar_valor(self.condicion, self.enlazar)
+        return (fila for fila in self.hijos[0].filas() if filtro(fila))
+
+    def describir(self):
+        return f"Filter {expr_a_texto(self.condicion)}"
+
+    def filas_estimadas(self):
+        hijo = self.hijos[0]
+        estimadas = hijo.filas_estimadas()
+        # el conjunto que ya resolvió el índice del Scan no vuelve a reducir la estimación
+        resuelto = hijo.lectura_por_indice() if isinstance(hijo, Scan) else None
+        estadistica = hijo.estadistica if isinstance(hijo, Scan) else None
+        for c in separar_conjunciones(self.condicion):
+            if resuelto is None or c is not resuelto[1]:
+                estimadas *= selectividad(c, estadistica)
+        return estimadas
+
+class Join(Nodo):
+    # izq produce filas combinadas y der es una sola tabla; con claves es un hash join
+    # (se construye sobre la entrada más pequeña), sin claves un producto cartesiano.
+    # selectividad es la fracción estimada de los pares que cumplen las condiciones
+    def __init__(self, izq, der, claves_izq, claves_der, condiciones, enlazar, ancho, selectividad=None):
+        self.hijos = (izq, der)
+        self.claves_izq = claves_izq
+        self.claves_der = claves_der
+        self.condiciones = condiciones
+        self.enlazar = enlazar
+        self.ancho = ancho
+        self.selectividad = selectividad
+
+    def filas(self):
+        izq, der = self.hijos
+        # la tabla de la derecha se recorre varias veces o hace falta su tamaño; la entrada
+        # de la izquierda se consume a medida que se piden filas
+        registros = der.registros()
+        if not isinstance(registros, (list, Tramos)):
+            registros = list(registros)
+        if self.claves_der:
+            filas = hash_join(izq.filas(), der.j, registros, _compilar_clave(self.claves_izq, self.enlazar),
+                              _compilar_clave(self.claves_der, self.enlazar), self.ancho)
+        else:
+            filas = producto_cartesiano(izq.filas(), der.j, registros)
+        perfil = perfil_actual()
+        return filas if perfil is None else contar_filas(filas, perfil)
+
+    def describir(self):
+        if self.claves_der:
+            return "Join hash " + " AND ".join(expr_a_texto(c) for c in self.condiciones)
+        return "Join producto cartesiano"
+
+    def filas_estimadas(self):
+        izq = self.hijos[0].filas_estimadas()
+        der = self.hijos[1].filas_estimadas()
+        if self.selectividad is not None:
+            return izq * der * self.selectividad
+        if self.claves_der:
+            # sin estadísticas se supone una clave foránea: cada fila encuentra a lo sumo una pareja
+            return max(izq, der)
+        return izq * der
+
+class IndexJoin(Join):
+    # join que busca cada fila de izq en el índice de la columna de der (una tabla con
+    # índice, quizás con un Filter encima) en lugar de leer der entera; las demás
+    # igualdades (claves_izq/claves_der) y el filtro de der se evalúan sobre cada pareja
+    def __init__(self, izq, der, indice, clave_izq, claves_izq, claves_der, condiciones, enlazar, ancho, selectividad=None):
+        super().__init__(izq, der, claves_izq, claves_der, condiciones, enlazar, ancho, selectividad)
+        self.indice = indice
+        self.clave_izq = clave_izq
+
+    def filas(self):
+        izq, der = self.hijos
+        scan = der if isinstance(der, Scan) else der.hijos[0]
+        registros = scan.base_datos.tablas[scan.tabla]['registros']
+        filtro = None if der is scan else compilar_valor(der.condicion, self.enlazar)
+        clave = compilar_valor(self.clave_izq, self.enlazar)
+        pares = [(compilar_valor(i, self.enlazar), compilar_valor(d, self.enlazar))
+                 for i, d in zip(self.claves_izq, self.claves_der)]
+        posiciones_de = self.indice.posiciones
+        j = der.j
+        perfil = perfil_actual()
+        for fila in izq.filas():
+            posiciones = posiciones_de(clave(fila)) or ()
+            if perfil is not None:
+                perfil.leer(scan.tabla, len(posiciones))
+                perfil.combinaciones += len(posiciones)
+            for pos in posiciones:
+                nueva = list(fila)
+                nueva[j] = registros[pos]
+                if filtro is not None and not filtro(nueva):
+                    continue
+                if all(f_izq(nueva) == f_der(nueva) for f_izq, f_der in pares):
+                    yield nueva
+
+    def describir(self):
+        return f"Join índice {self.indice.nombre} " + " AND ".join(expr_a_texto(c) for c in self.condiciones)
+
+class Aggregate(Nodo):
+    # GROUP BY / funciones de agregación con una tabla hash de acumuladores; cada fila que
+    # produce es una tupla con los valores de las claves y después los de los agregados
+    def __init__(self, hijo, claves, agregados, enlazar, distintos=None):
+        self.hijos = (hijo,)
+        self.claves = claves
+        self.agregados = agregados
+        self.enlazar = enlazar
+        self.distintos = distintos
+
+    def filas(self):
+        clave = _compilar_clave(self.claves, self.enlazar) if self.claves else None
+        acumuladores = compilar_acumuladores(self.agregados, self.enlazar)
+        return agregar_por_hash(self.hijos[0].filas(), clave, len(self.claves), acumuladores)
+
+    def describir(self):
+        texto = "Aggregate hash"
+        if self.claves:
+            texto += " GROUP BY " + ", ".join(expr_a_texto(c) for c in self.claves)
+        if self.agregados:
+            texto += ": " + ", ".join(expr_a_texto(('AGREGADO', funcion, argumento)) for funcion, argumento in self.agregados)
+        return texto
+
+    def filas_estimadas(self):
+        if not self.claves:
+            return 1
+        entrada = self.hijos[0].filas_estimadas()
+        grupos = 1
+        for clave in self.claves:
+            distintos = None if self.distintos is None else self.distintos(clave)
+            if distintos is None:
+                # sin estadísticas se supone que cada grupo junta diez filas
+                return max(1, entrada * SELECTIVIDAD['IGUAL'])
+            grupos *= distintos
+        return max(1, min(grupos, entrada))
+
+class Sort(Nodo):
+    # ORDER BY; con limite (LIMIT + OFFSET) guarda solo las primeras filas en un montículo
+    def __init__(self, hijo, claves, enlazar, limite=None):
+        self.hijos = (hijo,)
+        self.claves = claves
+        self.enlazar = enlazar
+        self.limite = limite
+
+    def filas(self):
+        return ordenar(self.hijos[0].filas(), self.claves, self.enlazar, self.limite)
+
+    def describir(self):
+        texto = "Sort" if self.limite is None else f"Sort top-{self.limite}"
+        return texto + " BY " + ", ".join(expr_a_texto(expr) + (" DESC" if descendente else "") for expr, descendente in self.claves)
+
+    def filas_estimadas(self):
+        estimadas = self.hijos[0].filas_estimadas()
+        return estimadas if self.limite is None else min(estimadas, self.limite)
+
+class Limit(Nodo):
+    # LIMIT/OFFSET: deja de pedir filas al hijo en cuanto tiene las que necesita, así sin
+    # ORDER BY los scans y joins de abajo no producen el resultado completo
+    def __init__(self, hijo, limite, desplazamiento):
+        self.hijos = (hijo,)
+        self.limite = limite
+        self.desplazamiento = desplazamiento
+
+    def filas(self):
+        fin = None if self.limite is None else self.desplazamiento + self.limite
+        return islice(self.hijos[0].filas(), self.desplazamiento, fin)
+
+    def describir(self):
+        texto = "Limit" if self.limite is None else f"Limit {self.limite}"
+        if self.desplazamiento:
+            texto += f" OFFSET {self.desplazamiento}"
+        return texto
+
+    def filas_estimadas(self):
+        estimadas = max(0, self.hijos[0].filas_estimadas() - self.desplazamiento)
+        return estimadas if self.limite is None else min(estimadas, self.limite)
+
+class Project(Nodo):
+    # cada proyección lee una columna (alias, columna) o calcula una expresión (expr)
+    def __init__(self, hijo, proyecciones, schema, enlazar):
+        self.hijos = (hijo,)
+        self.proyecciones = proyecciones
+        self.schema = schema
+        self.enlazar = enlazar
+
+    def filas(self):
+        lectura = _lectura_por_posicion(self.proyecciones, getattr(self.enlazar, 'ubicar', None))
+        if lectura is not None:
+            yield from map(lectura, self.hijos[0].filas())
+            return
+        cargadores = [compilar_valor(p['expr'], self.enlazar) if 'expr' in p else self.enlazar(p['alias'], p['columna'])
+                      for p in self.proyecciones]
+        for fila in self.hijos[0].filas():
+            yield tuple(cargar(fila) for cargar in cargadores)
+
+    def describir(self):
+        return "Project " + ", ".join(nombre for nombre, _ in self.schema)
+
+    def filas_estimadas(self):
+        return self.hijos[0].filas_estimadas()
+
+def _lectura_por_posicion(proyecciones, ubicar):
+    # si todas las proyecciones son columnas de registros guardados como tuplas (un
+    # SELECT * por ejemplo) la fila de salida se arma con un itemgetter por cada tramo de
+    # columnas seguidas del mismo registro, sin una llamada por columna; None si no
+    if ubicar is None or not proyecciones or any('expr' in p for p in proyecciones):
+        return None
+    tramos = []
+    for p in proyecciones:
+        ubicacion = ubicar(p['alias'], p['columna'])
+        if ubicacion is None:
+            return None
+        i, k = ubicacion
+        if tramos and tramos[-1][0] == i:
+            tramos[-1][1].append(k)
+        else:
+            tramos.append((i, [k]))
+    tramos = [(i, itemgetter(*ks) if len(ks) > 1 else (lambda registro, k=ks[0]: (registro[k],))) for i, ks in tramos]
+    if len(tramos) == 1:
+        i, leer = tramos[0]
+        return lambda fila: leer(fila[i])
+    def lectura(fila):
+        salida = ()
+        for i, leer in tramos:
+            salida += leer(fila[i])
+        return salida
+    return lectura
+
+def _acceso_local(base_datos, tabla, condicion):
+    # camino de acceso de UPDATE/DELETE, para EXPLAIN; la escritura la hace el Ejecutor
+    scan = Scan(base_datos, tabla, tabla, conjunciones=separar_conjunciones(condicion), columna_de_ref=columna_sin_alias)
+    if condicion is None:
+        return scan
+    return Filter(scan, condicion, enlazar_registro)
+
+class Insert(Nodo):
+    def __init__(self, tabla, columnas, valores, constantes, linea):
+        self.tabla = tabla
+        self.columnas = columnas
+        self.valores = valores
+        self.constantes = constantes
+        self.linea = linea
+
+    def describir(self):
+        return f"Insert {self.tabla} ({', '.join(self.columnas)})"
+
+    def filas_estimadas(self):
+        return len(self.valores)
+
+class Update(Nodo):
+    def __init__(self, base_datos, tabla, asignaciones, condicion, linea):
+        self.hijos = (_acceso_local(base_datos, tabla, condicion),)
+        self.tabla = tabla
+        self.asignaciones = asignaciones
+        self.condicion = condicion
+        self.linea = linea
+
+    def describir(self):
+        return f"Update {self.tabla} SET " + ", ".join(f"{col} = {expr_a_texto(expr)}" for col, expr in self.asignaciones.items())
+
+    def filas_estimadas(self):
+        return self.hijos[0].filas_estimadas()
+
+class Delete(Nodo):
+    def __init__(self, base_datos, tabla, condicion, linea):
+        self.hijos = (_acceso_local(base_datos, tabla, condicion),)
+        self.tabla = tabla
+        self.condicion = condicion
+        self.linea = linea
+
+    def describir(self):
+        return f"Delete {self.tabla}"
+
+    def filas_estimadas(self):
+        return self.hijos[0].filas_estimadas()
+
+def explicar(nodo, nivel=0):
+    lineas = [f"{'  ' * nivel}{nodo.describir()}  (filas estimadas: {round(nodo.filas_estimadas())})"]
+    for hijo in nodo.hijos:
+        lineas.extend(explicar(hijo, nivel + 1))
+    return lineas
+
+def _columna_de_tabla(alias, columnas_disponibles):
+    # columna_de_ref para los índices de una tabla del FROM
+    def columna_de_ref(nodo):
+        if not (isinstance(nodo, tuple) and nodo[0] == 'REF'):
+            return None
+        if nodo[1] is None:
+            entradas = columnas_disponibles.get(nodo[2], [])
+            if len(entradas) == 1 and entradas[0]['alias'] == alias:
+                return nodo[2]
+            return None
+        return nodo[2] if nodo[1] == alias else None
+    return columna_de_ref
+
+def _estimador_distintos(base_datos, lista_tablas, columnas_disponibles):
+    # valores distintos estimados de una referencia a una columna del FROM; None si la
+    # expresión no es una columna o la tabla no tiene estadísticas
+    tablas = {alias: nombre_tabla for nombre_tabla, alias in lista_tablas}
+    def distintos(nodo):
+        if not (isinstance(nodo, tuple) and nodo[0] == 'REF'):
+            return None
+        alias, col = nodo[1], nodo[2]
+        if alias is None:
+            entradas = columnas_disponibles.get(col, [])
+            if len(entradas) != 1:
+                return None
+            alias = entradas[0]['alias']
+        datos = base_datos.tablas.get(tablas.get(alias))
+        if datos is None:
+            return None
+        return datos['estadisticas'].distintos(col, _filas_vivas(datos))
+    return distintos
+
+def _scan_de(base):
+    return base if isinstance(base, Scan) else base.hijos[0]
+
+def _indice_de_union(base, clave):
+    # (índice, filas por valor) si clave es una columna indexada de la tabla de base
+    scan = _scan_de(base)
+    col = None if scan.columna_de_ref is None else scan.columna_de_ref(clave)
+    datos = scan.base_datos.tablas.get(scan.tabla)
+    if col is None or datos is None or col not in datos['indices']:
+        return None
+    vivas = _filas_vivas(datos)
+    distintos = datos['estadisticas'].distintos(col, vivas)
+    return datos['indices'][col], vivas / (distintos or 1)
+
+def _uniones(base, unidos, equijoins):
+    # igualdades que unen base con las tablas de unidos: (igualdad, clave de unidos, clave de base)
+    uniones = []
+    for c, izq, der, _ in equijoins:
+        if izq == {base.alias} and der <= unidos:
+            uniones.append((c, c[2], c[1]))
+        elif der == {base.alias} and izq <= unidos:
+            uniones.append((c, c[1], c[2]))
+    return uniones
+
+def _orden_de_joins(bases, equijoins):
+    # orden de menor costo estimado para el árbol de joins a la izquierda. El costo de un
+    # orden suma las filas que produce cada join y las que lee cada tabla (o las búsquedas
+    # en su índice); se prueban todos los órdenes con programación dinámica sobre los
+    # subconjuntos de tablas y, en empates, gana el orden del FROM. Devuelve
+    # [(posición en bases, igualdad que se resuelve con un índice o None)]
+    n = len(bases)
+    estimadas = [base.filas_estimadas() for base in bases]
+    lecturas = [_scan_de(base).filas_estimadas() for base in bases]
+    bits = {base.alias: 1 << i for i, base in enumerate(bases)}
+    uniones = [(sum(bits[a] for a in izq | der), s) for _, izq, der, s in equijoins]
+    filas_de = {}
+    def filas(S):
+        if S not in filas_de:
+            total = 1
+            for i in range(n):
+                if S >> i & 1:
+                    total *= estimadas[i]
+            for m, s in uniones:
+                if m & S == m:
+                    total *= s
+            filas_de[S] = total
+        return filas_de[S]
+    def paso(S, t):
+        unidos = {base.alias for i, base in enumerate(bases) if S >> i & 1}
+        costo, acceso = filas(S) + lecturas[t], None
+        for c, _, clave in _uniones(bases[t], unidos, equijoins):
+            indice = _indice_de_union(bases[t], clave)
+            if indice is not None and filas(S) * (1 + indice[1]) < costo:
+                costo, acceso = filas(S) * (1 + indice[1]), c
+        return costo, acceso
+    def extender(S, t, previo):
+        costo_paso, acceso = paso(S, t)
+        T = S | 1 << t
+        return T, (previo[0] + costo_paso + filas(T), previo[1] + (t,), previo[2] + (acceso,))
+    if n <= MAX_TABLAS_DP:
+        mejor = {1 << i: (lecturas[i], (i,), (None,)) for i in range(n)}
+        for S in range(1, 1 << n):
+            if S not in mejor:
+                continue
+            for t in range(n):
+                if not S >> t & 1:
+                    T, candidato = extender(S, t, mejor[S])
+                    if T not in mejor or candidato[:2] < mejor[T][:2]:
+                        mejor[T] = candidato
+        elegido = mejor[(1 << n) - 1]
+    else:
+        # demasiadas tablas: se arranca por la más chica y se agrega la de menor costo
+        primera = min(range(n), key=lambda i: (estimadas[i], i))
+        S, elegido = 1 << primera, (lecturas[primera], (primera,), (None,))
+        while len(elegido[1]) < n:
+            S, elegido = min((extender(S, t, elegido) for t in range(n) if not S >> t & 1),
+                             key=lambda par: par[1][:2])
+    return list(zip(elegido[1], elegido[2]))
+
+def planear_combinacion(base_datos, lista_tablas, condicion, columnas_disponibles, enlazar):
+    # árbol de joins a la izquierda: cada tabla con sus predicados propios ya aplicados, las
+    # igualdades entre tablas como hash joins (o búsquedas en un índice) en el orden de menor
+    # costo estimado y lo que falta del WHERE en un Filter final
+    aliases = [alias for _, alias in lista_tablas]
+    conjunciones = separar_conjunciones(condicion)
+    ancho = len(lista_tablas)
+    if len(set(aliases)) != len(aliases):
+        bases = [Scan(base_datos, nombre_tabla, alias, j, ancho) for j, (nombre_tabla, alias) in enumerate(lista_tablas)]
+        equijoins, resto = [], conjunciones
+    else:
+        # predicados de una sola tabla: se filtra cada tabla antes de combinarla
+        por_alias = {alias: [] for alias in aliases}
+        multitabla = []
+        for c in conjunciones:
+            usados = alias_de_expr(c, columnas_disponibles)
+            if usados is not None and len(usados) == 1 and usados <= por_alias.keys():
+                por_alias[usados.pop()].append(c)
+            else:
+                multitabla.append(c)
+        bases = []
+        for j, (nombre_tabla, alias) in enumerate(lista_tablas):
+            base = Scan(base_datos, nombre_tabla, alias, j, ancho, conjunciones, _columna_de_tabla(alias, columnas_disponibles))
+            if por_alias[alias]:
+                base = Filter(base, unir_conjunciones(por_alias[alias]), enlazar, ancho, j, alias)
+            bases.append(base)
+        equijoins, resto = buscar_equijoins(multitabla, columnas_disponibles, set(aliases))
+    # cada igualdad con su selectividad: 1 / los valores distintos del lado que tiene más, sin
+    # pasar de las filas estimadas de su tabla; una expresión sin estadísticas se toma como
+    # clave única (una pareja por fila, como una clave foránea)
+    distintos = _estimador_distintos(base_datos, lista_tablas, columnas_disponibles)
+    base_de = {base.alias: base for base in bases}
+    def distintos_lado(expr, usados):
+        filas = min(base_de[alias].filas_estimadas() for alias in usados)
+        d = distintos(expr)
+        return max(1, filas if d is None else min(d, filas))
+    equijoins = [(c, izq, der, 1 / max(distintos_lado(c[1], izq), distintos_lado(c[2], der)))
+                 for c, izq, der in equijoins]
+    orden = [(bases[i], acceso) for i, acceso in _orden_de_joins(bases, equijoins)] if equijoins else [(base, None) for base in bases]
+    nodo = orden[0][0]
+    unidos = {nodo.alias}
+    for base, acceso in orden[1:]:
+        uniones = _uniones(base, unidos, equijoins)
+        usadas = [c for c, _, _ in uniones]
+        fraccion = None
+        for c, _, _, s in equijoins:
+            if c in usadas:
+                fraccion = s if fraccion is None else fraccion * s
+        equijoins = [e for e in equijoins if e[0] not in usadas]
+        if acceso is not None:
+            _, clave_izq, clave_der = next(u for u in uniones if u[0] is acceso)
+            resto_uniones = [u for u in uniones if u[0] is not acceso]
+            nodo = IndexJoin(nodo, base, _indice_de_union(base, clave_der)[0], clave_izq,
+                             [clave for _, clave, _ in resto_uniones], [clave for _, _, clave in resto_uniones],
+                             usadas, enlazar, ancho, fraccion)
+        else:
+            nodo = Join(nodo, base, [clave for _, clave, _ in uniones], [clave for _, _, clave in uniones],
+                        usadas, enlazar, ancho, fraccion)
+        unidos.add(base.alias)
+    # igualdades que no sirvieron para ningún join (p.ej. entre tres tablas) se evalúan al final
+    restante = unir_conjunciones([c for c, _, _, _ in equijoins] + resto)
+    if restante is not None:
+        nodo = Filter(nodo, restante, enlazar, ancho)
+    return nodo
+
+def planear_select(sentencia, base_datos, errores):
+    lista_campos = sentencia['campos']
+    lista_tablas = sentencia['tablas']
+    columnas_disponibles = {}
+    for nombre_tabla, alias in lista_tablas:
+        if nombre_tabla not in base_datos.tablas:
+            errores.append({'mensaje': f"SELECT: tabla {nombre_tabla} no existe", 'linea': sentencia['linea']})
+            continue
+        esquema = base_datos.tablas[nombre_tabla]['columnas']
+        for col, tipo in esquema.items():
+            if col not in columnas_disponibles:
+                columnas_disponibles[col] = []
+            columnas_disponibles[col].append({'alias': alias, 'tabla': nombre_tabla, 'tipo': tipo})
+    resultado_schema = []
+    def resolver_campo(campo):
+        if campo['tipo'] == 'STAR':
+            expansiones = []
+            for nombre_tabla, alias in lista_tablas:
+                esquema = base_datos.tablas.get(nombre_tabla, {}).get('columnas', {})
+                for col, tipo in esquema.items():
+                    nombre_salida = f"{alias}.{col}"
+                    expansiones.append({'alias': alias, 'tabla': nombre_tabla, 'columna': col, 'tipo': tipo, 'nombre_salida': nombre_salida})
+            return expansiones
+        col = campo['columna']
+        if campo['tabla_o_alias'] is not None:
+            alias = campo['tabla_o_alias']
+            for nombre_tabla, al in lista_tablas:
+                if al == alias:
+                    esquema = base_datos.tablas.get(nombre_tabla, {}).get('columnas', {})
+                    if col not in esquema:
+                        errores.append({'mensaje': f"Columna {col} no existe en tabla {nombre_tabla} (alias {alias})", 'linea': campo.get('linea')})
+                        return []
+                    nombre_salida = campo.get('alias', col)
+                    return [{'alias': alias, 'tabla': nombre_tabla, 'columna': col, 'tipo': esquema[col], 'nombre_salida': nombre_salida}]
+            errores.append({'mensaje': f"Alias o tabla {alias} no encontrada en FROM", 'linea': campo.get('linea')})
+            return []
+        else:
+            entradas = columnas_disponibles.get(col, [])
+            if len(entradas) == 0:
+                errores.append({'mensaje': f"Columna {col} no encontrada en FROM", 'linea': campo.get('linea')})
+                return []
+            if len(entradas) > 1:
+                errores.append({'mensaje': f"Columna {col} es ambigua en FROM; use alias", 'linea': campo.get('linea')})
+                return []
+            entrada = entradas[0]
+            nombre_salida = campo.get('alias', col)
+            return [{'alias': entrada['alias'], 'tabla': entrada['tabla'], 'columna': col, 'tipo': entrada['tipo'], 'nombre_salida': nombre_salida}]
+    def tipo_expr(nodo):
+        # tipo de una expresión del SELECT; de paso informa las columnas que no existen
+        if not isinstance(nodo, tuple) or nodo[0] == 'PARAM':
+            return 'nulo'
+        op = nodo[0]
+        if op in ('LIT', 'VAL'):
+            return evaluar_expr_sin_contexto(nodo)[0]
+        if op == 'REF':
+            entradas = resolver_campo({'tipo': 'CAMPO', 'tabla_o_alias': nodo[1], 'columna': nodo[2], 'linea': sentencia['linea']})
+            return entradas[0]['tipo'] if entradas else 'nulo'
+        if op == 'AGREGADO':
+            tipo = 'nulo' if nodo[2] is None else tipo_expr(nodo[2])
+            if nodo[1] == 'COUNT':
+                return 'entero'
+            if nodo[1] == 'AVG':
+                return 'flotante'
+            if nodo[1] == 'SUM':
+                return 'entero' if tipo == 'entero' else 'flotante'
+            return tipo
+        tipos = [tipo_expr(hijo) for hijo in nodo[1:]]
+        if op == 'NEG':
+            return tipos[0]
+        if op in ('MAS', 'MENOS', 'POR'):
+            return promover_tipos(*tipos) or 'nulo'
+        if op == 'DIV':
+            return 'flotante'
+        return 'booleano'
+    condicion = sentencia['where']
+    if contiene_agregado(condicion):
+        errores.append({'mensaje': "WHERE: las funciones de agregación solo pueden ir en el SELECT o en HAVING", 'linea': sentencia['linea']})
+        condicion = ('VAL', 'booleano', False)
+    proyecciones = []
+    for campo in lista_campos:
+        if campo['tipo'] == 'EXPR':
+            expr = campo['expr']
+            expans = [{'expr': expr, 'tipo': tipo_expr(expr), 'nombre_salida': campo.get('alias', expr_a_texto(expr))}]
+        else:
+            expans = resolver_campo(campo)
+        for e in expans:
+            resultado_schema.append((e['nombre_salida'], e['tipo']))
+            proyecciones.append(e)
+    if sentencia.get('having') is not None:
+        tipo_expr(sentencia['having'])
+    def expr_de(p):
+        return p['expr'] if 'expr' in p else ('REF', p['alias'], p['columna'])
+    salidas = {}
+    for p in proyecciones:
+        salidas.setdefault(p['nombre_salida'], p)
+    def resolver_orden(expr):
+        # ORDER BY puede nombrar una columna de la salida (p.ej. un alias) o su posición
+        if expr[0] == 'REF' and expr[1] is None and expr[2] in salidas:
+            return expr_de(salidas[expr[2]])
+        if expr[0] == 'LIT':
+            tipo, valor = evaluar_expr_sin_contexto(expr)
+            if tipo == 'entero':
+                if 1 <= valor <= len(proyecciones):
+                    return expr_de(proyecciones[valor - 1])
+                errores.append({'mensaje': f"ORDER BY: la posición {valor} no está en la lista del SELECT", 'linea': sentencia['linea']})
+                return expr
+        tipo_expr(expr)
+        return expr
+    orden = [(resolver_orden(expr), descendente) for expr, descendente in sentencia.get('orden', [])]
+    agregacion = bool(sentencia.get('grupo')) or sentencia.get('having') is not None or any(
+        contiene_agregado(expr_de(p)) for p in proyecciones) or any(contiene_agregado(expr) for expr, _ in orden)
+    enlazar = crear_enlazador([alias for _, alias in lista_tablas], columnas_disponibles,
+                              slots_de_tablas(base_datos, lista_tablas))
+    nodo = planear_combinacion(base_datos, lista_tablas, condicion, columnas_disponibles, enlazar)
+    if agregacion:
+        distintos = _estimador_distintos(base_datos, lista_tablas, columnas_disponibles)
+        nodo, proyecciones, orden, enlazar = planear_agregacion(sentencia, nodo, proyecciones, orden, enlazar,
+                                                                columnas_disponibles, tipo_expr, errores, distintos)
+    limite = _entero_no_negativo(sentencia.get('limite'), 'LIMIT', sentencia['linea'], errores)
+    desplazamiento = _entero_no_negativo(sentencia.get('desplazamiento'), 'OFFSET', sentencia['linea'], errores) or 0
+    if orden:
+        nodo = Sort(nodo, orden, enlazar, None if limite is None else limite + desplazamiento)
+    if limite is not None or desplazamiento:
+        nodo = Limit(nodo, limite, desplazamiento)
+    return Project(nodo, proyecciones, resultado_schema, enlazar)
+
+def _entero_no_negativo(expr, clausula, linea, errores):
+    # valor de LIMIT/OFFSET; None si no hay (o es un parámetro sin ligar en un EXPLAIN)
+    if expr is None:
+        return None
+    tipo, valor = evaluar_expr_sin_contexto(expr)
+    if tipo == 'nulo':
+        return None
+    if tipo != 'entero' or valor < 0:
+        errores.append({'mensaje': f"{clausula}: se esperaba un entero no negativo, se obtuvo {expr_a_texto(expr)}", 'linea': linea})
+        return None
+    return valor
+
+def planear_agregacion(sentencia, combinacion, proyecciones, orden, enlazar, columnas_disponibles, tipo_expr, errores,
+                       distintos=None):
+    # Aggregate sobre la combinación y HAVING como Filter de sus filas; devuelve además el
+    # SELECT y el ORDER BY reescritos: cada clave del GROUP BY y cada agregado pasa a ser una
+    # referencia ('REF', None, expresión) que se enlaza por la expresión, no por su texto,
+    # con su posición en las filas del Aggregate
+    linea = sentencia['linea']
+    def normalizar(nodo):
+        # misma expresión con las referencias sin alias escritas con el alias al que resuelven
+        if not isinstance(nodo, tuple) or nodo[0] in ('LIT', 'VAL', 'PARAM'):
+            return nodo
+        if nodo[0] == 'REF':
+            entradas = columnas_disponibles.get(nodo[2], [])
+            if nodo[1] is None and len(entradas) == 1:
+                return ('REF', entradas[0]['alias'], nodo[2])
+            return nodo
+        return (nodo[0],) + tuple(normalizar(hijo) for hijo in nodo[1:])
+    posiciones = {}
+    # expresión tal como se escribió -> posición en las filas del Aggregate
+    por_expr = {}
+    claves = []
+    agregados = []
+    for expr in sentencia.get('grupo', []):
+        if contiene_agregado(expr):
+            errores.append({'mensaje': "GROUP BY: no puede contener funciones de agregación", 'linea': linea})
+            continue
+        tipo_expr(expr)
+        normalizada = normalizar(expr)
+        if normalizada not in posiciones:
+            posiciones[normalizada] = len(posiciones)
+            claves.append(expr)
+    def reescribir(nodo):
+        if not isinstance(nodo, tuple) or nodo[0] in ('LIT', 'VAL', 'PARAM'):
+            return nodo
+        normalizada = normalizar(nodo)
+        if normalizada in posiciones:
+            por_expr[nodo] = posiciones[normalizada]
+            return ('REF', None, nodo)
+        if nodo[0] == 'AGREGADO':
+            if contiene_agregado(nodo[2]):
+                errores.append({'mensaje': f"{expr_a_texto(nodo)}: no se pueden anidar funciones de agregación", 'linea': linea})
+            por_expr[nodo] = posiciones[normalizada] = len(posiciones)
+            agregados.append((nodo[1], nodo[2]))
+            return ('REF', None, nodo)
+        if nodo[0] == 'REF':
+            errores.append({'mensaje': f"Columna {expr_a_texto(nodo)} debe estar en GROUP BY o dentro de una función de agregación", 'linea': linea})
+            return nodo
+        return (nodo[0],) + tuple(reescribir(hijo) for hijo in nodo[1:])
+    proyectadas = [{'expr': reescribir(p['expr'] if 'expr' in p else ('REF', p['alias'], p['columna']))} for p in proyecciones]
+    orden = [(reescribir(expr), descendente) for expr, descendente in orden]
+    having = None if sentencia.get('having') is None else reescribir(sentencia['having'])
+    def enlazar_grupo(alias, col):
+        i = por_expr.get(col) if alias is None and isinstance(col, tuple) else None
+        if i is None:
+            return lambda fila: None
+        return lambda fila: fila[i]
+    nodo = Aggregate(combinacion, claves, agregados, enlazar, distintos)
+    if having is not None:
+        nodo = Filter(nodo, having, enlazar_grupo)
+    return nodo, proyectadas, orden, enlazar_grupo
+
+def planear(sentencia, base_datos, errores):
+    # plan lógico de la sentencia; None para las que no leen ni escriben filas (CREATE)
+    tipo = sentencia['tipo_sentencia']
+    if tipo == 'SELECT':
+        return planear_select(sentencia, base_datos, errores)
+    if tipo == 'INSERT':
+        return Insert(sentencia['tabla'], sentencia['columnas'], sentencia['valores'], sentencia['constantes'], sentencia['linea'])
+    if tipo == 'UPDATE':
+        return Update(base_datos, sentencia['tabla'], sentencia['asignaciones'], sentencia['where'], sentencia['linea'])
+    if tipo == 'DELETE':
+        return Delete(base_datos, sentencia['tabla'], sentencia['where'], sentencia['linea'])
+    return None
\ No newline at end of file
@@ -0,0 +1,349 @@
+import heapq
+from itertools import chain, islice
+
+from expresiones import evaluar_expr_sin_contexto, compilar_valor
+from columnar import RegistrosColumnares
+from tuplas import RegistrosTuplas
+import vectorizado
+
+OPERADOR_INVERSO = {
+    'IGUAL': 'IGUAL', 'MENOR': 'MAYOR', 'MAYOR': 'MENOR',
+    'MENOR_IGUAL': 'MAYOR_IGUAL', 'MAYOR_IGUAL': 'MENOR_IGUAL',
+}
+
+def columna_sin_alias(nodo):
+    # en UPDATE/DELETE solo las referencias sin alias leen del registro
+    if isinstance(nodo, tuple) and nodo[0] == 'REF' and nodo[1] is None:
+        return nodo[2]
+    return None
+
+def separar_conjunciones(nodo_expr):
+    if nodo_expr is None:
+        return []
+    if isinstance(nodo_expr, tuple) and nodo_expr[0] == 'AND':
+        return separar_conjunciones(nodo_expr[1]) + separar_conjunciones(nodo_expr[2])
+    return [nodo_expr]
+
+def unir_conjunciones(conjunciones):
+    nodo = None
+    for c in conjunciones:
+        nodo = c if nodo is None else ('AND', nodo, c)
+    return nodo
+
+def alias_de_expr(nodo_expr, columnas_disponibles):
+    # conjunto de alias que usa la expresión; None si alguna referencia es ambigua o no existe
+    if not isinstance(nodo_expr, tuple):
+        return set()
+    op = nodo_expr[0]
+    if op in ('LIT', 'VAL'):
+        return set()
+    if op == 'REF':
+        alias, col = nodo_expr[1], nodo_expr[2]
+        if alias is not None:
+            return {alias}
+        entradas = columnas_disponibles.get(col, [])
+        if len(entradas) != 1:
+            return None
+        return {entradas[0]['alias']}
+    resultado = set()
+    for hijo in nodo_expr[1:]:
+        aliases = alias_de_expr(hijo, columnas_disponibles)
+        if aliases is None:
+            return None
+        resultado |= aliases
+    return resultado
+
+def buscar_equijoins(conjunciones, columnas_disponibles, aliases):
+    # separa las igualdades entre dos grupos de alias distintos del resto del WHERE
+    equijoins = []
+    resto = []
+    for c in conjunciones:
+        if isinstance(c, tuple) and c[0] == 'IGUAL':
+            izq = alias_de_expr(c[1], columnas_disponibles)
+            der = alias_de_expr(c[2], columnas_disponibles)
+            if izq and der and izq.isdisjoint(der) and (izq | der) <= aliases:
+                equijoins.append((c, izq, der))
+                continue
+        resto.append(c)
+    return equijoins, resto
+
+def es_constante(nodo_expr):
+    if not isinstance(nodo_expr, tuple):
+        return False
+    if nodo_expr[0] == 'REF':
+        return False
+    if nodo_expr[0] in ('LIT', 'VAL'):
+        return True
+    return all(es_constante(hijo) for hijo in nodo_expr[1:])
+
+def predicados_indexables(conjunciones, columna_de_ref, indices):
+    # (índice, op, expresión constante, conjunto) de cada `columna op constante` del WHERE
+    # que tiene un índice sobre la columna; op queda escrito con la columna a la izquierda
+    predicados = []
+    for c in conjunciones:
+        if not (isinstance(c, tuple) and c[0] in OPERADOR_INVERSO):
+            continue
+        op, izq, der = c
+        col = columna_de_ref(izq)
+        if col is not None and es_constante(der):
+            expr_valor = der
+        else:
+            col = columna_de_ref(der)
+            if col is None or not es_constante(izq):
+                continue
+            op = OPERADOR_INVERSO[op]
+            expr_valor = izq
+        indice = indices.get(col)
+        if indice is not None:
+            predicados.append((indice, op, expr_valor, c))
+    return predicados
+
+def posiciones_por_indice(conjunciones, columna_de_ref, indices):
+    # posiciones candidatas (ordenadas) según el predicado indexado más selectivo;
+    # None si ningún conjunto del WHERE se puede resolver con un índice
+    mejor = None
+    for indice, op, expr_valor, _ in predicados_indexables(conjunciones, columna_de_ref, indices):
+        posiciones = indice.buscar(op, evaluar_expr_sin_contexto(expr_valor)[1])
+        if posiciones is not None and (mejor is None or len(posiciones) < len(mejor)):
+            mejor = posiciones
+    if mejor is None:
+        return None
+    mejor.sort()
+    return mejor
+
+def slots_de_tablas(base_datos, lista_tablas):
+    # alias -> (columna -> posición) de las tablas del FROM guardadas como tuplas
+    slots = {}
+    for nombre_tabla, alias in lista_tablas:
+        datos = base_datos.tablas.get(nombre_tabla)
+        if datos is not None and isinstance(datos['registros'], RegistrosTuplas):
+            slots[alias] = datos['registros'].slots
+    return slots
+
+def crear_enlazador(aliases, columnas_disponibles, slots=None):
+    # resuelve cada referencia a (posición del alias en FROM, columna) una sola vez;
+    # las filas combinadas son listas con un registro por tabla del FROM. Con slots
+    # (alias -> columna -> posición) los registros de esos alias son tuplas y la columna
+    # se lee por posición; ubicar(alias, col) da esa (i, posición), o None
+    posicion = {}
+    for i, alias in enumerate(aliases):
+        posicion[alias] = i
+    slots = slots or {}
+    def resolver(alias, col):
+        if alias is None:
+            if len(posicion) == 1:
+                return aliases[0]
+            candidatos = {e['alias'] for e in columnas_disponibles.get(col, [])}
+            if len(candidatos) != 1:
+                return None
+            alias = candidatos.pop()
+        return alias if alias in posicion else None
+    def ubicar(alias, col):
+        alias = resolver(alias, col)
+        if alias not in slots or col not in slots[alias]:
+            return None
+        return posicion[alias], slots[alias][col]
+    def enlazar(alias, col):
+        alias = resolver(alias, col)
+        if alias is None:
+            return lambda fila: None
+        i = posicion[alias]
+        if alias in slots:
+            k = slots[alias].get(col)
+            if k is None:
+                return lambda fila: None
+            return lambda fila: fila[i][k]
+        return lambda fila: fila[i].get(col)
+    enlazar.ubicar = ubicar
+    return enlazar
+
+def hash_join(parciales, j, registros, clave_parcial, clave_nueva, ancho):
+    # construye la tabla hash sobre la entrada más pequeña y sondea con la otra. registros
+    # ya está en memoria; de parciales (un iterador) se leen a lo sumo len(registros) filas
+    # para saber cuál es menor, y si es la mayor el resto se sondea a medida que llega, así
+    # un LIMIT deja de pedir filas sin que se lea entera
+    if not registros:
+        return
+    parciales = iter(parciales)
+    primeras = list(islice(parciales, len(registros)))
+    fila_nueva = [None] * ancho
+    if len(primeras) == len(registros):
+        tabla = {}
+        for reg in registros:
+            fila_nueva[j] = reg
+            tabla.setdefault(clave_nueva(fila_nueva), []).append(reg)
+        for fila in chain(primeras, parciales):
+            for reg in tabla.get(clave_parcial(fila), ()):
+                nueva = list(fila)
+                nueva[j] = reg
+                yield nueva
+    else:
+        tabla = {}
+        for fila in primeras:
+            tabla.setdefault(clave_parcial(fila), []).append(fila)
+        for reg in registros:
+            fila_nueva[j] = reg
+            for fila in tabla.get(clave_nueva(fila_nueva), ()):
+                nueva = list(fila)
+                nueva[j] = reg
+                yield nueva
+
+def producto_cartesiano(parciales, j, registros):
+    for fila in parciales:
+        for reg in registros:
+            nueva = list(fila)
+            nueva[j] = reg
+            yield nueva
+
+def filtrar_registros(registros, j, alias, conjunciones, enlazar, ancho, borrados=None):
+    # aplica a una tabla los conjuntos del WHERE que solo la usan a ella; borrados es el
+    # bitmap de filas borradas de registros (None si ya vienen solo las vivas)
+    condicion = unir_conjunciones(conjunciones)
+    if isinstance(registros, RegistrosColumnares):
+        posiciones = vectorizado.posiciones_que_cumplen(registros, condicion, (None, alias), borrados)
+        if posiciones is not None:
+            return (registros[pos] for pos in posiciones)
+    if borrados is not None:
+        registros = borrados.vivos(registros)
+    return _filtrar(registros, j, compilar_valor(condicion, enlazar), ancho)
+
+def _filtrar(registros, j, filtro, ancho):
+    fila = [None] * ancho
+    for reg in registros:
+        fila[j] = reg
+        if filtro(fila):
+            yield reg
+
+# acumuladores de las funciones de agregación: cada grupo guarda una lista de estados y
+# cada función usa uno (AVG dos: suma y cuenta); los NULL no cuentan, salvo en COUNT(*)
+def _paso_count_todo(k):
+    def paso(estado, fila):
+        estado[k] += 1
+    return paso
+
+def _paso_count(k, f):
+    def paso(estado, fila):
+        if f(fila) is not None:
+            estado[k] += 1
+    return paso
+
+def _paso_sum(k, f):
+    def paso(estado, fila):
+        v = f(fila)
+        if type(v) in (int, float):
+            estado[k] = v if estado[k] is None else estado[k] + v
+    return paso
+
+def _paso_avg(k, f):
+    def paso(estado, fila):
+        v = f(fila)
+        if type(v) in (int, float):
+            estado[k] += v
+            estado[k + 1] += 1
+    return paso
+
+def _paso_min(k, f):
+    def paso(estado, fila):
+        v = f(fila)
+        if v is not None and (estado[k] is None or v < estado[k]):
+            estado[k] = v
+    return paso
+
+def _paso_max(k, f):
+    def paso(estado, fila):
+        v = f(fila)
+        if v is not None and (estado[k] is None or v > estado[k]):
+            estado[k] = v
+    return paso
+
+_PASOS = {'COUNT': _paso_count, 'SUM': _paso_sum, 'AVG': _paso_avg, 'MIN': _paso_min, 'MAX': _paso_max}
+
+def compilar_acumuladores(agregados, enlazar):
+    # (estado inicial, pasos, finales) para una lista de (función, argumento)
+    inicial = []
+    pasos = []
+    finales = []
+    for funcion, argumento in agregados:
+        k = len(inicial)
+        if funcion == 'AVG':
+            inicial.extend((0, 0))
+            finales.append(lambda estado, k=k: estado[k] / estado[k + 1] if estado[k + 1] else None)
+        else:
+            inicial.append(0 if funcion == 'COUNT' else None)
+            finales.append(lambda estado, k=k: estado[k])
+        if argumento is None:
+            pasos.append(_paso_count_todo(k))
+        else:
+            pasos.append(_PASOS[funcion](k, compilar_valor(argumento, enlazar)))
+    return tuple(inicial), pasos, finales
+
+def agregar_por_hash(filas, clave, ancho_clave, acumuladores):
+    # GROUP BY en una sola pasada: la tabla hash guarda por grupo solo el estado de los
+    # acumuladores, no sus filas, y no se ordena nada. Devuelve tuplas (claves..., agregados...).
+    # Sin clave (solo agregados) siempre hay un único grupo, aunque no entre ninguna fila
+    inicial, pasos, finales = acumuladores
+    grupos = {}
+    if clave is None:
+        grupos[()] = list(inicial)
+    for fila in filas:
+        k = () if clave is None else clave(fila)
+        estado = grupos.get(k)
+        if estado is None:
+            estado = grupos[k] = list(inicial)
+        for paso in pasos:
+            paso(estado, fila)
+    for k, estado in grupos.items():
+        if ancho_clave == 1:
+            k = (k,)
+        yield k + tuple(final(estado) for final in finales)
+
+class _Descendente:
+    # envuelve un valor de ORDER BY ... DESC invirtiendo la comparación
+    __slots__ = ('valor',)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+    def __lt__(self, otro):
+        return otro.valor < self.valor
+
+    def __eq__(self, otro):
+        return self.valor == otro.valor
+
+def compilar_orden(claves, enlazar, invertir):
+    # clave de ordenamiento para una lista de (expr, descendente): los NULL van primero en
+    # ASC y al final en DESC sin comparar None con los demás valores. Con invertir (todas
+    # en DESC) se ordena al revés en lugar de envolver cada valor
+    partes = []
+    for expr, descendente in claves:
+        f = compilar_valor(expr, enlazar)
+        f = lambda fila, f=f: _con_nulos(f(fila))
+        if descendente and not invertir:
+            f = lambda fila, f=f: _Descendente(f(fila))
+        partes.append(f)
+    if len(partes) == 1:
+        return partes[0]
+    return lambda fila: tuple(parte(fila) for parte in partes)
+
+def _con_nulos(valor):
+    return (valor is not None, valor)
+
+def ordenar(filas, claves, enlazar, limite=None):
+    # ORDER BY; con limite es un top-k: heapq.nsmallest (o nlargest) mantiene un montículo
+    # de k filas, O(n log k) y memoria acotada, y deja los empates en el orden de llegada
+    # igual que sorted
+    invertir = all(descendente for _, descendente in claves)
+    if limite is not None:
+        seleccionar = heapq.nlargest if invertir else heapq.nsmallest
+        return iter(seleccionar(limite, filas, key=compilar_orden(claves, enlazar, invertir)))
+    # orden completo: una pasada estable por clave, de la última a la primera, cada una con
+    # su dirección; así ninguna necesita envolver los valores. Sin NULL la clave se compara
+    # tal cual, sin la tupla (no nulo, valor)
+    filas = list(filas)
+    for expr, descendente in reversed(claves):
+        f = compilar_valor(expr, enlazar)
+        try:
+            filas = sorted(filas, key=f, reverse=descendente)
+        except TypeError:
+            filas = sorted(filas, key=lambda fila: _con_nulos(f(fila)), reverse=descendente)
+    return iter(filas)
\ No newline at end of file
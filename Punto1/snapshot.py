@@ -0,0 +1,153 @@
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+from columnar import RegistrosColumnares, CODIGOS_ARRAY
+from tuplas import RegistrosTuplas
+from estadisticas import Estadisticas
+
+# formato del archivo:
+#   cabecera: mágico, desplazamiento y largo de la descripción (JSON)
+#   regiones: por columna los datos contiguos con su tipo (q/d/b) o, para las cadenas, los
+#             desplazamientos (q, n + 1) y el heap UTF-8; más el bitmap de validez
+#   descripción: tablas, columnas con sus regiones [desplazamiento, largo] e índices
+MAGICO = b'PLSNAP01'
+VERSION = 1
+_CABECERA = struct.Struct('<8sQQ')
+ALINEACION = 8
+
+class CadenasMapeadas:
+    # columna de cadenas sobre el mmap: cada valor se decodifica del heap cuando se lee
+    def __init__(self, desplazamientos, heap):
+        self.desplazamientos = desplazamientos
+        self.heap = heap
+
+    def __len__(self):
+        return len(self.desplazamientos) - 1
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError(pos)
+        return str(self.heap[self.desplazamientos[pos]:self.desplazamientos[pos + 1]], 'utf-8')
+
+    def __iter__(self):
+        heap = self.heap
+        desplazamientos = self.desplazamientos.tolist()
+        for inicio, fin in zip(desplazamientos, desplazamientos[1:]):
+            yield str(heap[inicio:fin], 'utf-8')
+
+def _escribir_region(archivo, datos):
+    relleno = -archivo.tell() % ALINEACION
+    if relleno:
+        archivo.write(b'\0' * relleno)
+    inicio = archivo.tell()
+    archivo.write(datos)
+    return [inicio, archivo.tell() - inicio]
+
+def _como_columnar(tabla):
+    registros = tabla['registros']
+    borrados = tabla['borrados']
+    if isinstance(registros, RegistrosColumnares):
+        if not borrados.cantidad:
+            return registros
+        # el snapshot guarda la tabla ya compactada
+        return registros.con_posiciones(borrados.posiciones_vivas(len(registros)))
+    # tabla por filas o tuplas: se pasa por columnas con las mismas conversiones del modo columnar
+    columnar = RegistrosColumnares(tabla['columnas'])
+    if isinstance(registros, RegistrosTuplas):
+        if borrados.cantidad:
+            registros = registros.con_posiciones(borrados.posiciones_vivas(len(registros)))
+        columnar.extender({col: registros.columna(col) for col in tabla['columnas']}, len(registros))
+        return columnar
+    registros = list(borrados.vivos(registros))
+    columnar.extender({col: [registro.get(col) for registro in registros] for col in tabla['columnas']}, len(registros))
+    return columnar
+
+def guardar_snapshot(base_datos, ruta):
+    tablas = []
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(b'\0' * _CABECERA.size)
+        for nombre, tabla in base_datos.tablas.items():
+            registros = _como_columnar(tabla)
+            columnas = []
+            for col, tipo in tabla['columnas'].items():
+                descripcion = {'nombre': col, 'tipo': tipo, 'nulos': registros.nulos[col]}
+                # una columna con diccionario se guarda con sus textos, como las demás
+                datos, validos = registros.buffers(col)
+                if col in registros.diccionarios:
+                    datos = registros.columna(col)
+                if tipo in CODIGOS_ARRAY:
+                    descripcion['datos'] = _escribir_region(archivo, datos)
+                else:
+                    desplazamientos = array.array('q', [0])
+                    partes = []
+                    total = 0
+                    for valor in datos:
+                        texto = b'' if valor is None else str(valor).encode('utf-8')
+                        partes.append(texto)
+                        total += len(texto)
+                        desplazamientos.append(total)
+                    descripcion['desplazamientos'] = _escribir_region(archivo, desplazamientos)
+                    descripcion['heap'] = _escribir_region(archivo, b''.join(partes))
+                descripcion['validos'] = _escribir_region(archivo, validos)
+                columnas.append(descripcion)
+            tablas.append({'nombre': nombre, 'filas': len(registros), 'columnas': columnas,
+                           'estadisticas': tabla['estadisticas'].a_json()})
+        indices = [{'nombre': indice.nombre, 'tabla': indice.tabla, 'columna': indice.columna} for indice in base_datos.indices.values()]
+        descripcion = json.dumps({'version': VERSION, 'orden_bytes': sys.byteorder, 'tablas': tablas, 'indices': indices}).encode('utf-8')
+        inicio = archivo.tell()
+        archivo.write(descripcion)
+        archivo.seek(0)
+        archivo.write(_CABECERA.pack(MAGICO, inicio, len(descripcion)))
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+    return len(tablas)
+
+def _region(vista, region):
+    inicio, largo = region
+    return vista[inicio:inicio + largo]
+
+def abrir_snapshot(ruta):
+    # (tablas, [(índice, tabla, columna)]); las columnas quedan como vistas sobre el mmap y
+    # solo se leen del disco las páginas que toca una consulta
+    with open(ruta, 'rb') as archivo:
+        mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+    vista = memoryview(mapa)
+    if len(vista) < _CABECERA.size:
+        raise RuntimeError(f"{ruta} no es un snapshot")
+    magico, inicio, largo = _CABECERA.unpack_from(vista, 0)
+    if magico != MAGICO:
+        raise RuntimeError(f"{ruta} no es un snapshot")
+    descripcion = json.loads(bytes(_region(vista, (inicio, largo))))
+    if descripcion['version'] != VERSION:
+        raise RuntimeError(f"Versión de snapshot {descripcion['version']} no soportada")
+    if descripcion['orden_bytes'] != sys.byteorder:
+        raise RuntimeError(f"El snapshot {ruta} se guardó con orden de bytes {descripcion['orden_bytes']}")
+    tablas = {}
+    for tabla in descripcion['tablas']:
+        columnas = {}
+        datos = {}
+        validos = {}
+        nulos = {}
+        for columna in tabla['columnas']:
+            col, tipo = columna['nombre'], columna['tipo']
+            columnas[col] = tipo
+            if tipo in CODIGOS_ARRAY:
+                datos[col] = _region(vista, columna['datos']).cast(CODIGOS_ARRAY[tipo])
+            else:
+                datos[col] = CadenasMapeadas(_region(vista, columna['desplazamientos']).cast('q'), _region(vista, columna['heap']))
+            validos[col] = _region(vista, columna['validos'])
+            nulos[col] = columna['nulos']
+        registros = RegistrosColumnares.desde_buffers(columnas, datos, validos, nulos, tabla['filas'])
+        tablas[tabla['nombre']] = {'columnas': columnas, 'registros': registros, 'indices': {}}
+        if 'estadisticas' in tabla:
+            tablas[tabla['nombre']]['estadisticas'] = Estadisticas.desde_json(tabla['estadisticas'])
+    indices = [(indice['nombre'], indice['tabla'], indice['columna']) for indice in descripcion['indices']]
+    return tablas, indices
\ No newline at end of file
@@ -0,0 +1,23 @@
+import unittest
+
+import conexion
+from base_datos import ALMACENAMIENTOS
+
+class ClavesDeAgregados(unittest.TestCase):
+    def test_agregados_con_el_mismo_texto(self):
+        # MAX(None) lee la columna None y MAX(?) con un parámetro nulo se escribe igual:
+        # cada uno tiene que leer su propio lugar en las filas del Aggregate
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                con = conexion.connect(almacenamiento)
+                self.addCleanup(con.close)
+                con.execute("CREATE TABLE t (None ENTERO, v ENTERO);")
+                con.executemany("INSERT INTO t (None, v) VALUES (?, ?);", [(1, 5), (2, 6), (2, 7)])
+                filas = con.execute("SELECT v - v, MAX(None), MAX(?) FROM t GROUP BY v - v;", (None,)).fetchall()
+                self.assertEqual(filas, [(0, 2, None)])
+                filas = con.execute("SELECT None, MAX(?) FROM t GROUP BY None HAVING MAX(None) > 0 ORDER BY MAX(None) DESC;",
+                                    (None,)).fetchall()
+                self.assertEqual(filas, [(2, None), (1, None)])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,27 @@
+import unittest
+
+import conexion
+
+class CachePlanes(unittest.TestCase):
+    def setUp(self):
+        self.con = conexion.connect()
+        self.addCleanup(self.con.close)
+        self.con.execute("CREATE TABLE t (id ENTERO, nombre CADENA); INSERT INTO t (id, nombre) VALUES (1, 'a'); INSERT INTO t (id, nombre) VALUES (2, '-- b');")
+
+    def test_espacios_comparten_plan(self):
+        self.con.execute("SELECT id FROM t WHERE id = 1;")
+        aciertos = self.con.aciertos_cache
+        self.assertEqual(self.con.execute("SELECT  id\n FROM t\tWHERE id = 1;").fetchall(), [(1,)])
+        self.assertEqual(self.con.aciertos_cache, aciertos + 1)
+
+    def test_comentario_hasta_fin_de_linea(self):
+        # el salto termina el comentario: el WHERE de la primera consulta sí cuenta
+        self.assertEqual(self.con.execute("SELECT id FROM t -- c\nWHERE id = 1;").fetchall(), [(1,)])
+        self.assertEqual(sorted(self.con.execute("SELECT id FROM t -- c WHERE id = 1;").fetchall()), [(1,), (2,)])
+
+    def test_guiones_dentro_de_cadenas(self):
+        self.assertEqual(self.con.execute("SELECT id FROM t WHERE nombre = '-- b';").fetchall(), [(2,)])
+        self.assertEqual(self.con.execute("SELECT id FROM t WHERE nombre = '--  b';").fetchall(), [])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
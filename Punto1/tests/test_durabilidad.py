@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import conexion
+from base_datos import ALMACENAMIENTOS, BaseDatosMemoria
+from lexer import tokenizar
+from parser import Parser
+
+CARGA = """CREATE TABLE t (id ENTERO, nombre CADENA, valor FLOTANTE, activo BOOLEANO);
+CREATE INDEX i_id ON t (id);
+""" + ''.join(f"INSERT INTO t (id, nombre, valor, activo) VALUES ({i}, 'n{i % 5}', {i}.5, {'TRUE' if i % 2 else 'FALSE'});\n"
+              for i in range(200)) + """INSERT INTO t (id) VALUES (500);
+UPDATE t SET valor = valor + 1 WHERE id < 50;
+UPDATE t SET nombre = 'cambiado' WHERE activo = TRUE AND id > 150;
+DELETE FROM t WHERE id >= 100 AND id < 120;
+"""
+
+def ejecutar(base_datos, sql):
+    parser = Parser(tokenizar(sql), base_datos)
+    parser.parsear_programa()
+    return parser.errores
+
+def contenido(base_datos):
+    # filas vivas de cada tabla ordenadas, más los índices declarados
+    filas = []
+    salida = lambda schema, resultado: filas.extend(resultado)
+    tablas = {}
+    for nombre in sorted(base_datos.tablas):
+        filas.clear()
+        Parser(tokenizar(f"SELECT * FROM {nombre};"), base_datos, salida=salida).parsear_programa()
+        tablas[nombre] = sorted(filas, key=repr)
+    return tablas, sorted(base_datos.indices)
+
+class Durabilidad(unittest.TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_reaplicar_wal(self):
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                ruta = os.path.join(self.directorio, f'{almacenamiento}.wal')
+                bd = BaseDatosMemoria(almacenamiento, ruta)
+                self.assertEqual(ejecutar(bd, CARGA), [])
+                esperado = contenido(bd)
+                bd.cerrar()
+                recuperada = BaseDatosMemoria(almacenamiento, ruta)
+                self.assertEqual(contenido(recuperada), esperado)
+                recuperada.cerrar()
+
+    def test_reaplicar_wal_con_checkpoint(self):
+        ruta = os.path.join(self.directorio, 'checkpoint.wal')
+        bd = BaseDatosMemoria('filas', ruta)
+        bd.wal.umbral_checkpoint = 2000
+        ejecutar(bd, CARGA)
+        esperado = contenido(bd)
+        bd.cerrar()
+        self.assertTrue(os.path.exists(ruta + '.checkpoint'))
+        recuperada = BaseDatosMemoria('filas', ruta)
+        self.assertEqual(contenido(recuperada), esperado)
+        recuperada.cerrar()
+
+    def test_cola_cortada(self):
+        # un registro a medio escribir se descarta y lo anterior se recupera entero
+        ruta = os.path.join(self.directorio, 'cola.wal')
+        bd = BaseDatosMemoria('filas', ruta)
+        ejecutar(bd, CARGA)
+        esperado = contenido(bd)
+        ejecutar(bd, "INSERT INTO t (id) VALUES (999);")
+        bd.cerrar()
+        with open(ruta, 'r+b') as archivo:
+            archivo.truncate(os.path.getsize(ruta) - 3)
+        recuperada = BaseDatosMemoria('filas', ruta)
+        self.assertEqual(contenido(recuperada), esperado)
+        recuperada.cerrar()
+
+    def test_registro_en_el_archivo_antes_del_fsync(self):
+        # sin cerrar la base (una caída del proceso) la última sentencia ya está en el log
+        ruta = os.path.join(self.directorio, 'caida.wal')
+        bd = BaseDatosMemoria('filas', ruta)
+        bd.wal.intervalo = 3600
+        ejecutar(bd, "CREATE TABLE t (id ENTERO); INSERT INTO t (id) VALUES (1);")
+        self.assertEqual(bd.wal.sin_sincronizar, 2)
+        recuperada = BaseDatosMemoria('filas', ruta)
+        self.assertEqual(contenido(recuperada), ({'t': [(1,)]}, []))
+        recuperada.cerrar()
+        bd.cerrar()
+
+    def test_fsync_sin_mas_escrituras(self):
+        # la última escritura de una sesión que queda quieta igual llega al disco
+        bd = BaseDatosMemoria('filas', os.path.join(self.directorio, 'quieta.wal'))
+        bd.wal.intervalo = 0.05
+        bd.wal.sincronizar()
+        ejecutar(bd, "CREATE TABLE t (id ENTERO);")
+        self.assertEqual(bd.wal.sin_sincronizar, 1)
+        for _ in range(100):
+            if not bd.wal.sin_sincronizar:
+                break
+            time.sleep(0.01)
+        self.assertEqual(bd.wal.sin_sincronizar, 0)
+        bd.cerrar()
+
+    def test_sentencia_fallida_en_el_lugar(self):
+        # la sentencia falla en la segunda fila (la primera ya se había calculado): queda
+        # como error, la memoria no cambia y al recuperar se ve lo mismo
+        ruta = os.path.join(self.directorio, 'fallida.wal')
+        con = conexion.connect('columnar', ruta_wal=ruta)
+        con.execute("CREATE TABLE t (id ENTERO, n ENTERO, c CADENA); CREATE INDEX i_id ON t (id);"
+                    " INSERT INTO t (id, n) VALUES (1, 0); INSERT INTO t (id, n, c) VALUES (2, 0, 'a');")
+        antes = sorted(con.execute("SELECT * FROM t;").fetchall(), key=repr)
+        cursor = con.execute("UPDATE t SET n = c WHERE id > 0;")
+        self.assertEqual([error['mensaje'] for error in cursor.errores], ["Valor 'a' no es compatible con la columna n (entero)"])
+        self.assertEqual(sorted(con.execute("SELECT * FROM t;").fetchall(), key=repr), antes)
+        con.close()
+        recuperada = conexion.connect('columnar', ruta_wal=ruta)
+        self.assertEqual(sorted(recuperada.execute("SELECT * FROM t;").fetchall(), key=repr), antes)
+        recuperada.close()
+
+    def test_snapshot_ida_y_vuelta(self):
+        ruta = os.path.join(self.directorio, 'base.snap')
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                bd = BaseDatosMemoria(almacenamiento)
+                self.assertEqual(ejecutar(bd, CARGA + f"SAVE SNAPSHOT '{ruta}';"), [])
+                abierta = BaseDatosMemoria(almacenamiento)
+                self.assertEqual(ejecutar(abierta, f"OPEN SNAPSHOT '{ruta}';"), [])
+                self.assertEqual(contenido(abierta), contenido(bd))
+                # la base abierta sigue aceptando escrituras sobre las columnas del snapshot
+                cambios = "UPDATE t SET valor = valor + valor WHERE id < 10; DELETE FROM t WHERE id = 3; INSERT INTO t (id) VALUES (7);"
+                ejecutar(bd, cambios)
+                ejecutar(abierta, cambios)
+                self.assertEqual(contenido(abierta), contenido(bd))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
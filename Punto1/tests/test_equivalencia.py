@@ -0,0 +1,31 @@
+import random
+import unittest
+
+from base_datos import ALMACENAMIENTOS
+from bench_diferencial import Motor, Sqlite, carga, consultas, normalizar
+
+FILAS = 300
+SEMILLA = 7
+
+class EquivalenciaSqlite(unittest.TestCase):
+    # la carga de bench_diferencial.py a escala chica: cada sentencia tiene que dar lo
+    # mismo que sqlite3 en todos los almacenamientos
+    def comparar(self, almacenamiento, diccionario_cadenas=False):
+        motores = {'motor': Motor(almacenamiento, diccionario_cadenas), 'sqlite': Sqlite()}
+        for sql_motor, sql_sqlite, _ in carga(FILAS):
+            motores['motor'].ejecutar(sql_motor)
+            motores['sqlite'].ejecutar(sql_sqlite)
+        for _, sql, ordenada in consultas(FILAS, random.Random(SEMILLA)):
+            resultados = {clave: normalizar(motor.ejecutar(sql), ordenada) for clave, motor in motores.items()}
+            self.assertEqual(resultados['motor'], resultados['sqlite'], sql)
+
+    def test_almacenamientos(self):
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                self.comparar(almacenamiento)
+
+    def test_diccionario_cadenas(self):
+        self.comparar('columnar', diccionario_cadenas=True)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
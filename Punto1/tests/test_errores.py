@@ -0,0 +1,57 @@
+import unittest
+
+from base_datos import ALMACENAMIENTOS, BaseDatosMemoria
+from lexer import tokenizar
+from parser import Parser
+
+class ErroresDeEjecucion(unittest.TestCase):
+    # un error de una sentencia queda en parser.errores y el resto del script sigue
+    def ejecutar(self, almacenamiento, sql):
+        filas = []
+        parser = Parser(tokenizar(sql), BaseDatosMemoria(almacenamiento), salida=lambda schema, resultado: filas.append(list(resultado)))
+        parser.parsear_programa()
+        return [error['mensaje'] for error in parser.errores], filas
+
+    def test_update_de_columna_inexistente(self):
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                errores, filas = self.ejecutar(almacenamiento, """CREATE TABLE t (id ENTERO, n ENTERO);
+INSERT INTO t (id, n) VALUES (1, 0), (2, 0);
+UPDATE t SET zz = 5 WHERE id = 1;
+UPDATE t SET zz = 5, n = 7 WHERE id = 2;
+SELECT id, n FROM t;""")
+                self.assertEqual(errores, ["UPDATE: columna zz no existe en t"] * 2)
+                # la asignación válida de la misma sentencia sí se aplica
+                self.assertEqual(filas, [[(1, 0), (2, 7)]])
+
+    def test_update_con_valor_incompatible(self):
+        # en la tabla por columnas 'a' no entra en una columna entero: ninguna fila cambia,
+        # ni las que venían antes de la que falla, y el script sigue
+        errores, filas = self.ejecutar('columnar', """CREATE TABLE t (id ENTERO, n ENTERO, c CADENA);
+CREATE INDEX i_id ON t (id);
+INSERT INTO t (id, n) VALUES (1, 0);
+INSERT INTO t (id, n, c) VALUES (2, 0, 'a'), (3, 0, 'b');
+UPDATE t SET n = c WHERE id > 0;
+UPDATE t SET n = c;
+SELECT id, n FROM t;""")
+        self.assertEqual(errores, ["Valor 'a' no es compatible con la columna n (entero)"] * 2)
+        self.assertEqual(filas, [[(1, 0), (2, 0), (3, 0)]])
+
+    def test_error_en_delete(self):
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                errores, filas = self.ejecutar(almacenamiento, """CREATE TABLE t (id ENTERO, v FLOTANTE);
+INSERT INTO t (id) VALUES (1);
+DELETE FROM t WHERE v < 4;
+SELECT id FROM t;""")
+                self.assertEqual(len(errores), 1)
+                self.assertEqual(filas, [[(1,)]])
+
+    def test_actualizar_tuplas_ignora_columnas_sin_slot(self):
+        bd = BaseDatosMemoria('tuplas')
+        Parser(tokenizar("CREATE TABLE t (id ENTERO, n ENTERO); INSERT INTO t (id) VALUES (1);"), bd).parsear_programa()
+        self.assertEqual(bd.actualizar('t', lambda fila: True, {'zz': lambda fila: 5, 'n': lambda fila: 9}), 1)
+        self.assertEqual(list(bd.tablas['t']['registros']), [(1, 9)])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
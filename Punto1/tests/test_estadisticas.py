@@ -0,0 +1,76 @@
+import itertools
+import unittest
+
+from base_datos import ALMACENAMIENTOS, BaseDatosMemoria
+from estadisticas import K_DISTINTOS, BocetoDistintos
+from lexer import tokenizar
+from parser import Parser
+
+def ejecutar(base_datos, sql):
+    filas = []
+    parser = Parser(tokenizar(sql), base_datos, salida=lambda schema, resultado: filas.append(sorted(resultado, key=repr)))
+    parser.parsear_programa()
+    return parser.errores, filas
+
+class Boceto(unittest.TestCase):
+    def test_exacto_hasta_k(self):
+        boceto = BocetoDistintos()
+        boceto.agregar_lote(set(range(K_DISTINTOS - 1)))
+        for valor in range(10):
+            boceto.agregar(valor)
+        self.assertEqual(boceto.estimar(), K_DISTINTOS - 1)
+
+    def test_estimacion(self):
+        # el error esperado ronda 1 / sqrt(K_DISTINTOS), algo más de un 6%
+        boceto = BocetoDistintos()
+        boceto.agregar_lote(set(range(20000)))
+        for valor in ('a', 'b', 'c'):
+            boceto.agregar(valor)
+        self.assertLess(abs(boceto.estimar() - 20003), 20003 * 0.2)
+
+class EstadisticasDeTabla(unittest.TestCase):
+    def test_analyze_descuenta_borrados(self):
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                bd = BaseDatosMemoria(almacenamiento)
+                valores = ', '.join(f"({i})" for i in range(200))
+                ejecutar(bd, f"CREATE TABLE t (id ENTERO); INSERT INTO t (id) VALUES {valores}; DELETE FROM t WHERE id >= 160;")
+                columna = bd.tablas['t']['estadisticas'].columnas['id']
+                # por debajo del umbral las estadísticas son cotas: siguen contando lo borrado
+                self.assertEqual((columna.distintos.estimar(), columna.minimo, columna.maximo), (200, 0, 199))
+                errores, _ = ejecutar(bd, "ANALYZE t;")
+                self.assertEqual(errores, [])
+                columna = bd.tablas['t']['estadisticas'].columnas['id']
+                self.assertEqual((columna.distintos.estimar(), columna.minimo, columna.maximo), (160, 0, 159))
+
+    def test_se_rehacen_solas_pasado_el_umbral(self):
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                bd = BaseDatosMemoria(almacenamiento)
+                valores = ', '.join(f"({i})" for i in range(200))
+                errores, _ = ejecutar(bd, f"CREATE TABLE t (id ENTERO); INSERT INTO t (id) VALUES {valores}; DELETE FROM t WHERE id >= 100;")
+                self.assertEqual(errores, [])
+                columna = bd.tablas['t']['estadisticas'].columnas['id']
+                self.assertEqual((columna.distintos.estimar(), columna.minimo, columna.maximo), (100, 0, 99))
+                errores, _ = ejecutar(bd, "UPDATE t SET id = 5 WHERE id >= 20;")
+                self.assertEqual(errores, [])
+                columna = bd.tablas['t']['estadisticas'].columnas['id']
+                self.assertEqual((columna.distintos.estimar(), columna.minimo, columna.maximo), (20, 0, 19))
+                self.assertEqual(bd.tablas['t']['estadisticas'].modificadas, 0)
+
+    def test_orden_de_join_no_cambia_resultado(self):
+        bd = BaseDatosMemoria('filas')
+        ejecutar(bd, "CREATE TABLE a (id ENTERO, b ENTERO); CREATE TABLE b (id ENTERO, c ENTERO); CREATE TABLE c (id ENTERO, n CADENA);"
+                     f" INSERT INTO a (id, b) VALUES {', '.join(f'({i}, {i % 20})' for i in range(200))};"
+                     f" INSERT INTO b (id, c) VALUES {', '.join(f'({i}, {i % 5})' for i in range(20))};"
+                     f" INSERT INTO c (id, n) VALUES {', '.join(f'({i}, {chr(97 + i)!r})' for i in range(5))};")
+        resultados = []
+        for tablas in itertools.permutations(('a', 'b', 'c')):
+            errores, filas = ejecutar(bd, f"SELECT a.id, c.n FROM {', '.join(tablas)} WHERE a.b = b.id AND b.c = c.id AND a.id < 50;")
+            self.assertEqual(errores, [])
+            resultados.append(filas)
+        self.assertEqual(len(resultados[0][0]), 50)
+        self.assertTrue(all(filas == resultados[0] for filas in resultados))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,46 @@
+import itertools
+import unittest
+
+import conexion
+from planificador import hash_join
+
+def clave_izq(fila):
+    return fila[0]['id']
+
+def clave_der(fila):
+    return fila[1]['id']
+
+class JoinConLimit(unittest.TestCase):
+    def test_sondea_la_izquierda_a_medida_que_llega(self):
+        # la entrada izquierda es más grande que la tabla: el hash se arma con la tabla y
+        # las filas de la izquierda se piden solo mientras se piden resultados
+        leidas = []
+
+        def izquierda():
+            for i in range(10000):
+                leidas.append(i)
+                yield [{'id': i % 10}, None]
+
+        registros = [{'id': k} for k in range(10)]
+        filas = list(itertools.islice(hash_join(izquierda(), 1, registros, clave_izq, clave_der, 2), 5))
+        self.assertEqual([(izq['id'], der['id']) for izq, der in filas], [(k, k) for k in range(5)])
+        self.assertLessEqual(len(leidas), len(registros) + 5)
+
+    def test_hash_sobre_la_izquierda_si_es_menor(self):
+        izquierda = [[{'id': k}, None] for k in (3, 5, 7)]
+        registros = [{'id': k % 10} for k in range(100)]
+        filas = list(hash_join(iter(izquierda), 1, registros, clave_izq, clave_der, 2))
+        self.assertEqual(sorted((izq['id'], der['id']) for izq, der in filas), sorted([(k, k) for k in (3, 5, 7)] * 10))
+
+    def test_limit_sobre_join(self):
+        con = conexion.connect()
+        self.addCleanup(con.close)
+        con.execute("CREATE TABLE a (id ENTERO); CREATE TABLE b (id ENTERO, n CADENA);"
+                    f" INSERT INTO a (id) VALUES {', '.join(f'({i % 10})' for i in range(2000))};"
+                    f" INSERT INTO b (id, n) VALUES {', '.join(f'({i}, {chr(97 + i)!r})' for i in range(10))};")
+        filas = con.execute("SELECT a.id, b.n FROM a, b WHERE a.id = b.id LIMIT 3;").fetchall()
+        self.assertEqual(len(filas), 3)
+        self.assertTrue(all(n == chr(97 + i) for i, n in filas))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import threading
+import unittest
+
+import conexion
+import estres_concurrencia
+from base_datos import ALMACENAMIENTOS
+
+class Transacciones(unittest.TestCase):
+    def conectar(self, almacenamiento):
+        con = conexion.connect(almacenamiento)
+        self.addCleanup(con.close)
+        con.execute("CREATE TABLE t (id ENTERO, nombre CADENA); CREATE INDEX i_id ON t (id);"
+                    " INSERT INTO t (id, nombre) VALUES (1, 'a'), (2, 'b'), (3, 'c');")
+        return con
+
+    def filas(self, con):
+        return sorted(con.execute("SELECT id, nombre FROM t;").fetchall())
+
+    def test_rollback_en_el_script(self):
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                con = self.conectar(almacenamiento)
+                antes = self.filas(con)
+                cursor = con.execute("BEGIN; UPDATE t SET nombre = 'z' WHERE id = 1; DELETE FROM t WHERE id = 2;"
+                                     " INSERT INTO t (id, nombre) VALUES (4, 'd'); ROLLBACK;")
+                self.assertEqual(cursor.errores, [])
+                self.assertEqual(self.filas(con), antes)
+                # el índice también vuelve al estado anterior
+                self.assertEqual(con.execute("SELECT nombre FROM t WHERE id = 1;").fetchall(), [('a',)])
+                self.assertEqual(con.execute("SELECT nombre FROM t WHERE id = 4;").fetchall(), [])
+
+    def test_rollback_de_la_conexion(self):
+        con = self.conectar('filas')
+        antes = self.filas(con)
+        con.execute("BEGIN; DELETE FROM t WHERE id > 1;")
+        self.assertEqual(self.filas(con), [(1, 'a')])
+        con.rollback()
+        self.assertEqual(self.filas(con), antes)
+
+    def test_commit(self):
+        con = self.conectar('filas')
+        con.execute("BEGIN; UPDATE t SET nombre = 'z' WHERE id = 1; COMMIT;")
+        con.rollback()
+        self.assertEqual(self.filas(con), [(1, 'z'), (2, 'b'), (3, 'c')])
+
+    def test_escritura_junto_a_otra_sesion(self):
+        # con otra sesión abierta una sentencia suelta escribe sobre una copia de la tabla:
+        # la versión anterior no cambia y comparte con la nueva todo lo que no se tocó
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                con = self.conectar(almacenamiento)
+                otra = conexion.connect(base_datos=con.base_datos)
+                self.addCleanup(otra.close)
+                con.executemany("INSERT INTO t (id, nombre) VALUES (?, ?);", [(i, 'x') for i in range(10, 3000)])
+                antes = con.base_datos.tablas['t']
+                contenido = list(antes['registros'])
+                con.execute("INSERT INTO t (id, nombre) VALUES (5000, 'y'); UPDATE t SET nombre = 'z' WHERE id = 2;")
+                despues = con.base_datos.tablas['t']
+                self.assertEqual(list(antes['registros']), contenido)
+                self.assertEqual(len(despues['registros']), len(contenido) + 1)
+                if almacenamiento == 'columnar':
+                    # agregar filas sigue compartiendo el buffer; cambiar una duplica la columna
+                    self.assertIs(despues['registros'].datos['id'], antes['registros'].datos['id'])
+                    self.assertIsNot(despues['registros'].datos['nombre'], antes['registros'].datos['nombre'])
+                else:
+                    self.assertIs(despues['registros'].tramos[1], antes['registros'].tramos[1])
+                    self.assertIsNot(despues['registros'].tramos[0], antes['registros'].tramos[0])
+                self.assertIs(despues['indices']['id'].orden[1], antes['indices']['id'].orden[1])
+                self.assertEqual(self.filas(otra)[-1], (5000, 'y'))
+
+    def test_lectores_concurrentes(self):
+        # versión corta de estres_concurrencia.py: un escritor con transacciones (algunas
+        # deshechas) y dos lectores que comprueban que cada foto conserva el total; el
+        # tiempo de espera convierte un bloqueo en una falla
+        for almacenamiento in ALMACENAMIENTOS:
+            with self.subTest(almacenamiento=almacenamiento):
+                resultado = {}
+
+                def correr():
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        resultado['errores'] = estres_concurrencia.ejecutar(almacenamiento, 2, 150)
+
+                hilo = threading.Thread(target=correr, daemon=True)
+                hilo.start()
+                hilo.join(60)
+                self.assertFalse(hilo.is_alive())
+                self.assertEqual(resultado['errores'], [])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
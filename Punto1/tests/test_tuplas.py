@@ -0,0 +1,51 @@
+import unittest
+
+from base_datos import BaseDatosMemoria
+from lexer import tokenizar
+from parser import Parser
+from tuplas import RegistrosTuplas
+
+SCRIPT = """CREATE TABLE t (id ENTERO, nombre CADENA, valor FLOTANTE);
+CREATE INDEX i_id ON t (id);
+INSERT INTO t (id, nombre, valor) VALUES (1, 'a', 1.5), (2, 'b', 2.5), (3, 'c', 3.5), (4, 'd', 4.5);
+INSERT INTO t (id) VALUES (5);
+UPDATE t SET valor = valor + 1, nombre = 'x' WHERE id = 2;
+UPDATE t SET id = id + 10 WHERE id >= 4;
+DELETE FROM t WHERE id = 1;
+SELECT * FROM t;
+SELECT nombre, valor FROM t WHERE id = 14;
+"""
+
+class Tuplas(unittest.TestCase):
+    def test_filas_por_slot(self):
+        registros = RegistrosTuplas([('id', 'entero'), ('nombre', 'cadena')])
+        registros.append(registros.fila({'nombre': 'a'}))
+        registros.extender({'id': [2, 3]}, 2)
+        self.assertEqual(list(registros), [(None, 'a'), (2, None), (3, None)])
+        registros.escribir(1, {'nombre': 'b'})
+        self.assertEqual(registros[1], (2, 'b'))
+        self.assertEqual((registros.leer('id', 2), registros.columna('nombre')), (3, ['a', 'b', None]))
+        self.assertEqual(list(registros.con_posiciones([2, 0])), [(3, None), (None, 'a')])
+
+    def test_copia_comparte_las_filas(self):
+        registros = RegistrosTuplas([('id', 'entero')], [(1,), (2,)])
+        copia = registros.copia()
+        copia.escribir(0, {'id': 9})
+        self.assertIs(copia[1], registros[1])
+        self.assertEqual((registros[0], copia[0]), ((1,), (9,)))
+
+    def test_mismo_resultado_que_filas(self):
+        resultados = {}
+        for almacenamiento in ('filas', 'tuplas'):
+            filas = []
+            bd = BaseDatosMemoria(almacenamiento)
+            parser = Parser(tokenizar(SCRIPT), bd, salida=lambda schema, resultado: filas.append(sorted(resultado, key=repr)))
+            parser.parsear_programa()
+            self.assertEqual(parser.errores, [])
+            resultados[almacenamiento] = filas
+        self.assertIsInstance(bd.tablas['t']['registros'], RegistrosTuplas)
+        self.assertEqual(resultados['tuplas'], resultados['filas'])
+        self.assertEqual(resultados['tuplas'][1], [('d', 4.5)])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -38,4 +38,23 @@ def tipo_valor_runtime(val):
         return 'cadena'
     if val is None:
         return 'nulo'
-    return 'cadena'
\ No newline at end of file
+    return 'cadena'
+
+def convertir_para_columna(tipo_col, tipo_val, valor):
+    # reglas de INSERT: entero <-> flotante y cualquier valor a cadena; lo demás se deja
+    # igual y los nulos quedan como None
+    if valor is not None and tipo_val != tipo_col:
+        if tipo_val == 'entero' and tipo_col == 'flotante':
+            return float(valor)
+        if tipo_val == 'flotante' and tipo_col == 'entero':
+            return int(valor)
+        if tipo_col == 'cadena':
+            return str(valor)
+    return valor
+
+def convertir_lote(tipo_col, tipos, valores):
+    # convertir_para_columna sobre una columna entera; si todos los valores ya son del
+    # tipo de la columna no hay nada que convertir
+    if all(t == tipo_col for t in tipos):
+        return list(valores)
+    return [convertir_para_columna(tipo_col, t, v) for t, v in zip(tipos, valores)]
\ No newline at end of file
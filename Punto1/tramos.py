@@ -0,0 +1,95 @@
+import copy
+import itertools
+
+# filas por tramo; potencia de dos para partir la posición con >> y &
+BITS_TRAMO = 10
+TAMANO_TRAMO = 1 << BITS_TRAMO
+MASCARA_TRAMO = TAMANO_TRAMO - 1
+
+class Tramos:
+    # lista de registros partida en tramos de TAMANO_TRAMO filas. La copia de una sesión
+    # que escribe comparte los tramos con la versión publicada y duplica solo el tramo que
+    # toca, así escribir una fila cuesta lo mismo sea cual sea el tamaño de la tabla.
+    # Iterar encadena los tramos sin pasar por Python
+    def __init__(self, filas=()):
+        self.tramos = []
+        # id() de los tramos que esta lista creó o ya duplicó y puede modificar; los demás
+        # son de otra versión y siguen vivos mientras se compartan, así que un id no se
+        # confunde con el de otro tramo
+        self.propios = set()
+        self.total = 0
+        self.extend(filas)
+
+    def copia(self):
+        nueva = copy.copy(self)
+        nueva.tramos = list(self.tramos)
+        nueva.propios = set()
+        return nueva
+
+    def _nuevo_tramo(self, filas):
+        self.tramos.append(filas)
+        self.propios.add(id(filas))
+
+    def _propio(self, i):
+        tramo = self.tramos[i]
+        if id(tramo) not in self.propios:
+            tramo = self.tramos[i] = list(tramo)
+            self.propios.add(id(tramo))
+        return tramo
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.tramos)
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += self.total
+        return self.tramos[pos >> BITS_TRAMO][pos & MASCARA_TRAMO]
+
+    def __setitem__(self, pos, fila):
+        if pos < 0:
+            pos += self.total
+        if not 0 <= pos < self.total:
+            raise IndexError(pos)
+        self._propio(pos >> BITS_TRAMO)[pos & MASCARA_TRAMO] = fila
+
+    def append(self, fila):
+        if self.total & MASCARA_TRAMO:
+            self._propio(-1).append(fila)
+        else:
+            self._nuevo_tramo([fila])
+        self.total += 1
+
+    def extend(self, filas):
+        filas = iter(filas)
+        libres = -self.total & MASCARA_TRAMO
+        if libres:
+            tramo = self._propio(-1)
+            antes = len(tramo)
+            tramo.extend(itertools.islice(filas, libres))
+            self.total += len(tramo) - antes
+            if len(tramo) < TAMANO_TRAMO:
+                return
+        while True:
+            tramo = list(itertools.islice(filas, TAMANO_TRAMO))
+            if not tramo:
+                return
+            self._nuevo_tramo(tramo)
+            self.total += len(tramo)
+            if len(tramo) < TAMANO_TRAMO:
+                return
+
+    def tomar(self, posiciones):
+        # los registros de esas posiciones, en ese orden
+        tramos = self.tramos
+        return [tramos[pos >> BITS_TRAMO][pos & MASCARA_TRAMO] for pos in posiciones]
+
+    def con_posiciones(self, conservar):
+        # lista nueva con solo las filas de esas posiciones, en ese orden
+        nueva = self.copia()
+        nueva.tramos = []
+        nueva.total = 0
+        nueva.extend(self.tomar(conservar))
+        return nueva
\ No newline at end of file
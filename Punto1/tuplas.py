@@ -0,0 +1,41 @@
+import itertools
+
+from tramos import Tramos
+
+class RegistrosTuplas(Tramos):
+    # tabla guardada por filas compactas: el esquema le da a cada columna una posición
+    # (slot) y cada fila es una tupla con sus valores en ese orden, sin las claves de un
+    # dict por fila. Las tuplas van en tramos como los dicts de la versión por filas, así
+    # que iterar no pasa por Python; el ejecutor lee cada columna por su posición y el
+    # resto (índices, estadísticas, volcado) por columna, igual que en la tabla columnar
+    def __init__(self, columnas, filas=()):
+        self.columnas = dict(columnas)
+        self.slots = {col: k for k, col in enumerate(self.columnas)}
+        super().__init__(filas)
+
+    def fila(self, valores):
+        # tupla de un dict columna -> valor; lo que falta queda en None
+        return tuple([valores.get(col) for col in self.columnas])
+
+    def extender(self, columnas, n):
+        # agrega n filas de una vez; columnas es columna -> lista de valores
+        if not self.slots:
+            self.extend([()] * n)
+            return
+        self.extend(zip(*[columnas.get(col) or itertools.repeat(None, n) for col in self.columnas]))
+
+    def escribir(self, pos, valores):
+        # reemplaza la fila pos por otra con los valores de columna -> valor cambiados
+        fila = list(self[pos])
+        for col, valor in valores.items():
+            k = self.slots.get(col)
+            if k is not None:
+                fila[k] = valor
+        self[pos] = tuple(fila)
+
+    def leer(self, col, pos):
+        return self[pos][self.slots[col]]
+
+    def columna(self, col):
+        k = self.slots[col]
+        return [fila[k] for fila in self]
\ No newline at end of file
@@ -0,0 +1,259 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tipos import tipo_literal_desde_valor, promover_tipos
+from perfil import actual as perfil_actual
+
+# se puede apagar para comparar contra el evaluador fila a fila
+HABILITADO = True
+
+LIMITE_ENTERO = 2 ** 62
+
+DTYPES = {'entero': 'int64', 'flotante': 'float64', 'booleano': 'bool'}
+
+class NoVectorizable(Exception):
+    pass
+
+def disponible():
+    return np is not None and HABILITADO
+
+def cargar_columna(registros, col):
+    # copia la columna a un arreglo de NumPy; con nulos se usa el evaluador escalar
+    tipo = registros.columnas.get(col)
+    if tipo is None or registros.nulos[col]:
+        raise NoVectorizable(col)
+    if tipo in DTYPES:
+        datos = registros.buffers(col)[0]
+        if isinstance(datos, memoryview):
+            # columna de un snapshot: vista de solo lectura sobre el mmap, sin copia
+            return tipo, np.frombuffer(datos, dtype=DTYPES[tipo])
+        return tipo, np.array(datos, dtype=DTYPES[tipo])
+    if tipo == 'cadena':
+        codificada = cargar_codigos(registros, col)
+        if codificada is not None:
+            # columna con diccionario: se decodifica de una vez indexando los textos con los códigos
+            codigos, diccionario = codificada
+            return tipo, np.array(diccionario.valores, dtype=object)[codigos]
+        return tipo, np.array(registros.buffers(col)[0], dtype=object)
+    raise NoVectorizable(col)
+
+def cargar_codigos(registros, col):
+    # (códigos como arreglo de NumPy, diccionario) de una columna cadena con diccionario;
+    # None si la columna guarda los textos
+    diccionario = registros.diccionarios.get(col)
+    if diccionario is None:
+        return None
+    if registros.nulos[col]:
+        raise NoVectorizable(col)
+    datos = registros.datos[col]
+    return np.frombuffer(datos, dtype=datos.typecode)[:len(registros)], diccionario
+
+def _comparar_codigos(op, ref, constante, cargar):
+    # columna con diccionario = (o <>) constante cadena: se compara el código de la
+    # constante con los de la columna, sin decodificar; None si no es el caso
+    if not (isinstance(ref, tuple) and ref[0] == 'REF' and isinstance(constante, tuple) and constante[0] in ('LIT', 'VAL')):
+        return None
+    tipo, valor = evaluar_vectorial(constante, cargar)
+    if tipo != 'cadena':
+        return None
+    codificada = cargar.codigos(ref[1], ref[2])
+    if codificada is None:
+        return None
+    codigos, diccionario = codificada
+    codigo = diccionario.codigo(valor)
+    # un texto que no está en el diccionario no lo tiene ninguna fila
+    iguales = np.zeros(len(codigos), dtype=bool) if codigo is None else codigos == codigo
+    return 'booleano', iguales if op == 'IGUAL' else ~iguales
+
+def _verdad(tipo, valor):
+    if tipo == 'booleano':
+        return valor
+    if tipo in ('entero', 'flotante'):
+        return valor != 0
+    raise NoVectorizable(tipo)
+
+def _aritmetica(op, tipo, v1, v2):
+    # los enteros de Python no desbordan: si el resultado aproximado en flotante se acerca
+    # al límite de int64 el cálculo se deja al evaluador escalar
+    if tipo == 'entero':
+        aproximado = op(np.asarray(v1, dtype='float64'), v2)
+        if np.any(np.abs(aproximado) >= LIMITE_ENTERO):
+            raise NoVectorizable('desborde')
+    return tipo, op(v1, v2)
+
+def evaluar_vectorial(nodo_expr, cargar):
+    # misma semántica que evaluar_expr_con_contexto pero sobre columnas completas;
+    # todo lo que el evaluador resolvería como 'nulo' lanza NoVectorizable
+    if not isinstance(nodo_expr, tuple):
+        raise NoVectorizable(nodo_expr)
+    op = nodo_expr[0]
+    if op == 'LIT':
+        return tipo_literal_desde_valor(nodo_expr[1])
+    if op == 'VAL':
+        if nodo_expr[1] == 'nulo':
+            raise NoVectorizable(op)
+        return nodo_expr[1], nodo_expr[2]
+    if op == 'REF':
+        return cargar(nodo_expr[1], nodo_expr[2])
+    if op == 'NEG':
+        t, v = evaluar_vectorial(nodo_expr[1], cargar)
+        if t not in ('entero', 'flotante'):
+            raise NoVectorizable(op)
+        return t, -v
+    if op in ('MAS', 'MENOS', 'POR', 'DIV'):
+        t1, v1 = evaluar_vectorial(nodo_expr[1], cargar)
+        t2, v2 = evaluar_vectorial(nodo_expr[2], cargar)
+        tp = promover_tipos(t1, t2)
+        if tp not in ('entero', 'flotante'):
+            raise NoVectorizable(op)
+        if op == 'MAS':
+            return _aritmetica(np.add, tp, v1, v2)
+        if op == 'MENOS':
+            return _aritmetica(np.subtract, tp, v1, v2)
+        if op == 'POR':
+            return _aritmetica(np.multiply, tp, v1, v2)
+        if np.any(np.asarray(v2) == 0):
+            raise NoVectorizable('division por cero')
+        return 'flotante', np.true_divide(v1, v2)
+    if op in ('IGUAL', 'DISTINTO') and hasattr(cargar, 'codigos'):
+        resultado = (_comparar_codigos(op, nodo_expr[1], nodo_expr[2], cargar)
+                     or _comparar_codigos(op, nodo_expr[2], nodo_expr[1], cargar))
+        if resultado is not None:
+            return resultado
+    if op in ('IGUAL', 'DISTINTO', 'MENOR', 'MAYOR', 'MENOR_IGUAL', 'MAYOR_IGUAL'):
+        t1, v1 = evaluar_vectorial(nodo_expr[1], cargar)
+        t2, v2 = evaluar_vectorial(nodo_expr[2], cargar)
+        numericos = ('entero', 'flotante', 'booleano')
+        if not ((t1 in numericos and t2 in numericos) or (t1 == 'cadena' and t2 == 'cadena')):
+            raise NoVectorizable(op)
+        if op == 'IGUAL':
+            return 'booleano', np.equal(v1, v2)
+        if op == 'DISTINTO':
+            return 'booleano', np.not_equal(v1, v2)
+        if op == 'MENOR':
+            return 'booleano', np.less(v1, v2)
+        if op == 'MAYOR':
+            return 'booleano', np.greater(v1, v2)
+        if op == 'MENOR_IGUAL':
+            return 'booleano', np.less_equal(v1, v2)
+        return 'booleano', np.greater_equal(v1, v2)
+    if op in ('AND', 'OR'):
+        a = _verdad(*evaluar_vectorial(nodo_expr[1], cargar))
+        b = _verdad(*evaluar_vectorial(nodo_expr[2], cargar))
+        if op == 'AND':
+            return 'booleano', np.logical_and(a, b)
+        return 'booleano', np.logical_or(a, b)
+    if op == 'NOT':
+        return 'booleano', np.logical_not(_verdad(*evaluar_vectorial(nodo_expr[1], cargar)))
+    raise NoVectorizable(op)
+
+def _cargador(registros, alias_validos):
+    # cargar.codigos(alias, col) da los códigos de una columna con diccionario (o None)
+    def cargar(alias, col):
+        if alias not in alias_validos:
+            raise NoVectorizable(alias)
+        return cargar_columna(registros, col)
+    def codigos(alias, col):
+        if alias not in alias_validos:
+            raise NoVectorizable(alias)
+        return cargar_codigos(registros, col)
+    cargar.codigos = codigos
+    return cargar
+
+def mascara(registros, condicion, alias_validos=(None,), borrados=None):
+    # arreglo booleano con las filas vivas que cumplen la condición; None si hay que ir
+    # fila a fila
+    if not disponible():
+        return None
+    try:
+        tipo, valor = evaluar_vectorial(condicion, _cargador(registros, alias_validos))
+        m = np.broadcast_to(_verdad(tipo, valor), (len(registros),))
+    except (NoVectorizable, OverflowError):
+        return None
+    perfil = perfil_actual()
+    if perfil is not None:
+        perfil.evaluar_vectorial(condicion, len(registros))
+    vivas = None if borrados is None else borrados.mascara_vivas(len(registros))
+    return m if vivas is None else m & vivas
+
+def posiciones_que_cumplen(registros, condicion, alias_validos=(None,), borrados=None):
+    m = mascara(registros, condicion, alias_validos, borrados)
+    if m is None:
+        return None
+    return np.flatnonzero(m).tolist()
+
+def _convertir_arreglo(tipo_col, tipo, valor, n):
+    # reglas de coerción de convertir_valor aplicadas a la columna entera
+    valor = np.broadcast_to(valor, (n,))
+    if tipo_col == 'entero' and tipo in ('entero', 'flotante'):
+        return valor.astype('int64')
+    if tipo_col == 'flotante' and tipo in ('entero', 'flotante'):
+        return valor.astype('float64')
+    if tipo_col == 'booleano' and tipo == 'booleano':
+        return valor.astype('bool')
+    if tipo_col == 'cadena' and tipo == 'cadena':
+        return valor
+    raise NoVectorizable(tipo_col)
+
+def preparar_actualizacion(registros, condicion, asignaciones, borrados=None):
+    # calcula sobre columnas las filas y los valores nuevos de un UPDATE sin escribir nada;
+    # None si alguna parte no se puede vectorizar
+    if not disponible():
+        return None
+    n = len(registros)
+    cargar = _cargador(registros, (None,))
+    vivas = None if borrados is None else borrados.mascara_vivas(n)
+    try:
+        if condicion is None:
+            posiciones = np.arange(n) if vivas is None else np.flatnonzero(vivas)
+        else:
+            tipo, valor = evaluar_vectorial(condicion, cargar)
+            m = np.broadcast_to(_verdad(tipo, valor), (n,))
+            posiciones = np.flatnonzero(m if vivas is None else m & vivas)
+        # SET se aplica columna a columna: si una asignación lee una columna asignada antes
+        # en la misma sentencia se deja al evaluador escalar
+        asignadas = set()
+        nuevos = {}
+        for col, expr in asignaciones.items():
+            if col not in registros.columnas or _lee_columnas(expr) & asignadas:
+                raise NoVectorizable(col)
+            tipo, valor = evaluar_vectorial(expr, cargar)
+            nuevos[col] = _convertir_arreglo(registros.columnas[col], tipo, valor, n)[posiciones]
+            asignadas.add(col)
+    except (NoVectorizable, OverflowError):
+        return None
+    perfil = perfil_actual()
+    if perfil is not None:
+        perfil.evaluar_vectorial(condicion, n)
+        for expr in asignaciones.values():
+            perfil.evaluar_vectorial(expr, n)
+    return posiciones, nuevos
+
+def escribir_posiciones(registros, col, posiciones, valores):
+    datos = registros.escribible(col)
+    if registros.columnas[col] in DTYPES:
+        # vista sin copia sobre el buffer del array.array; se suelta antes de salir para
+        # que el array pueda volver a crecer
+        vista = np.frombuffer(datos, dtype=datos.typecode)
+        vista[posiciones] = valores
+        del vista
+    else:
+        diccionario = registros.diccionarios.get(col)
+        codificar = (lambda valor: valor) if diccionario is None else diccionario.codificar
+        for pos, valor in zip(posiciones.tolist(), valores.tolist()):
+            datos[pos] = codificar(valor)
+    registros.marcar_validas(col, posiciones.tolist())
+
+def _lee_columnas(nodo_expr):
+    if not isinstance(nodo_expr, tuple):
+        return set()
+    if nodo_expr[0] == 'REF':
+        return {nodo_expr[2]}
+    if nodo_expr[0] in ('LIT', 'VAL'):
+        return set()
+    resultado = set()
+    for hijo in nodo_expr[1:]:
+        resultado |= _lee_columnas(hijo)
+    return resultado
\ No newline at end of file
@@ -0,0 +1,237 @@
+import os
+import struct
+import threading
+import time
+import zlib
+
+# cada registro se escribe en el archivo en cuanto llega, así que una caída del proceso no
+# pierde nada; el fsync se agrupa: se hace cada GRUPO_COMMIT registros y a más tardar
+# INTERVALO_COMMIT segundos después de escribir un registro (un temporizador lo hace si
+# no llega otra escritura), así que una caída del sistema puede perder como mucho los
+# registros de los últimos INTERVALO_COMMIT segundos
+GRUPO_COMMIT = 1000
+INTERVALO_COMMIT = 0.05
+UMBRAL_CHECKPOINT = 64 * 1024 * 1024
+
+_CABECERA = struct.Struct('<II')  # largo del registro, crc32
+_ENTERO = struct.Struct('<q')
+_FLOTANTE = struct.Struct('<d')
+_LARGO = struct.Struct('<I')
+_MIN_ENTERO = -2 ** 63
+_MAX_ENTERO = 2 ** 63 - 1
+
+class WalCorrupto(Exception):
+    pass
+
+def _codificar(partes, valor):
+    # valores etiquetados con un byte; las listas de enteros o flotantes sin nulos van
+    # empaquetadas de una vez, que es la forma en que llegan las columnas de un lote
+    if valor is None:
+        partes.append(b'N')
+    elif valor is True:
+        partes.append(b'T')
+    elif valor is False:
+        partes.append(b'F')
+    elif type(valor) is int:
+        if _MIN_ENTERO <= valor <= _MAX_ENTERO:
+            partes.append(b'i' + _ENTERO.pack(valor))
+        else:
+            _codificar_texto(partes, b'I', str(valor))
+    elif type(valor) is float:
+        partes.append(b'f' + _FLOTANTE.pack(valor))
+    elif type(valor) is str:
+        _codificar_texto(partes, b's', valor)
+    elif isinstance(valor, (list, tuple)):
+        n = len(valor)
+        if n and all(type(v) is int for v in valor) and _MIN_ENTERO <= min(valor) and max(valor) <= _MAX_ENTERO:
+            partes.append(b'Q' + _LARGO.pack(n) + struct.pack(f'<{n}q', *valor))
+        elif n and all(type(v) is float for v in valor):
+            partes.append(b'D' + _LARGO.pack(n) + struct.pack(f'<{n}d', *valor))
+        else:
+            partes.append(b'l' + _LARGO.pack(n))
+            for v in valor:
+                _codificar(partes, v)
+    else:
+        _codificar_texto(partes, b's', str(valor))
+
+def _codificar_texto(partes, etiqueta, texto):
+    datos = texto.encode('utf-8')
+    partes.append(etiqueta + _LARGO.pack(len(datos)) + datos)
+
+def _decodificar(datos, pos):
+    etiqueta = datos[pos:pos + 1]
+    pos += 1
+    if etiqueta == b'N':
+        return None, pos
+    if etiqueta == b'T':
+        return True, pos
+    if etiqueta == b'F':
+        return False, pos
+    if etiqueta == b'i':
+        return _ENTERO.unpack_from(datos, pos)[0], pos + 8
+    if etiqueta == b'f':
+        return _FLOTANTE.unpack_from(datos, pos)[0], pos + 8
+    if etiqueta in (b's', b'I'):
+        n = _LARGO.unpack_from(datos, pos)[0]
+        pos += 4
+        texto = bytes(datos[pos:pos + n]).decode('utf-8')
+        return (int(texto) if etiqueta == b'I' else texto), pos + n
+    if etiqueta in (b'Q', b'D'):
+        n = _LARGO.unpack_from(datos, pos)[0]
+        pos += 4
+        formato = 'q' if etiqueta == b'Q' else 'd'
+        return list(struct.unpack_from(f'<{n}{formato}', datos, pos)), pos + 8 * n
+    if etiqueta == b'l':
+        n = _LARGO.unpack_from(datos, pos)[0]
+        pos += 4
+        lista = []
+        for _ in range(n):
+            valor, pos = _decodificar(datos, pos)
+            lista.append(valor)
+        return lista, pos
+    raise WalCorrupto(f"etiqueta desconocida {etiqueta!r}")
+
+def codificar_registro(registro):
+    partes = []
+    _codificar(partes, list(registro))
+    cuerpo = b''.join(partes)
+    return _CABECERA.pack(len(cuerpo), zlib.crc32(cuerpo)) + cuerpo
+
+def leer_registros(datos):
+    # (registro, posición donde termina); se detiene en el primer registro incompleto o
+    # con crc distinto, que es lo que deja una escritura cortada por un fallo
+    pos = 0
+    while pos + _CABECERA.size <= len(datos):
+        largo, crc = _CABECERA.unpack_from(datos, pos)
+        inicio = pos + _CABECERA.size
+        cuerpo = datos[inicio:inicio + largo]
+        if len(cuerpo) < largo or zlib.crc32(cuerpo) != crc:
+            return
+        registro, _ = _decodificar(cuerpo, 0)
+        pos = inicio + largo
+        yield registro, pos
+
+class Wal:
+    # bitácora de escritura adelantada de BaseDatosMemoria. El estado durable es el
+    # checkpoint (ruta + '.checkpoint') más los registros del log de su misma generación;
+    # ambos empiezan con ['GEN', n] para que un log ya compactado no se vuelva a aplicar
+    def __init__(self, ruta, grupo=GRUPO_COMMIT, intervalo=INTERVALO_COMMIT, umbral_checkpoint=UMBRAL_CHECKPOINT):
+        self.ruta = ruta
+        self.ruta_checkpoint = ruta + '.checkpoint'
+        self.grupo = grupo
+        self.intervalo = intervalo
+        self.umbral_checkpoint = umbral_checkpoint
+        self.generacion = 0
+        self.archivo = None
+        self.tamano = 0
+        self.sin_sincronizar = 0
+        self.ultimo_sync = time.monotonic()
+        # el temporizador corre en otro hilo: el cerrojo ordena sus fsync con las escrituras
+        self.cerrojo = threading.Lock()
+        self.temporizador = None
+
+    def _leer_archivo(self, ruta):
+        try:
+            with open(ruta, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return b''
+
+    def recuperar(self):
+        # registros a reaplicar, en orden; deja el log abierto para seguir escribiendo
+        registros = []
+        datos = self._leer_archivo(self.ruta_checkpoint)
+        for registro, _ in leer_registros(datos):
+            if registro[0] == 'GEN':
+                self.generacion = registro[1]
+            else:
+                registros.append(registro)
+        datos = self._leer_archivo(self.ruta)
+        valido = 0
+        generacion_log = None
+        for registro, fin in leer_registros(datos):
+            valido = fin
+            if registro[0] == 'GEN':
+                generacion_log = registro[1]
+            elif generacion_log == self.generacion:
+                registros.append(registro)
+        if generacion_log != self.generacion:
+            # log de una generación ya compactada (o vacío): se empieza uno nuevo
+            self._reiniciar_log()
+        else:
+            self.archivo = open(self.ruta, 'r+b')
+            self.archivo.truncate(valido)
+            self.archivo.seek(valido)
+            self.tamano = valido
+        return registros
+
+    def _reiniciar_log(self):
+        if self.archivo is not None:
+            self.archivo.close()
+        self.archivo = open(self.ruta, 'wb')
+        cabecera = codificar_registro(['GEN', self.generacion])
+        self.archivo.write(cabecera)
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+        self.tamano = len(cabecera)
+
+    def escribir(self, registro):
+        datos = codificar_registro(registro)
+        with self.cerrojo:
+            self.archivo.write(datos)
+            self.archivo.flush()
+            self.tamano += len(datos)
+            self.sin_sincronizar += 1
+            if self.sin_sincronizar >= self.grupo or time.monotonic() - self.ultimo_sync >= self.intervalo:
+                self._sincronizar()
+            elif self.temporizador is None:
+                self.temporizador = threading.Timer(self.intervalo, self._sincronizar_por_tiempo)
+                self.temporizador.daemon = True
+                self.temporizador.start()
+
+    def sincronizar(self):
+        with self.cerrojo:
+            self._sincronizar()
+
+    def _sincronizar(self):
+        # group commit: un solo fsync para todos los registros escritos desde el anterior
+        if self.sin_sincronizar:
+            os.fsync(self.archivo.fileno())
+            self.sin_sincronizar = 0
+        self.ultimo_sync = time.monotonic()
+
+    def _sincronizar_por_tiempo(self):
+        with self.cerrojo:
+            self.temporizador = None
+            if self.archivo is not None:
+                self._sincronizar()
+
+    def requiere_checkpoint(self):
+        return self.tamano >= self.umbral_checkpoint
+
+    def checkpoint(self, registros):
+        # escribe el estado completo en un archivo nuevo, lo cambia de nombre de forma
+        # atómica y recién entonces empieza un log vacío de la nueva generación
+        self.sincronizar()
+        generacion = self.generacion + 1
+        temporal = self.ruta_checkpoint + '.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(codificar_registro(['GEN', generacion]))
+            for registro in registros:
+                f.write(codificar_registro(registro))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_checkpoint)
+        with self.cerrojo:
+            self.generacion = generacion
+            self._reiniciar_log()
+
+    def cerrar(self):
+        with self.cerrojo:
+            if self.temporizador is not None:
+                self.temporizador.cancel()
+                self.temporizador = None
+            if self.archivo is not None:
+                self._sincronizar()
+                self.archivo.close()
+                self.archivo = None
\ No newline at end of file
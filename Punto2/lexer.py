@@ -1,17 +1,16 @@
+import gc
 import re
 
 PATTERNS = [
-    ('ESPACIO', r'\s+'),
-    ('COMENTARIO', r'--[^\n]*'),
     ('NUMERO', r'\d+\.\d+|\d+'),
-    ('DOS_PUNTOS', r':'),                 
+    ('DOS_PUNTOS', r':'),
     ('CORCH_ABRE', r'\['),
     ('CORCH_CIERRA', r'\]'),
     ('PAR_ABRE', r'\('),
     ('PAR_CIERRA', r'\)'),
     ('MENOR_IGUAL', r'<='),
     ('MAYOR_IGUAL', r'>='),
-    ('DISTINTO', r'<>|!='), 
+    ('DISTINTO', r'<>|!='),
     ('MENOR', r'<'),
     ('MAYOR', r'>'),
     ('IGUAL', r'='),
@@ -23,17 +22,65 @@ PATTERNS = [
     ('COMA', r','),
     ('PUNTO_COMA', r';'),
     ('IDENT', r'[A-Za-z_][A-Za-z0-9_]*'),
-    ('CADENA', r"'([^'\\]|\\.)*'|\"([^\"\\]|\\.)*\""),
+    ('CADENA', r"'[^'\\]*(?:\\.[^'\\]*)*'|\"[^\"\\]*(?:\\.[^\"\\]*)*\""),
 ]
 
+# espacios y comentarios: no son tokens, se consumen delante de cada token dentro del
+# mismo match. El lookahead con referencia hace el salto atómico: si después no hay un
+# token no se devuelve parte de un comentario y '--' no termina leído como dos MENOS
+SALTO = r'(?=((?:\s+|--[^\n]*)*))\1'
+
 PALABRAS_RESERVADAS = {
     'DECLARAR', 'COMO', 'MATRIZ', 'IMPRIMIR', 'PRODUCTO',
     'ENTERO', 'FLOTANTE', 'SI', 'SINO'
 }
 
-token_regex = re.compile('|'.join('(?P<%s>%s)' % p for p in PATTERNS), re.IGNORECASE)
+# dos grupos, el salto y el token: token_regex.split(texto) deja
+# [hueco, salto, token, hueco, salto, token, ..., resto] y un hueco no vacío es algo
+# que no es token
+token_regex = re.compile(SALTO + '(' + '|'.join('(?:%s)' % patron for _, patron in PATTERNS) + ')')
+salto_regex = re.compile(SALTO)
+_PATRONES = [(tipo, re.compile(patron)) for tipo, patron in PATTERNS]
+
+# cuántos textos distintos de identificadores y símbolos recuerda _Clases
+MAX_PALABRAS = 1 << 16
+# números y cadenas: se reconocen por el primer carácter y no se guardan en _Clases
+_TIPO_POR_INICIAL = dict.fromkeys('0123456789', 'NUMERO')
+_TIPO_POR_INICIAL.update({"'": 'CADENA', '"': 'CADENA'})
+
+class _Clases(dict):
+    # (tipo, valor) de cada texto de token, para no probar los patrones ni pasar cada
+    # identificador por upper(): de entrada tiene las palabras reservadas escritas en
+    # mayúsculas, minúsculas y con inicial mayúscula; los identificadores y símbolos se
+    # van agregando hasta MAX_PALABRAS
+    def __init__(self):
+        super().__init__()
+        for palabra in PALABRAS_RESERVADAS:
+            for escrita in (palabra, palabra.lower(), palabra.capitalize()):
+                self[escrita] = self._clasificar(escrita)
+
+    def __missing__(self, texto):
+        tipo = _TIPO_POR_INICIAL.get(texto[0])
+        if tipo is not None:
+            return (tipo, texto)
+        clase = self._clasificar(texto)
+        if len(self) < MAX_PALABRAS:
+            self[texto] = clase
+        return clase
+
+    @staticmethod
+    def _clasificar(texto):
+        # el primer patrón que lo reconoce entero, como en la alternativa de token_regex
+        tipo = next(tipo for tipo, patron in _PATRONES if patron.fullmatch(texto))
+        if tipo == 'IDENT' and texto.upper() in PALABRAS_RESERVADAS:
+            return (texto.upper(), texto.upper())
+        return (tipo, texto)
+
+_CLASES = _Clases()
 
 class Token:
+    __slots__ = ('tipo', 'valor', 'linea', 'columna')
+
     def __init__(self, tipo, valor, linea, columna):
         self.tipo = tipo
         self.valor = valor
@@ -43,44 +90,41 @@ class Token:
         return f"Token({self.tipo}, {self.valor!r}, {self.linea}, {self.columna})"
 
 def tokenizar(texto):
-    pos = 0
-    linea = 1
-    columna = 1
-    tokens = []
-    while pos < len(texto):
-        m = token_regex.match(texto, pos)
-        if not m:
-            raise SyntaxError(f"Error léxico en línea {linea} columna {columna}: {texto[pos]!r}")
-        tipo = m.lastgroup
-        valor = m.group(tipo)
-        if tipo == 'ESPACIO':
-            nueva_lineas = valor.count('\n')
-            if nueva_lineas:
-                linea += nueva_lineas
-                columna = len(valor) - valor.rfind('\n')
-            else:
-                columna += len(valor)
-            pos = m.end()
-            continue
-        if tipo == 'COMENTARIO':
-            nueva_lineas = valor.count('\n')
-            if nueva_lineas:
-                linea += nueva_lineas
-                columna = 1
-            else:
-                columna += len(valor)
-            pos = m.end()
-            continue
-        if tipo == 'IDENT':
-            val_upper = valor.upper()
-            if val_upper in PALABRAS_RESERVADAS:
-                tipo = val_upper
-                valor = val_upper
-        tokens.append(Token(tipo, valor, linea, columna))
-        advance = len(valor)
-        pos = m.end()
-        columna += advance
-    tokens.append(Token('EOF', '', linea, columna))
+    # la columna sale de la posición: ultimo es el índice del último salto de línea que
+    # hubo en espacios o comentarios (los de dentro de una cadena no cuentan). El
+    # recolector de ciclos se pausa mientras se arma la lista de tokens, que no forman ciclos
+    pausar = gc.isenabled()
+    if pausar:
+        gc.disable()
+    try:
+        piezas = token_regex.split(texto)
+        pos = 0
+        linea = 1
+        ultimo = -1
+        tokens = []
+        clases = _CLASES
+        for hueco, salto, valor in zip(piezas[::3], piezas[1::3], piezas[2::3]):
+            if hueco:
+                break
+            inicio = pos + len(salto)
+            if salto and '\n' in salto:
+                linea += salto.count('\n')
+                ultimo = pos + salto.rfind('\n')
+            pos = inicio + len(valor)
+            tipo, valor = clases[valor]
+            tokens.append(Token(tipo, valor, linea, inicio - ultimo))
+    finally:
+        if pausar:
+            gc.enable()
+    # después del último token solo pueden quedar espacios y comentarios
+    final = salto_regex.match(texto, pos).end()
+    saltos = texto.count('\n', pos, final)
+    if saltos:
+        linea += saltos
+        ultimo = texto.rfind('\n', pos, final)
+    if final < len(texto):
+        raise SyntaxError(f"Error léxico en línea {linea} columna {final - ultimo}: {texto[final]!r}")
+    tokens.append(Token('EOF', '', linea, final - ultimo))
     return tokens
 
 __all__ = ['tokenizar', 'Token', 'PALABRAS_RESERVADAS']
\ No newline at end of file